@@ -0,0 +1,171 @@
+"""Digest the ``nginx`` access log into compact per-minute aggregates.
+
+``logrotate`` deletes rotated access logs after 10 generations, which on a busy day
+is a matter of hours.  Before every rotation, ``rotate_logs.py`` digests the requests
+logged since the previous digest into one row per minute, appended to a CSV file that
+is never rotated.  A row is roughly 150 bytes, so a month of history is a few MB.
+
+Every row holds counts, which can be summed: the same minute may be split over two
+rows when a digest runs in the middle of it, and coarser periods are obtained by
+summing the rows of their minutes.  Request processing times are recorded as a
+histogram (the number of requests that took at most each of
+:data:`LATENCY_BUCKETS_MS`), from which quantiles of any period can be estimated.
+
+To know where the previous digest stopped, the inode and byte offset of the access
+log are saved in a small JSON state file.  When the access log has been rotated since,
+the rest of the rotated file (``access.log.1``) is digested first.
+
+This file must live in the same directory as the helper scripts that use it."""
+
+from __future__ import annotations
+
+import csv
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable
+
+from access_log import AccessLogEntry, read_complete_lines, unread_segments
+
+DEFAULT_DIGEST_PATH = Path("/cache/log/drake-ci/access_log_digest.csv")
+"""The append-only digest (not matched by ``logrotate_cache.conf``)."""
+
+DEFAULT_STATE_PATH = Path("/cache/log/drake-ci/access_log_digest.json")
+"""Where the inode and offset of the access log digested so far are saved."""
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+"""Upper bounds (inclusive, in milliseconds) of the cumulative request time histogram
+buckets.  Slower requests are only counted in ``request_time_count``."""
+
+COLUMNS = (
+    "minute",
+    "requests",
+    "get",
+    "put",
+    "head",
+    "other_methods",
+    "status_2xx",
+    "status_3xx",
+    "status_404",
+    "status_4xx",
+    "status_5xx",
+    "bytes_sent",
+    "bytes_received",
+    "request_time_count",
+    "request_time_sum_ms",
+    "request_time_max_ms",
+) + tuple(f"request_time_le_{ms}ms" for ms in LATENCY_BUCKETS_MS)
+"""The header of the digest.  ``minute`` is the UTC start of the minute (ISO 8601),
+``request_time_max_ms`` is the only column that must be maxed rather than summed."""
+
+
+class MinuteAggregate:
+    """The counts of the requests of a single minute, a row of the digest."""
+
+    __slots__ = ("counts", "request_time_max_ms")
+
+    _METHODS = {"GET": 1, "PUT": 2, "HEAD": 3}
+    """Index in ``counts`` of every method, others are counted at index 4."""
+
+    def __init__(self) -> None:
+        # Every summable column after "minute", in the order of COLUMNS.
+        self.counts = [0] * (len(COLUMNS) - 1)
+        self.request_time_max_ms = 0
+
+    def add(self, entry: AccessLogEntry) -> None:
+        """Account for the request ``entry``."""
+        counts = self.counts
+        counts[0] += 1
+        counts[self._METHODS.get(entry.method, 4)] += 1
+        status = entry.status
+        if status == 404:
+            counts[7] += 1
+        elif 200 <= status < 600:
+            counts[(5, 6, 8, 9)[status // 100 - 2]] += 1
+        counts[10] += entry.body_bytes_sent
+        if entry.request_length is not None:
+            counts[11] += entry.request_length
+        if entry.request_time is not None:
+            ms = round(entry.request_time * 1000.0)
+            counts[12] += 1
+            counts[13] += ms
+            self.request_time_max_ms = max(self.request_time_max_ms, ms)
+            # Cumulative buckets: counted in every bucket of a bound of at least ms.
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if ms <= bound:
+                    counts[15 + i] += 1
+
+    def row(self, minute: datetime) -> list[str | int]:
+        """Return the digest row of this aggregate for ``minute``."""
+        counts = list(self.counts)
+        counts[14] = self.request_time_max_ms
+        return [minute.strftime("%Y-%m-%dT%H:%MZ")] + counts
+
+
+def aggregate_by_minute(
+    entries: Iterable[AccessLogEntry],
+) -> dict[datetime, MinuteAggregate]:
+    """Return the :class:`MinuteAggregate` of ``entries`` by (UTC) minute, in
+    chronological order."""
+    by_minute: dict[datetime, MinuteAggregate] = {}
+    # Consecutive requests are almost always in the same minute, avoid looking it up.
+    current_time = None
+    current: MinuteAggregate | None = None
+    for entry in entries:
+        if entry.time != current_time:
+            minute = entry.time.astimezone(timezone.utc).replace(second=0)
+            current = by_minute.get(minute)
+            if current is None:
+                current = by_minute[minute] = MinuteAggregate()
+            current_time = entry.time
+        assert current is not None
+        current.add(entry)
+    return dict(sorted(by_minute.items()))
+
+
+def append_digest(
+    digest_path: Path, by_minute: dict[datetime, MinuteAggregate]
+) -> None:
+    """Append the rows of ``by_minute`` to the digest (with a header if it is new)."""
+    new = not digest_path.exists() or digest_path.stat().st_size == 0
+    digest_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(digest_path, "a", newline="") as f:
+        writer = csv.writer(f)
+        if new:
+            writer.writerow(COLUMNS)
+        for minute, aggregate in by_minute.items():
+            writer.writerow(aggregate.row(minute))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def digest_access_log(
+    log_path: Path,
+    *,
+    digest_path: Path = DEFAULT_DIGEST_PATH,
+    state_path: Path = DEFAULT_STATE_PATH,
+) -> int:
+    """Append the aggregates of every request logged to ``log_path`` since the previous
+    digest to ``digest_path``.  Returns the number of requests digested."""
+    try:
+        state = json.loads(state_path.read_text())
+        inode, offset = int(state["inode"]), int(state["offset"])
+    except (OSError, ValueError, KeyError, TypeError):
+        inode, offset = None, 0
+
+    current_inode = log_path.stat().st_ino
+    n_entries = 0
+    position = [0]
+    for path, segment_offset in unread_segments(log_path, inode, offset):
+        by_minute = aggregate_by_minute(
+            read_complete_lines(path, segment_offset, position)
+        )
+        append_digest(digest_path, by_minute)
+        n_entries += sum(a.counts[0] for a in by_minute.values())
+
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_name(state_path.name + ".tmp")
+    tmp_path.write_text(json.dumps({"inode": current_inode, "offset": position[0]}))
+    os.replace(tmp_path, state_path)
+    return n_entries
@@ -0,0 +1,191 @@
+"""Parsing utilities for the ``nginx`` access log of the cache server.
+
+``nginx`` logs every ``bazel`` ``GET`` / ``PUT`` to ``/cache/log/nginx/access.log``
+using the ``drake_cache`` log format of ``drake_cache_server_nginx.conf``, which is the
+``combined`` log format followed by the request processing time and length::
+
+    $remote_addr - $remote_user [$time_local] "$request" $status $body_bytes_sent
+        "$http_referer" "$http_user_agent" $request_time $request_length
+
+Logs written with the plain ``combined`` format are parsed as well, without the last
+two fields.  Rotated logs (``access.log.1``, ...) are read the same way, gzip
+compressed logs are detected by their ``.gz`` suffix.
+
+This file must live in the same directory as the helper scripts that use it."""
+
+from __future__ import annotations
+
+import glob
+import gzip
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, TextIO
+
+DEFAULT_ACCESS_LOG = Path("/cache/log/nginx/access.log")
+"""The access log written by ``drake_cache_server_nginx.conf``."""
+
+HIT_STATUSES = frozenset((200, 206, 304))
+"""Statuses of a ``GET`` that found the requested cache entry."""
+
+_COMBINED_RE = re.compile(
+    r'(?P<remote_addr>\S+) \S+ \S+ \[(?P<time_local>[^\]]+)\] '
+    r'"(?P<method>\S+) (?P<uri>\S+)[^"]*" (?P<status>\d{3}) '
+    r"(?P<body_bytes_sent>\d+|-)"
+    r'(?: "[^"]*" "[^"]*" (?P<request_time>[0-9.]+) (?P<request_length>\d+))?'
+)
+
+
+class AccessLogEntry(NamedTuple):
+    """A single request logged by ``nginx``."""
+
+    remote_addr: str
+    time: datetime
+    method: str
+    uri: str
+    status: int
+    body_bytes_sent: int
+    request_time: float | None = None
+    """Seconds spent processing the request, if logged."""
+
+    request_length: int | None = None
+    """Bytes received (request line, headers, and body), if logged."""
+
+
+_MONTHS = {
+    name: number
+    for number, name in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun")
+        + ("Jul", "Aug", "Sep", "Oct", "Nov", "Dec"),
+        start=1,
+    )
+}
+
+
+@lru_cache(maxsize=64)
+def _utc_offset(offset: str) -> timezone:
+    """Return the timezone of a ``$time_local`` offset, e.g., ``-0400``."""
+    minutes = int(offset[1:3]) * 60 + int(offset[3:5])
+    return timezone(timedelta(minutes=-minutes if offset[0] == "-" else minutes))
+
+
+@lru_cache(maxsize=4096)
+def parse_time_local(time_local: str) -> datetime:
+    """Parse an ``nginx`` ``$time_local``, e.g., ``10/Oct/2026:13:55:36 -0400``.
+
+    Requests are logged many times per second, so parsed values are cached.  The fixed
+    width format is sliced directly, which is several times faster than ``strptime``."""
+    try:
+        return datetime(
+            int(time_local[7:11]),
+            _MONTHS[time_local[3:6]],
+            int(time_local[0:2]),
+            int(time_local[12:14]),
+            int(time_local[15:17]),
+            int(time_local[18:20]),
+            tzinfo=_utc_offset(time_local[21:26]),
+        )
+    except (KeyError, ValueError):
+        return datetime.strptime(time_local, "%d/%b/%Y:%H:%M:%S %z")
+
+
+def parse_line(line: str) -> AccessLogEntry | None:
+    """Return the entry logged on ``line``, or ``None`` if it cannot be parsed."""
+    match = _COMBINED_RE.match(line)
+    if match is None:
+        return None
+    (
+        remote_addr,
+        time_local,
+        method,
+        uri,
+        status,
+        body_bytes_sent,
+        request_time,
+        request_length,
+    ) = match.groups()
+    # NOTE: positional arguments, this is called for every line of the log.
+    return AccessLogEntry(
+        remote_addr,
+        parse_time_local(time_local),
+        method,
+        uri,
+        int(status),
+        int(body_bytes_sent) if body_bytes_sent != "-" else 0,
+        float(request_time) if request_time is not None else None,
+        int(request_length) if request_length is not None else None,
+    )
+
+
+def open_log(path: Path) -> TextIO:
+    """Open the (possibly gzip compressed) log file at ``path`` for reading."""
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def rotated_logs(path: Path) -> list[Path]:
+    """Return ``path`` and every rotated sibling of it (``path.1``, ``path.2.gz``,
+    ...) that exists, oldest first."""
+    rotated: list[tuple[int, Path]] = []
+    for sibling in path.parent.glob(f"{glob.escape(path.name)}.*"):
+        suffix = sibling.name[len(path.name) + 1 :]
+        if suffix.endswith(".gz"):
+            suffix = suffix[: -len(".gz")]
+        if suffix.isdigit():
+            rotated.append((int(suffix), sibling))
+    logs = [p for _, p in sorted(rotated, reverse=True)]
+    if path.exists():
+        logs.append(path)
+    return logs
+
+
+def read_entries(paths: Iterable[Path]) -> Iterator[AccessLogEntry]:
+    """Yield every parsable entry of the log files at ``paths``, in order."""
+    for path in paths:
+        with open_log(path) as f:
+            for line in f:
+                entry = parse_line(line)
+                if entry is not None:
+                    yield entry
+
+
+def read_complete_lines(
+    path: Path, offset: int, position: list[int]
+) -> Iterator[AccessLogEntry]:
+    """Yield the entries of the complete lines of ``path`` after byte ``offset``.  The
+    offset after the last complete line read is kept in ``position[0]``, a line still
+    being written is left for the next read."""
+    position[0] = offset
+    with open(path, "rb") as f:
+        if offset > os.fstat(f.fileno()).st_size:
+            # Truncated (e.g., copytruncate), start over.
+            position[0] = offset = 0
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            position[0] += len(line)
+            entry = parse_line(line.decode("utf-8", errors="replace"))
+            if entry is not None:
+                yield entry
+
+
+def unread_segments(
+    log_path: Path, inode: int | None, offset: int
+) -> list[tuple[Path, int]]:
+    """Return the (path, byte offset) of the log files to read to resume after
+    ``offset`` of the file ``inode``, the log at ``log_path`` when it was last read
+    (``None`` to read it from the start).  When ``log_path`` has been rotated since,
+    the rest of the rotated file comes first."""
+    segments: list[tuple[Path, int]] = []
+    if inode is not None and inode != log_path.stat().st_ino:
+        for rotated in reversed(rotated_logs(log_path)[:-1]):
+            if rotated.suffix != ".gz" and rotated.stat().st_ino == inode:
+                segments.append((rotated, offset))
+                break
+        offset = 0
+    segments.append((log_path, offset))
+    return segments
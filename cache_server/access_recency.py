@@ -0,0 +1,227 @@
+"""The time every cached file was last downloaded, according to the ``nginx`` access
+log.
+
+On ``relatime`` mounts (the default), the access time of a file is only updated when
+it is older than its modification time or than a day, so a blob downloaded by every
+build may still look a day old to ``remove_old_files.py``.  The access log records
+every ``GET``: the time every URI was last downloaded is kept in a map, which is
+updated from where the previous update stopped (the inode and byte offset of the
+access log, like ``access_digest.py``) and saved to
+``/cache/log/drake-ci/access_recency.map``.
+
+The map is compact: URIs are keyed by a 64 bit hash, and keys and times (seconds since
+the epoch) are stored in two sorted arrays, 16 bytes per URI both in memory and on
+disk, looked up by binary search.  URIs not downloaded within :data:`RETENTION` are
+dropped, their access time is then accurate (within a day) anyway.
+
+This file must live in the same directory as the helper scripts that use it."""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+from pathlib import Path
+
+from access_log import (
+    HIT_STATUSES,
+    read_complete_lines,
+    read_entries,
+    rotated_logs,
+    unread_segments,
+)
+
+DEFAULT_RECENCY_PATH = Path("/cache/log/drake-ci/access_recency.map")
+"""Where the map is saved (not matched by ``logrotate_cache.conf``)."""
+
+RETENTION = timedelta(days=30)
+"""How long a download is remembered."""
+
+_HEADER = struct.Struct("<8sIQQQ")
+"""Magic, format version, inode and byte offset of the access log read so far (an
+inode of 0 if none), and number of URIs."""
+
+_MAGIC = b"DRKRECNT"
+
+_VERSION = 1
+
+
+def uri_key(uri: str) -> int:
+    """Return the 64 bit key of ``uri`` in the map (its query string is ignored)."""
+    digest = hashlib.blake2b(uri.split("?", 1)[0].encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class AccessRecency:
+    """The map of the time every URI was last downloaded.
+
+    Usage:
+
+    1. Create the AccessRecency instance, which loads the saved map (if any).
+    2. Call :func:`AccessRecency.update_from_log` to read the downloads logged since
+       the previous update, and :func:`AccessRecency.save`.
+    3. Query :func:`AccessRecency.get_ns` for every file.
+
+    **Attributes**
+    path: Path
+        Path to the saved map, created by the first save.
+
+    keys: array
+        The sorted keys (see :func:`uri_key`) of the URIs downloaded.
+
+    times: array
+        The time (seconds since the epoch) of the latest download of every URI, in the
+        order of ``keys``.
+
+    inode, offset: int | None, int
+        The inode and byte offset of the access log read so far, ``None`` if it was
+        never read.
+    """
+
+    def __init__(self, path: Path = DEFAULT_RECENCY_PATH) -> None:
+        self.path = path
+        self.keys = array("Q")
+        self.times = array("q")
+        self.inode: int | None = None
+        self.offset = 0
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            magic, version, inode, offset, count = _HEADER.unpack(
+                f.read(_HEADER.size)
+            )
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"'{path}' is not an access recency map.")
+            self.keys.fromfile(f, count)
+            self.times.fromfile(f, count)
+        self.inode = inode or None
+        self.offset = offset
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get_ns(self, uri: str) -> int | None:
+        """Return the time of the latest download of ``uri`` in nanoseconds since the
+        epoch, ``None`` if it was not downloaded within :data:`RETENTION`."""
+        key = uri_key(uri)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.times[i] * 1_000_000_000
+        return None
+
+    def merge(self, downloads: dict[int, int]) -> None:
+        """Record the (key, seconds since the epoch) ``downloads``, keeping the latest
+        time of every key."""
+        keys = self.keys
+        times = self.times
+        new: list[tuple[int, int]] = []
+        for key, t in downloads.items():
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                if t > times[i]:
+                    times[i] = t
+            else:
+                new.append((key, t))
+        if not new:
+            return
+        new.sort()
+        if len(new) > len(keys) // 4:
+            # Many new keys (e.g., the first update), sorting everything is faster.
+            merged = sorted([*zip(keys, times), *new])
+            self.keys = array("Q", [key for key, _ in merged])
+            self.times = array("q", [t for _, t in merged])
+            return
+        # Merge the few sorted new keys into the sorted arrays, in a single pass.
+        merged_keys = array("Q")
+        merged_times = array("q")
+        i = 0
+        for key, t in new:
+            j = bisect_left(keys, key, i)
+            merged_keys.extend(keys[i:j])
+            merged_times.extend(times[i:j])
+            merged_keys.append(key)
+            merged_times.append(t)
+            i = j
+        merged_keys.extend(keys[i:])
+        merged_times.extend(times[i:])
+        self.keys = merged_keys
+        self.times = merged_times
+
+    def expire(self, before: float) -> int:
+        """Forget the URIs last downloaded before ``before`` (seconds since the epoch),
+        return how many were forgotten."""
+        keep = [i for i, t in enumerate(self.times) if t >= before]
+        n_expired = len(self.keys) - len(keep)
+        if n_expired:
+            self.keys = array("Q", (self.keys[i] for i in keep))
+            self.times = array("q", (self.times[i] for i in keep))
+        return n_expired
+
+    def update_from_log(self, log_path: Path) -> int:
+        """Record the downloads logged to ``log_path`` since the previous update (or,
+        the first time, in every rotated log too), and forget those older than
+        :data:`RETENTION`.  Returns the number of downloads read."""
+        downloads: dict[int, int] = {}
+        n_downloads = 0
+
+        def record(entries) -> None:
+            nonlocal n_downloads
+            for entry in entries:
+                if entry.method == "GET" and entry.status in HIT_STATUSES:
+                    key = uri_key(entry.uri)
+                    t = int(entry.time.timestamp())
+                    if downloads.get(key, 0) < t:
+                        downloads[key] = t
+                    n_downloads += 1
+
+        current_inode = log_path.stat().st_ino
+        if self.inode is None:
+            record(read_entries(rotated_logs(log_path)[:-1]))
+        position = [0]
+        for path, offset in unread_segments(log_path, self.inode, self.offset):
+            record(read_complete_lines(path, offset, position))
+        self.merge(downloads)
+        self.expire(time.time() - RETENTION.total_seconds())
+        self.inode = current_inode
+        self.offset = position[0]
+        return n_downloads
+
+    def save(self) -> None:
+        """Replace the saved map with this one."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(
+                _HEADER.pack(
+                    _MAGIC, _VERSION, self.inode or 0, self.offset, len(self.keys)
+                )
+            )
+            self.keys.tofile(f)
+            self.times.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def update_access_recency(
+    log_path: Path, path: Path = DEFAULT_RECENCY_PATH
+) -> tuple[AccessRecency, int]:
+    """Load the map saved at ``path``, record the downloads logged to ``log_path``
+    since, and save it.  Returns the map and the number of downloads read.
+
+    ``remove_old_files.py`` and ``rotate_logs.py`` may update the map concurrently,
+    updates are serialized by a lock file next to it."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        recency = AccessRecency(path)
+        n_downloads = recency.update_from_log(log_path)
+        recency.save()
+    return recency, n_downloads
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""Report the hit rate and throughput of the cache server from its ``nginx`` access log.
+
+The access log and its rotated siblings (``access.log.1``, ``access.log.2.gz``, ...) are
+read in a single streaming pass, oldest first.  For every time window (one hour by
+default), and for all of the logs combined, the following are reported:
+
+- The number of requests, and the hit ratio of the ``GET`` requests (a ``GET`` that
+  finds the entry is a hit, a ``404`` is a miss).
+- The ``404`` rate over all requests.
+- The bytes sent (``GET`` responses) and received (mostly ``PUT`` uploads).
+- The median and 99th percentile request processing time.
+- The salts (``<version>/<salt>``) and clients with the most traffic.
+
+Request processing times and bytes received are only available for logs written with
+the ``drake_cache`` log format of ``drake_cache_server_nginx.conf``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable
+
+from access_log import (
+    AccessLogEntry,
+    DEFAULT_ACCESS_LOG,
+    HIT_STATUSES,
+    read_entries,
+    rotated_logs,
+)
+from cache_logging import cache_logging_basic_setup, log_message
+from remove_old_files import bytes_to_human_string
+
+DEFAULT_WINDOW = timedelta(hours=1)
+"""Default duration of the time windows reported."""
+
+
+class LatencyHistogram:
+    """Histogram of request processing times, for computing quantiles with bounded
+    memory.  ``nginx`` logs ``$request_time`` with a millisecond resolution, so there
+    are only as many distinct times as milliseconds taken by the slowest request.
+
+    **Attributes**
+    count: int
+        Number of times added.
+
+    counts: Counter[float]
+        Number of requests by processing time in seconds.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.counts: Counter[float] = Counter()
+
+    def add(self, seconds: float) -> None:
+        """Count a request that took ``seconds``."""
+        self.count += 1
+        self.counts[seconds] += 1
+
+    def update(self, other: LatencyHistogram) -> None:
+        """Add every time counted by ``other``."""
+        self.count += other.count
+        self.counts.update(other.counts)
+
+    def quantile(self, q: float) -> float | None:
+        """Return the ``q`` quantile (nearest rank), or ``None`` if no times were
+        added."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for seconds in sorted(self.counts):
+            seen += self.counts[seconds]
+            if seen >= rank:
+                return seconds
+        return None
+
+
+class TrafficStats:
+    """Aggregate statistics of the requests of a time window.
+
+    **Attributes**
+    requests: int
+        Number of requests.
+
+    hits: int
+        Number of ``GET`` requests that found the requested entry.
+
+    misses: int
+        Number of ``GET`` requests answered with ``404``.
+
+    not_found: int
+        Number of requests (of any method) answered with ``404``.
+
+    puts: int
+        Number of ``PUT`` requests.
+
+    bytes_sent: int
+        Total size of the response bodies.
+
+    bytes_received: int
+        Total size of the requests, for the requests where it was logged.
+
+    latencies: LatencyHistogram
+        Request processing times, for the requests where it was logged.
+
+    salt_requests, salt_bytes: Counter[str]
+        Number of requests and bytes sent or received of every ``<version>/<salt>``.
+
+    client_requests, client_bytes: Counter[str]
+        Number of requests and bytes sent or received of every client address.
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_found = 0
+        self.puts = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latencies = LatencyHistogram()
+        self.salt_requests: Counter[str] = Counter()
+        self.salt_bytes: Counter[str] = Counter()
+        self.client_requests: Counter[str] = Counter()
+        self.client_bytes: Counter[str] = Counter()
+
+    def add(self, entry: AccessLogEntry) -> None:
+        """Account for the request ``entry``."""
+        remote_addr, _, method, uri, status, transferred, request_time, length = entry
+        self.requests += 1
+        if method == "GET":
+            if status in HIT_STATUSES:
+                self.hits += 1
+            elif status == 404:
+                self.misses += 1
+        elif method == "PUT":
+            self.puts += 1
+        if status == 404:
+            self.not_found += 1
+        self.bytes_sent += transferred
+        if length is not None:
+            self.bytes_received += length
+            transferred += length
+        if request_time is not None:
+            self.latencies.add(request_time)
+
+        # The URI of a cache entry is /<version>/<salt>/{ac,cas}/<hash>.
+        parts = uri.split("/", 3)
+        salt = f"{parts[1]}/{parts[2]}" if len(parts) == 4 else "(other)"
+        self.salt_requests[salt] += 1
+        self.salt_bytes[salt] += transferred
+        self.client_requests[remote_addr] += 1
+        self.client_bytes[remote_addr] += transferred
+
+    def update(self, other: TrafficStats) -> None:
+        """Add every request accounted for by ``other``."""
+        self.requests += other.requests
+        self.hits += other.hits
+        self.misses += other.misses
+        self.not_found += other.not_found
+        self.puts += other.puts
+        self.bytes_sent += other.bytes_sent
+        self.bytes_received += other.bytes_received
+        self.latencies.update(other.latencies)
+        self.salt_requests.update(other.salt_requests)
+        self.salt_bytes.update(other.salt_bytes)
+        self.client_requests.update(other.client_requests)
+        self.client_bytes.update(other.client_bytes)
+
+    def log(self, title: str, top: int) -> None:
+        """Log the statistics under ``title``, with the ``top`` salts and clients."""
+
+        def percent(count: int, total: int) -> str:
+            return f"{round(100.0 * count / total, 2)}%" if total else "n/a"
+
+        def milliseconds(seconds: float | None) -> str:
+            return f"{round(seconds * 1000.0, 1)} ms" if seconds is not None else "n/a"
+
+        log_message(f"==> {title}")
+        log_message(
+            f"Requests: {self.requests} ({self.hits + self.misses} GET hit/miss, "
+            f"{self.puts} PUT)"
+        )
+        log_message(
+            f"Hit ratio: {percent(self.hits, self.hits + self.misses)} "
+            f"({self.hits} hits, {self.misses} misses)"
+        )
+        log_message(f"404 rate: {percent(self.not_found, self.requests)}")
+        log_message(
+            f"Bytes out: {bytes_to_human_string(self.bytes_sent)}, "
+            f"bytes in: {bytes_to_human_string(self.bytes_received)}"
+        )
+        log_message(
+            f"Request time: p50 {milliseconds(self.latencies.quantile(0.5))}, "
+            f"p99 {milliseconds(self.latencies.quantile(0.99))}"
+        )
+        for kind, requests, transferred in (
+            ("salts", self.salt_requests, self.salt_bytes),
+            ("clients", self.client_requests, self.client_bytes),
+        ):
+            log_message(f"Top {kind}:")
+            for key, n_bytes in transferred.most_common(top):
+                log_message(
+                    f"  {key}: {bytes_to_human_string(n_bytes)}, "
+                    f"{requests[key]} request(s)"
+                )
+
+
+def collect_stats(
+    entries: Iterable[AccessLogEntry], window: timedelta
+) -> dict[datetime, TrafficStats]:
+    """Return the :class:`TrafficStats` of ``entries`` by the start of their time
+    ``window``, in chronological order."""
+    window_seconds = window.total_seconds()
+    by_window: dict[datetime, TrafficStats] = {}
+    # Consecutive requests are almost always in the same window, avoid looking it up.
+    current_time = None
+    current_stats: TrafficStats | None = None
+    for entry in entries:
+        if entry.time != current_time:
+            timestamp = entry.time.timestamp()
+            start = datetime.fromtimestamp(
+                timestamp - timestamp % window_seconds, entry.time.tzinfo
+            )
+            current_stats = by_window.get(start)
+            if current_stats is None:
+                current_stats = by_window[start] = TrafficStats()
+            current_time = entry.time
+        assert current_stats is not None
+        current_stats.add(entry)
+    return dict(sorted(by_window.items()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "-w",
+        "--window-minutes",
+        type=float,
+        default=DEFAULT_WINDOW.total_seconds() / 60.0,
+        help="Duration in minutes of every time window (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=5,
+        help="Number of salts and clients listed per window (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--summary-only",
+        action="store_true",
+        help="Only report the statistics of all of the logs combined.",
+    )
+    parser.add_argument(
+        "access_logs",
+        type=Path,
+        nargs="*",
+        help=(
+            "The access logs to read, in chronological order (default: "
+            f"{DEFAULT_ACCESS_LOG} and its rotated siblings)."
+        ),
+    )
+
+    args = parser.parse_args()
+
+    if args.window_minutes <= 0.0:
+        parser.error("window-minutes must be positive.")
+    if args.top < 0:
+        parser.error("top must be greater than or equal to 0.")
+
+    access_logs = args.access_logs or rotated_logs(DEFAULT_ACCESS_LOG)
+    if not access_logs:
+        parser.error(f"no access logs found at '{DEFAULT_ACCESS_LOG}'.")
+    for access_log in access_logs:
+        if not access_log.is_file():
+            parser.error(f"the provided access log '{access_log}' is not a file.")
+
+    cache_logging_basic_setup()
+    log_message(f"Access logs: {', '.join(str(p) for p in access_logs)}")
+    by_window = collect_stats(
+        read_entries(access_logs), timedelta(minutes=args.window_minutes)
+    )
+    total = TrafficStats()
+    for start, stats in by_window.items():
+        if not args.summary_only:
+            stats.log(f"{start} ({args.window_minutes} minutes)", args.top)
+        total.update(stats)
+    if by_window:
+        first = next(iter(by_window))
+        total.log(f"Total since {first}", args.top)
+    else:
+        log_message("No requests found.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Benchmark the scan of ``remove_old_files.py`` on a synthetic cache tree.
+
+A tree laid out like ``/cache/data`` (see ``cache_layout.py``) is generated under
+``--tree`` once: ``--files`` entries spread over ``--salts`` salts, about one in ten
+in the action cache and the others in the sharded ``cas``, plus a few broken symbolic
+links (which cannot be stat'ed).  Files are sparse, so the tree only uses inodes and
+the blocks of its (many ``cas`` shard) directories, about 2 GiB for a million files.
+The tree is reused by later runs with the same ``--files``.
+
+``scan_files`` is then timed for every ``--jobs``, against the single threaded
+``os.walk`` and ``Path.stat()`` walker it replaced, and their results are compared:
+the same (path, size) of every file, and the same files that could not be stat'ed.
+The best of ``--repeat`` runs is reported.  Runs read the tree from the page cache,
+unless ``--drop-caches`` (``root`` only) drops it before every run, which is closer to
+the latency bound scan of a large volume.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+from cache_layout import AC, cas_path
+from cache_logging import cache_logging_basic_setup, log_message
+from remove_old_files import scan_files
+
+_MARKER = ".benchmark_scan_files"
+"""The file recording the number of files of a generated tree."""
+
+_BROKEN_LINKS = 16
+"""Number of broken symbolic links added to the tree."""
+
+_DEFAULT_JOBS = [1, 4, 16]
+"""The numbers of threads timed, unless ``--jobs`` is given."""
+
+
+def generated_files(root: Path) -> int | None:
+    """Return the number of files of the tree generated at ``root``, ``None`` if
+    none was."""
+    try:
+        return int((root / _MARKER).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def generate_tree(root: Path, n_files: int, n_salts: int, seed: int) -> None:
+    """Create a synthetic cache tree of ``n_files`` entries under the (empty)
+    directory ``root``."""
+    log_message(f"Generating a tree of {n_files} file(s) at {root}...")
+    rng = random.Random(seed)
+    salts = [f"{rng.getrandbits(160):040x}" for _ in range(n_salts)]
+    root_str = str(root)
+    start = time.perf_counter()
+    for i in range(n_files):
+        salt = salts[(i // 10) % n_salts]
+        digest = f"{rng.getrandbits(256):064x}"
+        if i % 10 == 0:
+            path = os.path.join(root_str, "v7", salt, AC, digest)
+            size = rng.randrange(100, 2000)
+        else:
+            path = cas_path(root_str, "v7", salt, digest)
+            size = min(int(rng.lognormvariate(9.0, 2.0)), 2**30)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            os.ftruncate(fd, size)
+        finally:
+            os.close(fd)
+    for i in range(_BROKEN_LINKS):
+        directory = os.path.join(root_str, "v7", salts[i % n_salts], AC)
+        os.makedirs(directory, exist_ok=True)
+        os.symlink(
+            os.path.join(root_str, "missing"), os.path.join(directory, f"broken-{i}")
+        )
+    (root / _MARKER).write_text(f"{n_files}\n")
+    log_message(f"Generated in {time.perf_counter() - start:.2f} s.")
+
+
+def walk_baseline(root: Path) -> tuple[dict[str, int], set[str]]:
+    """Return the (path: size) of every file under ``root``, and the paths that could
+    not be stat'ed, as ``CacheDirectory`` gathered them before ``scan_files``."""
+    sizes: dict[str, int] = {}
+    invalid: set[str] = set()
+    for directory_root, _, file_names in os.walk(root):
+        directory_root_path = Path(directory_root)
+        for f in file_names:
+            f_path = directory_root_path / f
+            try:
+                sizes[str(f_path)] = f_path.stat().st_size
+            except Exception:
+                invalid.add(str(f_path))
+    return sizes, invalid
+
+
+def scan(root: Path, jobs: int) -> tuple[dict[str, int], set[str]]:
+    """Return the same as :func:`walk_baseline`, using ``scan_files``."""
+    sizes: dict[str, int] = {}
+    invalid: set[str] = set()
+    for f, f_stat in scan_files(root, jobs):
+        if isinstance(f_stat, Exception):
+            invalid.add(f)
+        else:
+            sizes[f] = f_stat.st_size
+    return sizes, invalid
+
+
+def drop_caches() -> None:
+    """Write the dirty pages, and drop the page, dentry, and inode caches."""
+    os.sync()
+    with open("/proc/sys/vm/drop_caches", "w") as f:
+        f.write("3\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--tree",
+        type=Path,
+        required=True,
+        help="Where the synthetic tree is generated (and reused), e.g., /tmp/tree.",
+    )
+    parser.add_argument(
+        "--files",
+        type=int,
+        default=1_000_000,
+        help="Number of files of the tree (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--salts",
+        type=int,
+        default=8,
+        help="Number of salts the files are spread over (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the generated names and sizes (default: %(default)s).",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        action="append",
+        help=(
+            "Number of threads of scan_files, may be repeated "
+            f"(default: {', '.join(map(str, _DEFAULT_JOBS))})."
+        ),
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help=(
+            "Number of runs of every scan, the best is reported "
+            "(default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--drop-caches",
+        action="store_true",
+        help="Drop the page, dentry, and inode caches before every run (as root).",
+    )
+
+    args = parser.parse_args()
+
+    if args.files < 1 or args.salts < 1 or args.repeat < 1:
+        parser.error("files, salts, and repeat must be at least 1.")
+    jobs = args.jobs or _DEFAULT_JOBS
+    if min(jobs) < 1:
+        parser.error("jobs must be at least 1.")
+    if args.drop_caches and os.geteuid() != 0:
+        parser.error("drop-caches must run as root.")
+
+    args.tree.mkdir(parents=True, exist_ok=True)
+    n_generated = generated_files(args.tree)
+    if n_generated is None and any(args.tree.iterdir()):
+        parser.error(f"'{args.tree}' is not empty, and not a generated tree.")
+    if n_generated is not None and n_generated != args.files:
+        parser.error(
+            f"'{args.tree}' is a tree of {n_generated} file(s), not {args.files}."
+        )
+
+    cache_logging_basic_setup()
+    if n_generated is None:
+        generate_tree(args.tree, args.files, args.salts, args.seed)
+    else:
+        log_message(f"Reusing the tree of {n_generated} file(s) at {args.tree}.")
+
+    def best_of(label: str, run) -> tuple[dict[str, int], set[str]]:
+        best = float("inf")
+        for _ in range(args.repeat):
+            if args.drop_caches:
+                drop_caches()
+            start = time.perf_counter()
+            result = run()
+            best = min(best, time.perf_counter() - start)
+        log_message(
+            f"{label:<24} {best:8.2f} s  {len(result[0])} file(s), "
+            f"{len(result[1])} invalid"
+        )
+        return result
+
+    baseline = best_of("os.walk + Path.stat()", lambda: walk_baseline(args.tree))
+    identical = True
+    for n in jobs:
+        result = best_of(f"scan_files(jobs={n})", lambda: scan(args.tree, n))
+        if result != baseline:
+            identical = False
+            log_message(
+                f"ERROR: scan_files(jobs={n}) differs from the baseline: "
+                f"{len(result[0].keys() ^ baseline[0].keys())} path(s), "
+                f"{len(result[1] ^ baseline[1])} invalid path(s)."
+            )
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Persistent scan index for the cache server data directory.
+
+Scanning ``/cache/data`` from scratch every time ``remove_old_files.py`` runs means
+calling ``stat`` on every file in the cache, even though only a small fraction of
+the cache changes between two runs.  The :class:`ScanIndex` stores the result of the
+previous scan in an SQLite database: the modification time of every directory, and
+the size / allocated blocks / access time / modification time of every file.
+
+Adding, removing, or renaming (which is how ``nginx`` completes a ``PUT``) a file in a
+directory updates the modification time of that directory.  A directory whose
+modification time is unchanged since the previous scan therefore has the same
+entries, and the stat results of its files are loaded from the index rather than
+queried from the filesystem.  Reading a file does **not** update the modification time
+of its directory, so access times loaded from the index may be stale (too old).
+Consumers relying on access times must re-check them before acting on them.
+
+This file must live in the same directory as the helper scripts that use it."""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+DEFAULT_INDEX_PATH = Path("/cache/log/drake-ci/remove_old_files_index.sqlite3")
+"""Default location of the scan index (not on the cache data volume itself)."""
+
+_SCHEMA_VERSION = "2"
+"""Bump whenever the tables below change, existing indices will be rebuilt."""
+
+
+class IndexedStat(NamedTuple):
+    """The subset of ``os.stat_result`` stored in the index.  Field names match
+    ``os.stat_result`` so that either can be queried the same way."""
+
+    st_size: int
+    st_atime_ns: int
+    st_mtime_ns: int
+    st_blocks: int
+
+    @property
+    def st_atime(self) -> float:
+        return self.st_atime_ns / 1e9
+
+    @property
+    def st_mtime(self) -> float:
+        return self.st_mtime_ns / 1e9
+
+
+class IndexedError(Exception):
+    """Stat error of a file recorded by a previous scan (e.g., a broken symlink)."""
+
+
+class ScanIndex:
+    """SQLite backed index of the directories and files found by a previous scan.
+
+    Usage:
+
+    1. Create the ScanIndex for the cache ``root`` being scanned.
+    2. For every directory encountered, compare its current modification time to
+       :attr:`ScanIndex.directory_mtimes`.  Unchanged directories can use
+       :attr:`ScanIndex.subdirectories` and :func:`ScanIndex.cached_files`, changed
+       directories must be listed and recorded with
+       :func:`ScanIndex.update_directory`.
+    3. Call :func:`ScanIndex.finish` with every directory visited, which drops
+       directories that no longer exist and commits the changes.
+
+    A ``read_only`` index is a snapshot of the database as it was when opened (e.g.,
+    to check it while another run may be updating it): recording and dropping
+    directories do nothing.
+
+    **Attributes**
+    path: Path
+        Path to the SQLite database file.
+
+    root: Path
+        The cache directory root that the index describes.
+
+    read_only: bool
+        Whether the database is never modified.
+
+    directory_mtimes: dict[str, int]
+        The ``st_mtime_ns`` of every directory at the time it was last listed.
+
+    subdirectories: dict[str, list[str]]
+        The subdirectories of every directory at the time it was last listed.
+    """
+
+    def __init__(
+        self, *, path: Path, root: Path, rebuild: bool = False, read_only: bool = False
+    ) -> None:
+        self.path = path
+        self.root = root
+        self.read_only = read_only
+        self.directory_mtimes: dict[str, int] = {}
+        self.subdirectories: dict[str, list[str]] = {}
+        if read_only:
+            if not path.is_file():
+                raise FileNotFoundError(f"no scan index at '{path}'")
+            self.connection = sqlite3.connect(
+                f"{path.absolute().as_uri()}?mode=ro", uri=True, timeout=600.0
+            )
+            # Every later query reads the same snapshot, until close().
+            self.connection.execute("BEGIN")
+            meta = dict(self.connection.execute("SELECT key, value FROM meta"))
+            if meta != {"schema_version": _SCHEMA_VERSION, "root": str(root)}:
+                raise ValueError(f"the scan index '{path}' does not describe '{root}'")
+            self._load_directories()
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # NOTE: another (overlapping) cron job may hold the database for a while.
+        self.connection = sqlite3.connect(path, timeout=600.0)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        meta = dict(self.connection.execute("SELECT key, value FROM meta"))
+        expected_meta = {"schema_version": _SCHEMA_VERSION, "root": str(root)}
+        if rebuild or any(meta.get(k) != v for k, v in expected_meta.items()):
+            self.connection.executescript(
+                """
+                DROP TABLE IF EXISTS directories;
+                DROP TABLE IF EXISTS files;
+                DELETE FROM meta;
+                """
+            )
+            self.connection.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)", expected_meta.items()
+            )
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS directories (
+                path TEXT PRIMARY KEY,
+                parent TEXT,
+                mtime_ns INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                dir TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER,
+                blocks INTEGER,
+                atime_ns INTEGER,
+                mtime_ns INTEGER,
+                error TEXT,
+                PRIMARY KEY (dir, name)
+            ) WITHOUT ROWID;
+            """
+        )
+        self.connection.commit()
+        self._load_directories()
+
+    def _load_directories(self) -> None:
+        for directory, parent, mtime_ns in self.connection.execute(
+            "SELECT path, parent, mtime_ns FROM directories"
+        ):
+            self.directory_mtimes[directory] = mtime_ns
+            self.subdirectories.setdefault(directory, [])
+            if parent is not None:
+                self.subdirectories.setdefault(parent, []).append(directory)
+
+    def is_unchanged(self, directory: str, mtime_ns: int) -> bool:
+        """Return whether ``directory`` has the same entries as when it was indexed."""
+        return self.directory_mtimes.get(directory) == mtime_ns
+
+    def cached_files(
+        self, directory: str
+    ) -> list[tuple[str, IndexedStat | IndexedError]]:
+        """Return the (file path, stat or error) of the files recorded for
+        ``directory``."""
+        files: list[tuple[str, IndexedStat | IndexedError]] = []
+        for name, size, blocks, atime_ns, mtime_ns, error in self.connection.execute(
+            "SELECT name, size, blocks, atime_ns, mtime_ns, error FROM files "
+            "WHERE dir = ?",
+            (directory,),
+        ):
+            f_path = os.path.join(directory, name)
+            if error is not None:
+                files.append((f_path, IndexedError(error)))
+            else:
+                files.append(
+                    (f_path, IndexedStat(size, atime_ns, mtime_ns, blocks))
+                )
+        return files
+
+    def total_size(self, directory: str) -> int | None:
+        """Return the disk space allocated to the files indexed under ``directory``
+        (recursively, ``st_blocks * 512`` like ``allocated_bytes`` of
+        ``remove_old_files.py``), or ``None`` if ``directory`` has not been indexed."""
+        if directory not in self.directory_mtimes:
+            return None
+        # Every subdirectory path sorts between "directory/" and "directory0" ("0"
+        # immediately follows "/"), which the primary key can range scan.
+        (size,) = self.connection.execute(
+            "SELECT COALESCE(SUM(blocks), 0) * 512 FROM files "
+            "WHERE dir = ? OR (dir >= ? AND dir < ?)",
+            (directory, directory + "/", directory + "0"),
+        ).fetchone()
+        return size
+
+    def files_under(self, directory: str) -> Iterator[tuple[str, IndexedStat]]:
+        """Yield the (file path, stat) of the files indexed under ``directory``
+        (recursively), except those whose stat failed."""
+        for dir_path, name, size, blocks, atime_ns, mtime_ns in self.connection.execute(
+            "SELECT dir, name, size, blocks, atime_ns, mtime_ns FROM files "
+            "WHERE (dir = ? OR (dir >= ? AND dir < ?)) AND error IS NULL",
+            (directory, directory + "/", directory + "0"),
+        ):
+            yield (
+                os.path.join(dir_path, name),
+                IndexedStat(size, atime_ns, mtime_ns, blocks),
+            )
+
+    def update_directory(
+        self,
+        directory: str,
+        mtime_ns: int,
+        subdirectories: list[str],
+        files: list[tuple[str, os.stat_result | Exception]],
+    ) -> None:
+        """Replace everything recorded for ``directory`` with a new listing.
+
+        The ``mtime_ns`` must have been queried **before** listing the directory, so
+        that entries added while listing are picked up by the next scan."""
+        if self.read_only:
+            return
+        parent = os.path.dirname(directory) if directory != str(self.root) else None
+        self.connection.execute(
+            "INSERT OR REPLACE INTO directories (path, parent, mtime_ns) "
+            "VALUES (?, ?, ?)",
+            (directory, parent, mtime_ns),
+        )
+        self.connection.execute("DELETE FROM files WHERE dir = ?", (directory,))
+        rows = []
+        for f_path, f_stat in files:
+            name = os.path.basename(f_path)
+            if isinstance(f_stat, Exception):
+                rows.append((directory, name, None, None, None, None, str(f_stat)))
+            else:
+                rows.append(
+                    (
+                        directory,
+                        name,
+                        f_stat.st_size,
+                        f_stat.st_blocks,
+                        f_stat.st_atime_ns,
+                        f_stat.st_mtime_ns,
+                        None,
+                    )
+                )
+        self.connection.executemany(
+            "INSERT INTO files (dir, name, size, blocks, atime_ns, mtime_ns, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.directory_mtimes[directory] = mtime_ns
+        self.subdirectories[directory] = list(subdirectories)
+
+    def finish(self, visited: set[str]) -> None:
+        """Drop every directory (and its files) not in ``visited``, and commit."""
+        if self.read_only:
+            return
+        stale = [(d,) for d in self.directory_mtimes if d not in visited]
+        self.connection.executemany("DELETE FROM directories WHERE path = ?", stale)
+        self.connection.executemany("DELETE FROM files WHERE dir = ?", stale)
+        for (directory,) in stale:
+            del self.directory_mtimes[directory]
+            self.subdirectories.pop(directory, None)
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
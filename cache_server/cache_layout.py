@@ -0,0 +1,148 @@
+"""Layout of the cache data directory served by ``nginx``.
+
+``nginx`` serves ``/cache/data`` at ``/``, and ``bazel`` is configured with
+``--remote_cache=http://<server>/<version>/<salt>`` (see ``cache.cmake``), so that the
+action cache and content addressed storage entries live at::
+
+    /cache/data/<version>/<salt>/ac/<hash>
+    /cache/data/<version>/<salt>/cas/<hash[0:2]>/<hash[2:4]>/<hash>
+
+A salt accumulates millions of blobs, so ``drake_cache_server_nginx.conf`` rewrites
+``/<version>/<salt>/cas/<hash>`` requests onto two levels of shard directories rather
+than a single flat ``cas`` directory.  The URIs used by ``bazel`` (and logged to the
+access log) are unchanged.  Flat ``cas/<hash>`` files left from before the rewrite are
+no longer served, ``migrate_cas_layout.py`` moves them into their shard.
+
+This file must live in the same directory as the helper scripts that use it."""
+
+from __future__ import annotations
+
+import os
+from typing import NamedTuple
+
+AC = "ac"
+"""Subdirectory of a salt holding the action cache (``ActionResult`` protobufs)."""
+
+CAS = "cas"
+"""Subdirectory of a salt holding the content addressed storage (blobs)."""
+
+CAS_SHARD_WIDTH = 2
+"""Number of hexadecimal digits of the hash naming each level of ``cas`` shards."""
+
+CAS_SHARD_DEPTH = 2
+"""Number of levels of ``cas`` shard directories."""
+
+_HEX_DIGITS = frozenset("0123456789abcdef")
+
+
+class SaltDirectory(NamedTuple):
+    """The components of the path of an ``ac`` / ``cas`` directory relative to the
+    cache root."""
+
+    version: str
+    """The cache key version, e.g., ``v7``."""
+
+    salt: str
+    """The salt (hash of the toolchain versions) of the build flavor."""
+
+    kind: str
+    """Either :data:`AC` or :data:`CAS`."""
+
+
+class CacheKey(NamedTuple):
+    """The components of the path of a cache entry relative to the cache root."""
+
+    version: str
+    """The cache key version, e.g., ``v7``."""
+
+    salt: str
+    """The salt (hash of the toolchain versions) of the build flavor."""
+
+    kind: str
+    """Either :data:`AC` or :data:`CAS`."""
+
+    digest: str
+    """The (hexadecimal) hash of the entry."""
+
+
+def _is_shard(name: str) -> bool:
+    """Return whether ``name`` is the name of a ``cas`` shard directory."""
+    return len(name) == CAS_SHARD_WIDTH and _HEX_DIGITS.issuperset(name)
+
+
+def cas_shards(digest: str) -> list[str]:
+    """Return the shard directory names of the blob ``digest``, outermost first."""
+    return [
+        digest[i * CAS_SHARD_WIDTH : (i + 1) * CAS_SHARD_WIDTH]
+        for i in range(CAS_SHARD_DEPTH)
+    ]
+
+
+def parse_relative_directory(relative_directory: str) -> SaltDirectory | None:
+    """Return the :class:`SaltDirectory` of a directory relative to the cache root, or
+    ``None`` if it is not an ``ac`` / ``cas`` directory.  Every ``cas`` shard directory
+    (at any level) is part of the ``cas`` of its salt."""
+    parts = relative_directory.strip("/").split("/")
+    if len(parts) < 3 or parts[2] not in (AC, CAS):
+        return None
+    if len(parts) > 3 and (
+        parts[2] != CAS
+        or len(parts) > 3 + CAS_SHARD_DEPTH
+        or not all(_is_shard(p) for p in parts[3:])
+    ):
+        return None
+    return SaltDirectory(*parts[:3])
+
+
+def parse_relative_path(relative_path: str) -> CacheKey | None:
+    """Return the :class:`CacheKey` of a path relative to the cache root, or ``None``
+    if it does not describe a cache entry (e.g., ``client-body-temp/...``).  Blobs are
+    only recognized in the shard ``nginx`` serves them from, not in a flat ``cas``."""
+    parts = relative_path.strip("/").split("/")
+    if len(parts) < 4 or parts[2] not in (AC, CAS):
+        return None
+    digest = parts[-1]
+    if parts[2] == AC and len(parts) == 4:
+        return CacheKey(parts[0], parts[1], AC, digest)
+    if parts[2] == CAS and parts[3:-1] == cas_shards(digest):
+        return CacheKey(parts[0], parts[1], CAS, digest)
+    return None
+
+
+def parse_uri(uri: str) -> CacheKey | None:
+    """Return the :class:`CacheKey` of a URI requested by ``bazel`` (e.g.,
+    ``/v7/<salt>/cas/<hash>``), or ``None`` if it does not describe a cache entry."""
+    parts = uri.split("?", 1)[0].strip("/").split("/")
+    if len(parts) != 4 or parts[2] not in (AC, CAS) or not parts[3]:
+        return None
+    return CacheKey(*parts)
+
+
+def cas_path(root: str, version: str, salt: str, digest: str) -> str:
+    """Return the path of the blob ``digest`` in the ``cas`` of a salt."""
+    return os.path.join(root, version, salt, CAS, *cas_shards(digest), digest)
+
+
+def relative_path(root: str, path: str) -> str:
+    """Return ``path`` relative to the cache ``root`` (``path`` must be under it)."""
+    prefix = root.rstrip(os.sep) + os.sep
+    if path.startswith(prefix):
+        return path[len(prefix) :]
+    return os.path.relpath(path, root)
+
+
+def uri_from_path(root: str, path: str) -> str:
+    """Return the URI ``nginx`` serves the file at ``path`` under ``root`` with."""
+    relative = relative_path(root, path).replace(os.sep, "/")
+    key = parse_relative_path(relative)
+    if key is not None and key.kind == CAS:
+        return f"/{key.version}/{key.salt}/{CAS}/{key.digest}"
+    return "/" + relative
+
+
+def path_from_uri(root: str, uri: str) -> str:
+    """Return the path of the file ``nginx`` serves at ``uri`` from ``root``."""
+    parts = uri.split("?", 1)[0].strip("/").split("/")
+    if len(parts) == 4 and parts[2] == CAS:
+        return cas_path(root, *parts[:2], parts[3])
+    return os.path.join(root, *parts)
@@ -3,11 +3,51 @@
 ``cache_logging_basic_setup`` to configure the python logging module, and then use the
 ``log_message`` method to prefix every line of logged output with timestamps.
 
+When the environment variable ``DRAKE_CACHE_LOG_FORMAT`` is ``json`` (or when
+``cache_logging_basic_setup`` is called with ``json_lines=True``), every message is
+instead logged as a single JSON object per line, with the typed fields passed to
+``log_message`` (e.g., ``bytes_removed``) so that logs can be parsed and charted.
+``timed_phase`` measures the resources used by a phase of a script (wall and CPU
+time, peak memory, I/O) and logs them when the phase ends.
+
 This file must live in the same directory as the helper scripts that use it."""
 
+from __future__ import annotations
+
+import json
 import logging
+import os
+import resource
 import sys
-from typing import TextIO
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterator, TextIO
+
+LOG_FORMAT_ENVIRONMENT_VARIABLE = "DRAKE_CACHE_LOG_FORMAT"
+"""Set to ``json`` to log JSON lines rather than text."""
+
+_json_lines = False
+"""Whether ``cache_logging_basic_setup`` configured JSON lines."""
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format every record as a JSON object on a single line, with the time, level,
+    script, message, and the fields passed to :func:`log_message`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created).astimezone().isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname.lower(),
+            "script": os.path.basename(sys.argv[0]),
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        # default=str: paths, datetimes, and enums are logged by their string.
+        return json.dumps(entry, default=str)
 
 
 def _logging_basic_config(
@@ -21,23 +61,129 @@ def _logging_basic_config(
     logging.basicConfig(format=format, datefmt=datefmt, stream=stream, **kwargs)
 
 
-def log_message(message: str) -> None:
+def log_message(message: str, **fields: Any) -> None:
     """Log each line in ``message`` (individually) to ``logging.warning``.  Assumes
     ``logging.basicConfig`` has already been configured.
 
     In the log files we want an organized structure with all messages preceded
     by their date.
+
+    The ``fields`` are only logged in the JSON lines mode, where the whole ``message``
+    is a single record.  They must be serializable by ``json`` (or by ``str``).
     """
     assert isinstance(message, str), "log_message parameter must be a string."
+    if _json_lines:
+        logging.warning(message.strip("\n"), extra={"fields": fields})
+        return
     for line in message.splitlines():
         logging.warning(line)
 
 
-def cache_logging_basic_setup(**kwargs):
+def cache_logging_basic_setup(json_lines: bool | None = None, **kwargs):
     """Create the basic logging configuration and log a separation line to the console
     for making log entries easy to distinguish in remote logfiles.
 
-    The keyword arguments are simply passed-through to ``logging.basicConfig``.
+    When ``json_lines`` is ``None``, JSON lines are logged if the environment variable
+    :data:`LOG_FORMAT_ENVIRONMENT_VARIABLE` is ``json``.  The other keyword arguments
+    are simply passed-through to ``logging.basicConfig``.
     """
+    global _json_lines
+    if json_lines is None:
+        json_lines = os.environ.get(LOG_FORMAT_ENVIRONMENT_VARIABLE, "") == "json"
+    _json_lines = json_lines
     _logging_basic_config(**kwargs)
-    log_message("=" * 80)
+    if json_lines:
+        for handler in logging.getLogger().handlers:
+            handler.setFormatter(JsonLinesFormatter())
+        log_message("start", event="start", argv=sys.argv)
+    else:
+        log_message("=" * 80)
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the peak resident set size of this process (Linux only), return whether
+    it was reset."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_bytes() -> int:
+    """Return the peak resident set size of this process, since the latest reset if it
+    could be reset."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    # Since the start of the process, in KiB on Linux (bytes on macOS).
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def _io_counters() -> dict[str, int]:
+    """Return the I/O counters of this process: bytes read from / written to storage
+    and the number of read / write system calls, or what ``getrusage`` provides."""
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(":") for line in f if ":" in line)
+        return {
+            "read_bytes": int(counters["read_bytes"]),
+            "write_bytes": int(counters["write_bytes"]),
+            "read_syscalls": int(counters["syscr"]),
+            "write_syscalls": int(counters["syscw"]),
+        }
+    except (OSError, ValueError, KeyError):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # Blocks of 512 bytes.
+        return {
+            "read_bytes": usage.ru_inblock * 512,
+            "write_bytes": usage.ru_oublock * 512,
+        }
+
+
+@contextmanager
+def timed_phase(name: str, **fields: Any) -> Iterator[dict[str, Any]]:
+    """Measure the phase ``name`` of a script and log its wall time, CPU time (of all
+    threads), peak resident set size, and I/O counters when it ends.
+
+    Yields a dictionary of ``fields`` logged with the measurements (JSON lines mode),
+    to which the phase can add its own results, e.g., the number of files removed.  On
+    Linux, the peak memory is that of the phase (so phases must not be nested);
+    elsewhere it is the peak of the process so far.
+    """
+    phase_fields = dict(fields)
+    reset = _reset_peak_rss()
+    io_start = _io_counters()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    failed = True
+    try:
+        yield phase_fields
+        failed = False
+    finally:
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.process_time() - cpu_start
+        peak_rss_bytes = _peak_rss_bytes()
+        io = {k: v - io_start.get(k, 0) for k, v in _io_counters().items()}
+        mib = 1024.0 * 1024.0
+        log_message(
+            f"Phase {name}{' (failed)' if failed else ''}: "
+            f"{wall_seconds:.2f} s wall, {cpu_seconds:.2f} s CPU, "
+            f"{'' if reset else 'process '}peak RSS {peak_rss_bytes / mib:.1f} MiB, "
+            f"{io['read_bytes'] / mib:.1f} MiB read, "
+            f"{io['write_bytes'] / mib:.1f} MiB written.",
+            event="phase",
+            phase=name,
+            failed=failed,
+            wall_seconds=wall_seconds,
+            cpu_seconds=cpu_seconds,
+            peak_rss_bytes=peak_rss_bytes,
+            **io,
+            **phase_fields,
+        )
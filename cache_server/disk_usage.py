@@ -3,16 +3,54 @@
 
 This script is expected to be run via /etc/crontab daily, as `root`.  Its output should
 be redirected to a logfile.
+
+Every sample is also appended to the usage time series of the volume (see
+``usage_series.py``).  From the samples of the last few hours, the rate at which the
+volume is filling up is estimated, and the script fails if the volume is predicted to
+reach ``--alert-percent`` soon, not only when it is already past ``--threshold``.  The
+``--report`` mode logs the growth of every hour instead.
+
+Whether ``remove_old_files.py`` or ``prune_daemon.py`` is currently pruning (and in
+which phase) is read from their lock file (see ``prune_lock.py``) and reported too.
 """
 
 import argparse
 import os
 import shutil
 import sys
+import time
+from datetime import timedelta
 from pathlib import Path
 from textwrap import dedent
 
 from cache_logging import cache_logging_basic_setup, log_message
+from prune_lock import DEFAULT_LOCK_PATH, read_prune_state
+from usage_series import (
+    DEFAULT_SERIES_DIR,
+    UsageSample,
+    UsageSeries,
+    fill_rate,
+    hourly_growth,
+    series_path,
+    time_to_reach,
+)
+
+BYTES_TO_GiB = 1073741824.0  # 1024.0 * 1024.0 * 1024.0
+
+
+def log_hourly_report(series: UsageSeries, hours: float) -> None:
+    """Log the bytes added / removed during every hour of the last ``hours``."""
+    samples = series.samples(since=time.time() - hours * 3600.0)
+    log_message(f"==> Hourly growth of the last {hours} hours ({series.path})")
+    if len(samples) < 2:
+        log_message("Not enough samples recorded yet.")
+        return
+    log_message(f"{'Hour':<17} {'Added GiB':>10} {'Removed GiB':>12} {'Net GiB':>10}")
+    for hour, added, removed in hourly_growth(samples):
+        log_message(
+            f"{hour:%Y-%m-%d %H:00} {added / BYTES_TO_GiB:>10.2f} "
+            f"{removed / BYTES_TO_GiB:>12.2f} {(added - removed) / BYTES_TO_GiB:>10.2f}"
+        )
 
 
 def main() -> None:
@@ -26,6 +64,59 @@ def main() -> None:
         default=85.0,
         help="Threshold to send an email alert if disk usage exceeds this value.",
     )
+    parser.add_argument(
+        "--alert-percent",
+        type=float,
+        default=95.0,
+        help=(
+            "Fail if the disk usage is predicted to reach this value within "
+            "--alert-within-hours (default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--alert-within-hours",
+        type=float,
+        default=3.0,
+        help="Prediction horizon, 0 disables the prediction (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--forecast-hours",
+        type=float,
+        default=6.0,
+        help=(
+            "Estimate the fill rate from the samples of this many hours "
+            "(default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--series-dir",
+        type=Path,
+        default=DEFAULT_SERIES_DIR,
+        help="Where the usage time series are stored (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help=(
+            "Log the growth of every hour of the last --report-hours from the time "
+            "series, without recording a sample or checking any threshold."
+        ),
+    )
+    parser.add_argument(
+        "--report-hours",
+        type=float,
+        default=48.0,
+        help="Number of hours covered by --report (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--prune-lock",
+        type=Path,
+        default=DEFAULT_LOCK_PATH,
+        help=(
+            "The lock file of remove_old_files.py and prune_daemon.py "
+            "(default: %(default)s)."
+        ),
+    )
     parser.add_argument(
         "mount_point",
         type=Path,
@@ -37,6 +128,11 @@ def main() -> None:
     # We compute a percent used, threshold must represent a percentage.
     if args.threshold <= 0.0 or args.threshold >= 100.0:
         parser.error("threshold must be in the exclusive range (0, 100).")
+    if args.alert_percent <= 0.0 or args.alert_percent > 100.0:
+        parser.error("alert-percent must be in the range (0, 100].")
+    for hours in ("alert_within_hours", "forecast_hours", "report_hours"):
+        if getattr(args, hours) < 0.0:
+            parser.error(f"{hours.replace('_', '-')} must not be negative.")
 
     # shutil.disk_usage accepts files as well, but we want a directory for this script.
     if not args.mount_point.is_dir():
@@ -63,10 +159,21 @@ def main() -> None:
     # Set up logging configurations.
     cache_logging_basic_setup()
 
+    series = UsageSeries(series_path(args.mount_point, args.series_dir))
+    if args.report:
+        log_hourly_report(series, args.report_hours)
+        return
+
+    # Recording is only for the forecast, never fail the usage check because of it.
+    now = time.time()
+    try:
+        series.append(UsageSample(now, du.used, du.total))
+    except Exception as e:
+        log_message(f"ERROR: could not record the sample to '{series.path}': {e}")
+
     # Compute and report the data / statistics we care about.  All of our cache servers
     # operate on the order of gigabytes, so there is no need to be able to detect
     # MB or KB, for example.
-    BYTES_TO_GiB = 1073741824.0  # 1024.0 * 1024.0 * 1024.0
     used_GiB = du.used / BYTES_TO_GiB
     free_GiB = du.free / BYTES_TO_GiB
     total_GiB = du.total / BYTES_TO_GiB
@@ -80,20 +187,104 @@ def main() -> None:
         - %Used: {round(percent_used, 2)}%
     """
     )
-    log_message(mount_data)
+    log_message(
+        mount_data,
+        event="disk_usage",
+        mount_point=args.mount_point,
+        used_bytes=du.used,
+        free_bytes=du.free,
+        total_bytes=du.total,
+        percent_used=percent_used,
+    )
+
+    pruning = None
+    state = read_prune_state(args.prune_lock)
+    if state is None:
+        log_message(
+            "Pruning: no run of remove_old_files.py or prune_daemon.py is active.",
+            event="prune_lock",
+            running=False,
+        )
+    else:
+        now = time.time()
+        argv = state.get("argv") or ["remove_old_files.py"]
+        pruning = (
+            f"{os.path.basename(argv[0])} (process {state.get('pid', '?')}) has been "
+            f"pruning {state.get('root', '?')} for "
+            f"{timedelta(seconds=round(now - state.get('started', now)))}, in the "
+            f"{state.get('phase', '?')} phase for "
+            f"{timedelta(seconds=round(now - state.get('phase_started', now)))}."
+        )
+        log_message(
+            f"Pruning: {pruning}",
+            event="prune_lock",
+            running=True,
+            pid=state.get("pid"),
+            root=state.get("root"),
+            phase=state.get("phase"),
+            seconds=now - state.get("started", now),
+            phase_seconds=now - state.get("phase_started", now),
+        )
+
+    time_to_alert = None
+    if args.alert_within_hours > 0.0:
+        try:
+            samples = series.samples(since=now - args.forecast_hours * 3600.0)
+        except Exception as e:
+            log_message(f"ERROR: could not read '{series.path}': {e}")
+            samples = []
+        rate = fill_rate(samples)
+        if rate is None:
+            log_message("Fill rate: not enough samples recorded yet.")
+        else:
+            time_to_alert = time_to_reach(samples, args.alert_percent, rate)
+            log_message(
+                f"Fill rate: {rate * 3600.0 / BYTES_TO_GiB:.2f} GiB/hour over the "
+                f"last {args.forecast_hours} hours ({len(samples)} samples).",
+                event="fill_rate",
+                mount_point=args.mount_point,
+                fill_rate_bytes_per_second=rate,
+                samples=len(samples),
+                seconds_to_alert=(
+                    time_to_alert.total_seconds() if time_to_alert is not None else None
+                ),
+            )
+            if time_to_alert is not None:
+                log_message(
+                    f"Predicted to reach {args.alert_percent}% in {time_to_alert}."
+                )
+    predicted_alert = time_to_alert is not None and time_to_alert <= timedelta(
+        hours=args.alert_within_hours
+    )
 
-    if percent_used < args.threshold:
+    if percent_used < args.threshold and not predicted_alert:
         # Simply report back to the logs everything is as expected.
         log_message(
             f"\n==> {percent_used:.2f}% usage is adequately beneath {args.threshold}%",
+            event="check",
+            mount_point=args.mount_point,
+            ok=True,
         )
     else:
+        if percent_used >= args.threshold:
+            problem = (
+                f"{percent_used:.2f}% usage exceeds provided threshold of "
+                f"{args.threshold}%"
+            )
+        else:
+            problem = (
+                f"{percent_used:.2f}% usage is predicted to reach "
+                f"{args.alert_percent}% in {time_to_alert}"
+            )
+        if pruning is not None:
+            # E.g., a long prune may be about to bring the usage back down.
+            problem += " while a prune is running"
         log_message(
             dedent(
                 f"""
             [X] The cache server disk usage is too high:
 
-            {percent_used:.2f}% usage exceeds provided threshold of {args.threshold}%
+            {problem}
 
             The `remove_old_files.py` cron job runs every 15 minutes (e.g., at
             12:00, 12:15, 12:30, and 12:45) to clean out the cache files, and
@@ -111,7 +302,11 @@ def main() -> None:
 
                 https://github.com/RobotLocomotion/drake-ci/tree/main/cache_server
         """
-            )
+            ),
+            event="check",
+            mount_point=args.mount_point,
+            ok=False,
+            problem=problem,
         )
         sys.exit(1)
 
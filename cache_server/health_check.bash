@@ -8,17 +8,29 @@
 
 1. Verify that the server is running via an HTTP GET ${server_ip}/.  This
    will confirm that the nginx server is running (or fail if not).
-2. Download the cache server ssh key from S3.
-3. Log in to the server at ${server_ip} and run disk_usage.py to monitor free
-   space.
+2. Scrape the metrics of the server at ${server_ip}/metrics (served by
+   metrics_exporter.py, see README.md).
+3. Verify that the disk usage of `/cache` and `/` is beneath their thresholds,
+   and is not predicted to reach the alert level of metrics_exporter.py soon.
 
-To develop locally, you will need to have the AWS CLI configured to be able to
-`aws s3 cp ...` (make sure `~/.aws` is configured for drake).  To test, you
-must spin up a test instance on EC2 with the groups `default`, `ping`, `ssh`,
-and `node` as well as set the IAM role to `aws-ec2-role-for-s3`.'
+To develop locally, you must be on a network allowed by the `/metrics` location
+of drake_cache_server_nginx.conf (e.g., the Kitware or TRI VPN).'
 
 readonly server_ip="172.31.18.175"
 
+# Checks of the usage of every volume: "<volume> <threshold percent>".
+readonly volume_thresholds=(
+    # `/cache/` stores data in `data/` and logs in `logs/`.
+    "/cache 85"
+    # Theoretically, nothing is stored here besides the drake-ci clone, but it's
+    # a very small disk, and it holds the root filesystem, so if anything is
+    # unexpected we should know immediately.
+    "/ 80"
+)
+
+# Fail if a volume is predicted to reach the alert level within this many hours.
+readonly alert_within_hours=3
+
 set -exo pipefail
 
 # Basic healthcheck: can we contact the server?
@@ -27,43 +39,65 @@
     -X GET \
     "${server_ip}/"
 
-# Download the cache server ssh key.
-this_file_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd -P)"
-cache_server_id_rsa_path="${this_file_dir}/cache_server_id_rsa"
-aws s3 cp \
-  s3://drake-provisioning/cache_server/cache_server_id_rsa \
-  "${cache_server_id_rsa_path}"
-
-# Remove downloaded files on exit (success *and* failure).
-# shellcheck disable=SC2064
-trap "rm -f \"${cache_server_id_rsa_path}\"" EXIT
-
-# Make the downloaded ssh key usable.
-chmod 0600 "${cache_server_id_rsa_path}"
-eval "$(ssh-agent -s)"
-
-# This file should already live on the cache server in this exact location.
-# If anything goes wrong (script not there, ssh hangs), the below command will
-# produce a nonzero exit code.
-#
-# The disk_usage.py script must be run as `root` to access `/cache/data`.  Using
-# `-o StrictHostKeyChecking=no` tells ssh to accept new fingerprints
-# (~/.ssh/known_hosts does not know the cache server when this runs in CI).
-# Check disk usage for `/cache/`, which stores data in `data/` and logs in `logs/`.
-timeout 120 \
-    ssh \
-        -o IdentitiesOnly=yes \
-        -o StrictHostKeyChecking=no \
-        -i "${cache_server_id_rsa_path}" \
-        "root@${server_ip}" \
-        '/opt/cache_server/drake-ci/cache_server/disk_usage.py /cache/'
-# Also check disk usage for `/`. Theoretically, nothing is stored here besides
-# the drake-ci clone, but it's a very small disk, and it holds the root
-# filesystem, so if anything is unexpected we should know immediately.
-timeout 120 \
-    ssh \
-        -o IdentitiesOnly=yes \
-        -o StrictHostKeyChecking=no \
-        -i "${cache_server_id_rsa_path}" \
-        "root@${server_ip}" \
-        '/opt/cache_server/drake-ci/cache_server/disk_usage.py / -t 80'
+metrics="$(
+    curl --fail \
+        --silent \
+        --show-error \
+        --connect-timeout 10 \
+        --max-time 120 \
+        "${server_ip}/metrics"
+)"
+
+# Print the value of the sample $1 (name and labels) of ${metrics}, if any.
+metric() {
+    awk -v sample="$1" '$1 == sample { print $2 }' <<< "${metrics}"
+}
+
+problems=()
+for volume_threshold in "${volume_thresholds[@]}"; do
+    read -r volume threshold <<< "${volume_threshold}"
+    labels="{volume=\"${volume}\"}"
+    used="$(metric "drake_cache_disk_used_bytes${labels}")"
+    total="$(metric "drake_cache_disk_total_bytes${labels}")"
+    if [[ -z "${used}" || -z "${total}" ]]; then
+        problems+=("the disk usage of ${volume} is not reported")
+        continue
+    fi
+    if ! awk -v used="${used}" -v total="${total}" -v threshold="${threshold}" \
+            'BEGIN { exit !(100 * used / total < threshold) }'; then
+        problems+=("the disk usage of ${volume} exceeds ${threshold}%")
+    fi
+    # Only reported if the volume is filling up.
+    seconds_to_alert="$(metric "drake_cache_disk_seconds_to_alert${labels}")"
+    if [[ -n "${seconds_to_alert}" ]] && awk \
+            -v seconds="${seconds_to_alert}" -v hours="${alert_within_hours}" \
+            'BEGIN { exit !(seconds <= hours * 3600) }'; then
+        problems+=("the disk usage of ${volume} is predicted to reach the alert \
+level in ${seconds_to_alert} seconds")
+    fi
+done
+
+set +x
+grep '^drake_cache_\(disk\|prune\)_' <<< "${metrics}"
+if (( ${#problems[@]} )); then
+    echo
+    echo "[X] The cache server disk usage is too high:"
+    printf -- '- %s\n' "${problems[@]}"
+    cat <<'EOF'
+
+The `remove_old_files.py` cron job runs every 15 minutes to clean out the cache
+files, and the `rotate_logs.py` cron job runs every 10 minutes to clean out the
+log files.  These jobs can take up to 5 minutes to complete.  Please wait until
+the automated file removal routine is complete and re-launch this job.
+
+If it fails again, please start a thread in the #ci Slack channel delegating to
+Kitware:
+
+    https://drakedevelopers.slack.com/archives/C270MN28G
+
+Or follow the instructions to prune manually:
+
+    https://github.com/RobotLocomotion/drake-ci/tree/main/cache_server
+EOF
+    exit 1
+fi
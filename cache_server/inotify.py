@@ -0,0 +1,131 @@
+"""Minimal ``ctypes`` bindings of the Linux ``inotify`` API.
+
+Only what ``prune_daemon.py`` needs: watching directories and reading the events of
+the files they contain without blocking.  See ``man 7 inotify`` for the meaning of
+the events.
+
+This file must live in the same directory as the helper scripts that use it."""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+from typing import NamedTuple
+
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN = 0x00000020
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT = struct.Struct("iIII")
+"""``struct inotify_event`` without its trailing name: wd, mask, cookie, len."""
+
+_READ_SIZE = 1024 * (_EVENT.size + 256)
+"""Read up to about a thousand events at once."""
+
+
+class InotifyEvent(NamedTuple):
+    """A single event, see ``man 7 inotify``."""
+
+    wd: int
+    """The watch descriptor of the directory, ``-1`` for ``IN_Q_OVERFLOW``."""
+
+    mask: int
+
+    cookie: int
+    """Relates the ``IN_MOVED_FROM`` and ``IN_MOVED_TO`` events of a rename."""
+
+    name: str
+    """The name of the file in the directory, empty for events of the directory
+    itself."""
+
+
+def _libc() -> ctypes.CDLL:
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+
+class Inotify:
+    """An ``inotify`` instance, whose file descriptor is non-blocking (use ``select``
+    to wait for events).
+
+    **Attributes**
+    fd: int
+        The file descriptor of the instance.
+    """
+
+    def __init__(self) -> None:
+        self._libc = _libc()
+        self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, f"inotify_init1: {os.strerror(e)}")
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """Watch ``path`` for the events of ``mask``, return the watch descriptor.
+        Raises ``OSError`` (e.g., ``ENOSPC`` when ``fs.inotify.max_user_watches`` is
+        reached)."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, f"inotify_add_watch: {os.strerror(e)}", path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        """Stop watching ``wd``, ignoring watches that were already removed."""
+        if self._libc.inotify_rm_watch(self.fd, wd) < 0:
+            e = ctypes.get_errno()
+            if e != errno.EINVAL:
+                raise OSError(e, f"inotify_rm_watch: {os.strerror(e)}")
+
+    def read_events(self) -> list[InotifyEvent]:
+        """Return the events available, an empty list if there are none."""
+        try:
+            data = os.read(self.fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+        events: list[InotifyEvent] = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append(InotifyEvent(wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+    def __enter__(self) -> Inotify:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,742 @@
+#!/usr/bin/env python3
+"""Serve metrics of the cache server at ``/metrics`` in the Prometheus text format.
+
+This script is expected to run as a service (see ``drake_cache_metrics.service``).  It
+only listens on the loopback interface, ``drake_cache_server_nginx.conf`` proxies
+``/metrics`` to it for the hosts of the private network, e.g., ``health_check.bash``.
+Every scrape collects:
+
+- The disk usage of every ``--volume``, and the fill rate and time until
+  ``--alert-percent`` estimated from its usage time series (see ``usage_series.py``),
+  the same estimates as ``disk_usage.py``.
+- The statistics of the latest run of ``remove_old_files.py``: when it ran, how long it
+  took, and the files and bytes it removed.
+- The counters of the ``nginx`` ``stub_status`` page (only the numbers, the page itself
+  is never exposed).
+- Requests, ``GET`` hits and misses, bytes, and request processing times from the
+  access log, which is followed from where it was when the exporter started (every
+  ``--access-log-poll-seconds`` in the background, so that the counters do not depend
+  on how often the metrics are scraped).  Counters restart from zero when the exporter
+  restarts, as Prometheus counters may.  The hit ratio of the last
+  ``--hit-ratio-minutes`` is also provided as a gauge.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import BinaryIO, Iterable
+
+from access_digest import LATENCY_BUCKETS_MS
+from access_log import (
+    DEFAULT_ACCESS_LOG,
+    HIT_STATUSES,
+    AccessLogEntry,
+    parse_line,
+    read_entries,
+    rotated_logs,
+)
+from cache_logging import cache_logging_basic_setup, log_message
+from remove_old_files import DEFAULT_RUN_SUMMARY_PATH
+from usage_series import (
+    DEFAULT_SERIES_DIR,
+    UsageSample,
+    UsageSeries,
+    fill_rate,
+    series_path,
+    time_to_reach,
+)
+
+DEFAULT_PORT = 9184
+"""Default port of the exporter (on the loopback interface)."""
+
+DEFAULT_NGINX_STATUS_URL = "http://127.0.0.1/nginx_status"
+"""The ``stub_status`` location of ``drake_cache_server_nginx.conf``."""
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+"""Content type of the Prometheus text exposition format."""
+
+_STUB_STATUS_RE = re.compile(
+    r"Active connections:\s*(\d+)\s+"
+    r"server accepts handled requests\s+(\d+)\s+(\d+)\s+(\d+)\s+"
+    r"Reading:\s*(\d+)\s+Writing:\s*(\d+)\s+Waiting:\s*(\d+)"
+)
+
+
+def _format_value(value: float) -> str:
+    """Return ``value`` as written in the text exposition format."""
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    """Return ``labels`` as written in the text exposition format, e.g.,
+    ``{volume="/cache"}``."""
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels.items()
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Exposition:
+    """The metrics of a single scrape, in the Prometheus text exposition format.
+
+    **Attributes**
+    lines: list[str]
+        The lines written so far.
+    """
+
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+
+    def add(
+        self,
+        name: str,
+        kind: str,
+        help: str,
+        samples: Iterable[tuple[dict[str, str], float]],
+    ) -> None:
+        """Add the metric family ``name`` of type ``kind`` (``gauge`` or ``counter``)
+        with the (labels, value) ``samples``."""
+        self.lines.append(f"# HELP {name} {help}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def add_histogram(
+        self,
+        name: str,
+        help: str,
+        buckets: Iterable[tuple[float, int]],
+        total: float,
+        count: int,
+    ) -> None:
+        """Add the histogram ``name`` with the cumulative (upper bound, count)
+        ``buckets``, the ``total`` of the values observed, and their ``count``."""
+        self.lines.append(f"# HELP {name} {help}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for bound, bucket_count in buckets:
+            self.lines.append(f'{name}_bucket{{le="{bound!r}"}} {bucket_count}')
+        self.lines.append(f'{name}_bucket{{le="+Inf"}} {count}')
+        self.lines.append(f"{name}_sum {_format_value(total)}")
+        self.lines.append(f"{name}_count {count}")
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def parse_stub_status(text: str) -> dict[str, int] | None:
+    """Return the counters of the ``nginx`` ``stub_status`` page ``text``, or ``None``
+    if it is not one."""
+    match = _STUB_STATUS_RE.search(text)
+    if match is None:
+        return None
+    keys = ("active", "accepted", "handled", "requests")
+    keys += ("reading", "writing", "waiting")
+    return dict(zip(keys, map(int, match.groups())))
+
+
+class AccessLogTail:
+    """Follow the ``nginx`` access log and accumulate counters of the new requests.
+
+    The log is opened at its end, and every :func:`AccessLogTail.poll` reads the lines
+    appended since the previous one.  When the log has been rotated (a different file
+    is at ``path``), the rest of the rotated file, then every file rotated after it, are
+    read before switching to the new one.  :func:`AccessLogTail.follow` polls in the
+    background, so that requests are counted however rarely the metrics are scraped.
+
+    **Attributes**
+    path: Path
+        Path to the access log.
+
+    window_minutes: int
+        Number of minutes of hits and misses kept for :func:`AccessLogTail.hit_ratio`.
+
+    requests: Counter[tuple[str, int]]
+        Number of requests by (method, status).  Methods other than ``GET``, ``PUT``,
+        and ``HEAD`` are counted as ``other``.
+
+    hits, misses: int
+        Number of ``GET`` requests that found (or did not find) the cache entry.
+
+    bytes_sent, bytes_received: int
+        Total size of the responses and requests.
+
+    latency_buckets: list[int]
+        Number of requests that took at most each of
+        :data:`access_digest.LATENCY_BUCKETS_MS`.
+
+    latency_count: int
+        Number of requests with a processing time.
+
+    latency_sum: float
+        Total processing time in seconds of the ``latency_count`` requests.
+
+    lock: threading.RLock
+        Held while polling, hold it to read consistent counters.
+    """
+
+    _METHODS = frozenset(("GET", "PUT", "HEAD"))
+
+    def __init__(self, path: Path, window_minutes: int) -> None:
+        self.path = path
+        self.window_minutes = window_minutes
+        self.requests: Counter[tuple[str, int]] = Counter()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS_MS)
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        # (hits, misses) by minute (since the epoch) of the last window_minutes.
+        self._minutes: dict[int, list[int]] = {}
+        self._file: BinaryIO | None = None
+        self._inode: int | None = None
+        self._partial = b""
+        self.lock = threading.RLock()
+        self._open(at_end=True)
+
+    def _open(self, at_end: bool) -> None:
+        """Open ``path``, at its end or start."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            self._file = None
+            self._inode = None
+            return
+        if at_end:
+            f.seek(0, os.SEEK_END)
+        self._file = f
+        self._inode = os.fstat(f.fileno()).st_ino
+        self._partial = b""
+
+    def _read_new_lines(self) -> None:
+        """Account for every complete line appended to the open file."""
+        f = self._file
+        assert f is not None
+        if os.fstat(f.fileno()).st_size < f.tell():
+            # Truncated (e.g., copytruncate), start over.
+            f.seek(0)
+            self._partial = b""
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Still being written, completed by the next poll.
+                self._partial += line
+                break
+            if self._partial:
+                line = self._partial + line
+                self._partial = b""
+            entry = parse_line(line.decode("utf-8", errors="replace"))
+            if entry is not None:
+                self._add(entry)
+
+    def _add(self, entry: AccessLogEntry) -> None:
+        """Account for the request ``entry``."""
+        method = entry.method if entry.method in self._METHODS else "other"
+        self.requests[(method, entry.status)] += 1
+        if method == "GET" and (entry.status in HIT_STATUSES or entry.status == 404):
+            minute = int(entry.time.timestamp()) // 60
+            hits_misses = self._minutes.setdefault(minute, [0, 0])
+            if entry.status == 404:
+                self.misses += 1
+                hits_misses[1] += 1
+            else:
+                self.hits += 1
+                hits_misses[0] += 1
+        self.bytes_sent += entry.body_bytes_sent
+        if entry.request_length is not None:
+            self.bytes_received += entry.request_length
+        if entry.request_time is not None:
+            self.latency_count += 1
+            self.latency_sum += entry.request_time
+            ms = round(entry.request_time * 1000.0)
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if ms <= bound:
+                    self.latency_buckets[i] += 1
+
+    def _read_rotated_since(self, inode: int | None) -> None:
+        """Account for every request of the files rotated after the file ``inode``,
+        which was rotated since the previous poll.  Nothing is read if it cannot be
+        found any more (e.g., compressed), newer files cannot be told apart then."""
+        rotated = rotated_logs(self.path)
+        if rotated and rotated[-1] == self.path:
+            rotated.pop()
+        for k, sibling in enumerate(rotated):
+            try:
+                if sibling.suffix != ".gz" and sibling.stat().st_ino == inode:
+                    break
+            except FileNotFoundError:
+                continue
+        else:
+            return
+        for entry in read_entries(rotated[k + 1 :]):
+            self._add(entry)
+
+    def poll(self) -> None:
+        """Account for every request logged since the previous poll."""
+        with self.lock:
+            if self._file is None:
+                # Did not exist yet, everything logged since then is new.
+                self._open(at_end=False)
+                if self._file is None:
+                    return
+            try:
+                inode = self.path.stat().st_ino
+            except FileNotFoundError:
+                inode = None
+            self._read_new_lines()
+            if inode != self._inode:
+                # Rotated: finish the rotated file (above), read the files rotated
+                # after it (if rotated more than once), and switch to the new one.
+                self._file.close()
+                self._read_rotated_since(self._inode)
+                self._open(at_end=False)
+                if self._file is not None:
+                    self._read_new_lines()
+            oldest = int(time.time()) // 60 - self.window_minutes
+            for minute in [m for m in self._minutes if m < oldest]:
+                del self._minutes[minute]
+
+    def follow(self, poll_seconds: float) -> threading.Thread:
+        """Start a daemon thread calling :func:`AccessLogTail.poll` every
+        ``poll_seconds``."""
+
+        def run() -> None:
+            while True:
+                time.sleep(poll_seconds)
+                try:
+                    self.poll()
+                except Exception as e:
+                    log_message(f"ERROR: could not read '{self.path}': {e}")
+
+        thread = threading.Thread(target=run, name="access-log-tail", daemon=True)
+        thread.start()
+        return thread
+
+    def hit_ratio(self) -> float | None:
+        """Return the ratio of ``GET`` hits over hits and misses of the last
+        ``window_minutes``, or ``None`` if there were none."""
+        hits = sum(h for h, _ in self._minutes.values())
+        misses = sum(m for _, m in self._minutes.values())
+        return hits / (hits + misses) if hits + misses else None
+
+
+class CacheMetrics:
+    """Collects the metrics of the cache server for every scrape.
+
+    **Attributes**
+    volumes: list[Path]
+        The volumes whose disk usage is reported.
+
+    series_dir: Path
+        Where the usage time series of the volumes are stored.
+
+    alert_percent: float
+        Disk usage for which the time until it is reached is estimated.
+
+    forecast_hours: float
+        The fill rate is estimated from the usage samples of this many hours.
+
+    run_summary: Path
+        The statistics of the latest run of ``remove_old_files.py``.
+
+    nginx_status_url: str
+        The URL of the ``nginx`` ``stub_status`` page.
+
+    access_log: AccessLogTail
+        The requests logged since the exporter started.
+    """
+
+    def __init__(
+        self,
+        *,
+        volumes: list[Path],
+        series_dir: Path,
+        alert_percent: float,
+        forecast_hours: float,
+        run_summary: Path,
+        nginx_status_url: str,
+        access_log: AccessLogTail,
+    ) -> None:
+        self.volumes = volumes
+        self.series_dir = series_dir
+        self.alert_percent = alert_percent
+        self.forecast_hours = forecast_hours
+        self.run_summary = run_summary
+        self.nginx_status_url = nginx_status_url
+        self.access_log = access_log
+        # Concurrent scrapes would read the access log at the same time.
+        self._lock = threading.Lock()
+
+    def collect_disk_usage(self, exposition: Exposition) -> None:
+        now = time.time()
+        usage: list[tuple[dict[str, str], int, int, int]] = []
+        rates: list[tuple[dict[str, str], float]] = []
+        times_to_alert: list[tuple[dict[str, str], float]] = []
+        for volume in self.volumes:
+            labels = {"volume": str(volume)}
+            try:
+                du = shutil.disk_usage(volume)
+            except Exception as e:
+                log_message(f"ERROR: could not collect disk usage on '{volume}': {e}")
+                continue
+            usage.append((labels, du.used, du.free, du.total))
+            series = UsageSeries(series_path(volume, self.series_dir))
+            try:
+                samples = series.samples(since=now - self.forecast_hours * 3600.0)
+            except Exception as e:
+                log_message(f"ERROR: could not read '{series.path}': {e}")
+                continue
+            samples.append(UsageSample(now, du.used, du.total))
+            rate = fill_rate(samples)
+            if rate is None:
+                continue
+            rates.append((labels, rate))
+            time_to_alert = time_to_reach(samples, self.alert_percent, rate)
+            if time_to_alert is not None:
+                times_to_alert.append((labels, time_to_alert.total_seconds()))
+
+        for name, i, help in (
+            ("used", 1, "Bytes used on the volume."),
+            ("free", 2, "Bytes available on the volume."),
+            ("total", 3, "Total size in bytes of the volume."),
+        ):
+            exposition.add(
+                f"drake_cache_disk_{name}_bytes",
+                "gauge",
+                help,
+                ((u[0], u[i]) for u in usage),
+            )
+        exposition.add(
+            "drake_cache_disk_fill_rate_bytes_per_second",
+            "gauge",
+            f"Net rate at which the volume fills up over the last "
+            f"{self.forecast_hours} hours (absent without enough samples).",
+            rates,
+        )
+        exposition.add(
+            "drake_cache_disk_seconds_to_alert",
+            "gauge",
+            f"Seconds until the volume is predicted to reach {self.alert_percent}% "
+            "usage at the fill rate (absent if it is never reached).",
+            times_to_alert,
+        )
+
+    def collect_run_summary(self, exposition: Exposition) -> None:
+        try:
+            summary = json.loads(self.run_summary.read_text())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log_message(f"ERROR: could not read '{self.run_summary}': {e}")
+            return
+        labels = {"mode": str(summary.get("mode", ""))}
+        for key, name, help in (
+            (
+                "end_time",
+                "drake_cache_prune_last_run_timestamp_seconds",
+                "When the latest run of remove_old_files.py ended.",
+            ),
+            (
+                "duration_seconds",
+                "drake_cache_prune_last_duration_seconds",
+                "Duration of the latest run of remove_old_files.py.",
+            ),
+            (
+                "files_scanned",
+                "drake_cache_prune_last_files_scanned",
+                "Files scanned by the latest run of remove_old_files.py.",
+            ),
+            (
+                "files_removed",
+                "drake_cache_prune_last_files_removed",
+                "Files removed by the latest run of remove_old_files.py.",
+            ),
+            (
+                "bytes_removed",
+                "drake_cache_prune_last_bytes_removed",
+                "Bytes freed by the latest run of remove_old_files.py.",
+            ),
+            (
+                "removal_errors",
+                "drake_cache_prune_last_removal_errors",
+                "Files the latest run of remove_old_files.py could not remove.",
+            ),
+        ):
+            if isinstance(summary.get(key), (int, float)):
+                exposition.add(name, "gauge", help, [(labels, summary[key])])
+
+    def collect_nginx_status(self, exposition: Exposition) -> None:
+        status = None
+        try:
+            with urllib.request.urlopen(self.nginx_status_url, timeout=5.0) as response:
+                status = parse_stub_status(response.read().decode("utf-8", "replace"))
+        except Exception as e:
+            log_message(f"ERROR: could not query '{self.nginx_status_url}': {e}")
+        exposition.add(
+            "drake_cache_nginx_up",
+            "gauge",
+            "Whether the nginx stub_status page could be queried.",
+            [({}, 1 if status is not None else 0)],
+        )
+        if status is None:
+            return
+        for key, name, help in (
+            (
+                "accepted",
+                "drake_cache_nginx_connections_accepted_total",
+                "Client connections accepted by nginx.",
+            ),
+            (
+                "handled",
+                "drake_cache_nginx_connections_handled_total",
+                "Client connections handled by nginx.",
+            ),
+            (
+                "requests",
+                "drake_cache_nginx_requests_total",
+                "Client requests served by nginx.",
+            ),
+        ):
+            exposition.add(name, "counter", help, [({}, status[key])])
+        exposition.add(
+            "drake_cache_nginx_connections",
+            "gauge",
+            "Client connections of nginx by state (active is the total).",
+            (
+                ({"state": key}, status[key])
+                for key in ("active", "reading", "writing", "waiting")
+            ),
+        )
+
+    def collect_access_log(self, exposition: Exposition) -> None:
+        tail = self.access_log
+        with tail.lock:
+            try:
+                tail.poll()
+            except Exception as e:
+                log_message(f"ERROR: could not read '{tail.path}': {e}")
+            self._add_access_log(exposition, tail)
+
+    def _add_access_log(self, exposition: Exposition, tail: AccessLogTail) -> None:
+        exposition.add(
+            "drake_cache_requests_total",
+            "counter",
+            "Requests logged to the access log, by method and status.",
+            (
+                ({"method": method, "status": str(status)}, count)
+                for (method, status), count in sorted(tail.requests.items())
+            ),
+        )
+        exposition.add(
+            "drake_cache_get_hits_total",
+            "counter",
+            "GET requests that found the cache entry.",
+            [({}, tail.hits)],
+        )
+        exposition.add(
+            "drake_cache_get_misses_total",
+            "counter",
+            "GET requests answered with 404.",
+            [({}, tail.misses)],
+        )
+        hit_ratio = tail.hit_ratio()
+        exposition.add(
+            "drake_cache_hit_ratio",
+            "gauge",
+            f"GET hits over hits and misses of the last {tail.window_minutes} minutes "
+            "(absent without any).",
+            [({}, hit_ratio)] if hit_ratio is not None else [],
+        )
+        exposition.add(
+            "drake_cache_sent_bytes_total",
+            "counter",
+            "Total size of the response bodies.",
+            [({}, tail.bytes_sent)],
+        )
+        exposition.add(
+            "drake_cache_received_bytes_total",
+            "counter",
+            "Total size of the requests.",
+            [({}, tail.bytes_received)],
+        )
+        exposition.add_histogram(
+            "drake_cache_request_duration_seconds",
+            "Request processing times ($request_time) of nginx.",
+            (
+                (ms / 1000.0, count)
+                for ms, count in zip(LATENCY_BUCKETS_MS, tail.latency_buckets)
+            ),
+            tail.latency_sum,
+            tail.latency_count,
+        )
+
+    def collect(self) -> str:
+        """Return the text exposition of every metric."""
+        exposition = Exposition()
+        with self._lock:
+            self.collect_disk_usage(exposition)
+            self.collect_run_summary(exposition)
+            self.collect_nginx_status(exposition)
+            self.collect_access_log(exposition)
+        return exposition.text()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve ``GET /metrics`` with the ``CacheMetrics`` of the server."""
+
+    def do_GET(self) -> None:
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.collect().encode("utf-8")  # type: ignore
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Scrapes are frequent, do not log every request to stderr.
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--address",
+        default="127.0.0.1",
+        help="Address the exporter listens on (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="Port the exporter listens on (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--volume",
+        dest="volumes",
+        type=Path,
+        action="append",
+        help="A volume whose disk usage is reported (default: /cache and /).",
+    )
+    parser.add_argument(
+        "--alert-percent",
+        type=float,
+        default=95.0,
+        help=(
+            "Report the time until the disk usage reaches this value "
+            "(default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--forecast-hours",
+        type=float,
+        default=6.0,
+        help=(
+            "Estimate the fill rate from the samples of this many hours "
+            "(default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--series-dir",
+        type=Path,
+        default=DEFAULT_SERIES_DIR,
+        help="Where the usage time series are stored (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--run-summary",
+        type=Path,
+        default=DEFAULT_RUN_SUMMARY_PATH,
+        help=(
+            "The statistics of the latest run of remove_old_files.py "
+            "(default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--nginx-status-url",
+        default=DEFAULT_NGINX_STATUS_URL,
+        help="The nginx stub_status page (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--access-log",
+        type=Path,
+        default=DEFAULT_ACCESS_LOG,
+        help="The nginx access log (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--access-log-poll-seconds",
+        type=float,
+        default=10.0,
+        help=(
+            "Read the requests appended to the access log this often "
+            "(default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--hit-ratio-minutes",
+        type=int,
+        default=60,
+        help="Duration of the hit ratio gauge in minutes (default: %(default)s).",
+    )
+
+    args = parser.parse_args()
+
+    volumes = args.volumes or [Path("/cache"), Path("/")]
+    for volume in volumes:
+        if not volume.is_dir():
+            parser.error(f"the provided volume='{volume}' is not a directory.")
+    if args.alert_percent <= 0.0 or args.alert_percent > 100.0:
+        parser.error("alert-percent must be in the range (0, 100].")
+    if args.forecast_hours <= 0.0:
+        parser.error("forecast-hours must be positive.")
+    if args.hit_ratio_minutes < 1:
+        parser.error("hit-ratio-minutes must be at least 1.")
+    if args.access_log_poll_seconds <= 0.0:
+        parser.error("access-log-poll-seconds must be positive.")
+
+    cache_logging_basic_setup()
+    access_log = AccessLogTail(args.access_log, args.hit_ratio_minutes)
+    access_log.follow(args.access_log_poll_seconds)
+    metrics = CacheMetrics(
+        volumes=volumes,
+        series_dir=args.series_dir,
+        alert_percent=args.alert_percent,
+        forecast_hours=args.forecast_hours,
+        run_summary=args.run_summary,
+        nginx_status_url=args.nginx_status_url,
+        access_log=access_log,
+    )
+    server = ThreadingHTTPServer((args.address, args.port), MetricsHandler)
+    server.metrics = metrics  # type: ignore
+    log_message(f"Serving metrics at http://{args.address}:{args.port}/metrics")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
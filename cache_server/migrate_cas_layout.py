@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Move the blobs of a flat ``cas`` directory into the sharded layout, in place.
+
+Before ``drake_cache_server_nginx.conf`` sharded the content addressed storage, every
+blob of a salt was stored directly in ``/cache/data/<version>/<salt>/cas/<hash>``.
+``nginx`` now serves ``/<version>/<salt>/cas/<hash>`` from
+``/cache/data/<version>/<salt>/cas/<hash[0:2]>/<hash[2:4]>/<hash>``, see
+``cache_layout.py``.  This script renames every flat blob into its shard, which does
+not copy any data nor modify the access time of the blob.  A blob that was uploaded
+again into its shard in the meantime (the same hash, hence the same content) replaces
+the flat copy, which is removed.
+
+Run this script (as ``root``) right after reloading ``nginx`` with the sharded
+configuration, flat blobs are cache misses until they have been moved.  It is safe to
+interrupt and run again, and to run while ``nginx`` is serving requests.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from cache_layout import CAS, cas_shards
+from cache_logging import cache_logging_basic_setup, log_message
+
+DEFAULT_JOBS = min(32, (os.cpu_count() or 1) + 4)
+"""Default number of salts migrated concurrently (same as ``ThreadPoolExecutor``)."""
+
+
+def flat_cas_directories(root: Path) -> list[Path]:
+    """Return every ``<version>/<salt>/cas`` directory under ``root``."""
+    return sorted(p for p in root.glob(f"*/*/{CAS}") if p.is_dir())
+
+
+def migrate_cas_directory(cas_directory: Path, dry_run: bool) -> tuple[int, int, int]:
+    """Move every flat blob of ``cas_directory`` into its shard.
+
+    Returns the number of blobs moved, the number of flat blobs removed because the
+    shard already has them, and the number of errors."""
+    n_moved = 0
+    n_duplicates = 0
+    n_errors = 0
+    created: set[str] = set()
+    dir_fd = os.open(cas_directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        with os.scandir(dir_fd) as entries:
+            names = [e.name for e in entries if e.is_file(follow_symlinks=False)]
+        for name in names:
+            shard = os.path.join(*cas_shards(name))
+            destination = os.path.join(shard, name)
+            try:
+                if dry_run:
+                    n_moved += 1
+                    continue
+                if shard not in created:
+                    os.makedirs(os.path.join(cas_directory, shard), exist_ok=True)
+                    created.add(shard)
+                try:
+                    # NOTE: os.link fails if the destination exists (unlike os.rename,
+                    # which would replace the newer upload with the older blob).
+                    os.link(name, destination, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+                    n_moved += 1
+                except FileExistsError:
+                    n_duplicates += 1
+                os.unlink(name, dir_fd=dir_fd)
+            except FileNotFoundError:
+                # Removed by remove_old_files.py (or another migration) meanwhile.
+                continue
+            except Exception as e:
+                log_message(f"ERROR: could not move {cas_directory / name}: {e}")
+                n_errors += 1
+    finally:
+        os.close(dir_fd)
+    return n_moved, n_duplicates, n_errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help="Number of salts migrated concurrently (default: %(default)s).",
+    )
+    parser.add_argument(
+        "-n",
+        "--dry_run",
+        dest="dry_run",
+        action="store_true",
+        help="Print how many blobs would be moved without moving them.",
+    )
+    parser.add_argument(
+        "cache_dir",
+        type=Path,
+        help="The cache directory to migrate, e.g., `/cache/data`.",
+    )
+
+    args = parser.parse_args()
+
+    if args.jobs < 1:
+        parser.error("jobs must be at least 1.")
+
+    if not args.cache_dir.is_dir():
+        parser.error(f"the provided cache_dir='{args.cache_dir}' is not a directory.")
+
+    cache_logging_basic_setup()
+    log_message(f"==> Sharding the content addressed storage of {args.cache_dir}")
+    cas_directories = flat_cas_directories(args.cache_dir)
+    total_moved = 0
+    total_errors = 0
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        results = pool.map(
+            lambda d: migrate_cas_directory(d, args.dry_run), cas_directories
+        )
+        for cas_directory, (n_moved, n_duplicates, n_errors) in zip(
+            cas_directories, results
+        ):
+            if n_moved or n_duplicates or n_errors:
+                log_message(
+                    f"{cas_directory}: {n_moved} blob(s) moved, {n_duplicates} "
+                    f"duplicate(s) removed, {n_errors} error(s)."
+                )
+            total_moved += n_moved
+            total_errors += n_errors
+
+    verb = "would be moved" if args.dry_run else "moved"
+    log_message(
+        f"Done: {total_moved} blob(s) {verb} in {len(cas_directories)} cas "
+        f"directories, {total_errors} error(s)."
+    )
+    if total_errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
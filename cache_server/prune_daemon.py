@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+"""Keep the cache volume utilization between two watermarks, continuously.
+
+``remove_old_files.py auto`` starts from scratch every time ``cron`` runs it: every run
+scans the whole cache, and during an upload burst the volume may fill up for up to 15
+minutes before the next run.  This daemon scans the cache once, and then follows every
+change through ``inotify``: blobs stored by ``nginx`` (renamed into place), files
+deleted, and, for the access time metric, files read.  Every file is kept in a heap
+ordered by its time metric.  Whenever the utilization of the volume (checked at most
+every ``--check-interval-seconds`` while events arrive) exceeds ``--high-watermark``,
+the oldest files are removed until it is at most ``--low-watermark``.  Every eviction
+holds the lock of ``remove_old_files.py`` (see ``prune_lock.py``), and is postponed
+while a run of ``remove_old_files.py`` holds it.
+
+Reads observed through ``inotify`` are the real access times, unlike ``st_atime``
+which ``relatime`` mounts only update once a day.  Access times found by the initial
+scan are those of ``st_atime``.  Right before a file is removed its time metric is
+checked again, and the file is kept (and tracked again) if it is more recent than the
+one tracked.
+
+Every directory is watched separately, and the sharded ``cas`` directories are many:
+raise ``fs.inotify.max_user_watches`` (each watch uses about 1 KiB of kernel memory)
+to more than the number of directories of the cache.  When the kernel queue of events
+overflows (``fs.inotify.max_queued_events``), events are lost and the cache is scanned
+again, which takes as long as the initial scan and postpones evictions meanwhile.
+Events are read while scanning and evicting too, but with the access time metric every
+read of a file is an event: raise ``fs.inotify.max_queued_events`` on a busy cache.
+"""
+
+from __future__ import annotations
+
+import argparse
+import errno
+import heapq
+import os
+import select
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from cache_logging import cache_logging_basic_setup, log_message, timed_phase
+from inotify import (
+    IN_ACCESS,
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_DELETE,
+    IN_DELETE_SELF,
+    IN_EXCL_UNLINK,
+    IN_IGNORED,
+    IN_ISDIR,
+    IN_MOVED_FROM,
+    IN_MOVED_TO,
+    IN_ONLYDIR,
+    IN_Q_OVERFLOW,
+    Inotify,
+    InotifyEvent,
+)
+from prune_lock import DEFAULT_LOCK_PATH, PruneLock, read_prune_state
+from remove_old_files import (
+    DEFAULT_DELETE_JOBS,
+    DEFAULT_JOBS,
+    DEFAULT_RUN_SUMMARY_PATH,
+    DELETE_BATCH_SIZE,
+    REMOVING_PREFIX,
+    Throttle,
+    TimeMetric,
+    allocated_bytes,
+    bytes_to_human_string,
+    remove_batch,
+    scan_files,
+    write_run_summary,
+)
+
+DRAIN_EVERY = 4096
+"""While scanning, pending events are read every time this many files are found, so
+that the kernel queue does not overflow."""
+
+RETRY_AFTER = timedelta(minutes=1)
+"""How long to wait before evicting again after the low watermark could not be
+reached."""
+
+
+class PruneDaemon:
+    """Track every file of the cache directory and evict the oldest ones on demand.
+
+    Usage:
+
+    1. Create the PruneDaemon instance.
+    2. Call :func:`PruneDaemon.scan` to watch every directory and track every file.
+    3. Call :func:`PruneDaemon.run`, which never returns.
+
+    **Attributes**
+    root: Path
+        Path to the cache directory root.
+
+    time_metric: TimeMetric
+        Which time of the files orders their eviction.
+
+    high_watermark, low_watermark: float
+        Eviction starts when the volume is more than ``high_watermark`` percent used,
+        and stops once it is at most ``low_watermark`` percent used.
+
+    min_age: timedelta
+        Files more recent than this are never evicted.
+
+    check_interval: float
+        Minimum number of seconds between two checks of the utilization.
+
+    jobs, delete_jobs, throttle
+        Same as :class:`remove_old_files.CacheDirectory`.
+
+    run_summary: Path
+        Where the statistics of every eviction are saved.
+
+    lock: PruneLock | None
+        The lock held by every eviction, so that it never overlaps a run of
+        ``remove_old_files.py``.
+
+    files: dict[str, tuple[int, int]]
+        The (time metric in nanoseconds, disk space in bytes) of every file tracked.
+
+    heap: list[tuple[int, str]]
+        The (time metric in nanoseconds, path) of the files, oldest first.  Entries
+        are never updated in place: an entry whose time differs from ``files`` is
+        outdated and skipped.
+
+    files_scanned, files_removed, bytes_removed, removal_errors: int
+        The number of files tracked at the latest eviction, and the number of files
+        and bytes removed and errors of the latest eviction.
+    """
+
+    def __init__(
+        self,
+        *,
+        root: Path,
+        time_metric: TimeMetric,
+        high_watermark: float,
+        low_watermark: float,
+        min_age: timedelta,
+        check_interval: float,
+        jobs: int = 1,
+        delete_jobs: int = 1,
+        throttle: Throttle | None = None,
+        run_summary: Path = DEFAULT_RUN_SUMMARY_PATH,
+        lock: PruneLock | None = None,
+    ) -> None:
+        self.root = root
+        self.time_metric = time_metric
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.min_age = min_age
+        self.check_interval = check_interval
+        self.jobs = jobs
+        self.delete_jobs = delete_jobs
+        self.throttle = throttle
+        self.run_summary = run_summary
+        self.lock = lock
+        self.files: dict[str, tuple[int, int]] = {}
+        self.heap: list[tuple[int, str]] = []
+        self.files_scanned = 0
+        self.files_removed = 0
+        self.bytes_removed = 0
+        self.removal_errors = 0
+        self._attribute = f"{repr(time_metric)}_ns"
+        self._mask = (
+            IN_CREATE
+            | IN_CLOSE_WRITE
+            | IN_MOVED_TO
+            | IN_MOVED_FROM
+            | IN_DELETE
+            | IN_DELETE_SELF
+            | IN_ONLYDIR
+            | IN_EXCL_UNLINK
+        )
+        if time_metric == TimeMetric.ACCESS_TIME:
+            self._mask |= IN_ACCESS
+        self._inotify = Inotify()
+        self._directories: dict[int, str] = {}
+        self._watch_lock = threading.Lock()
+        # Events read but not applied yet (e.g., while scanning), with the time they
+        # were read.
+        self._pending: list[tuple[InotifyEvent, int]] = []
+        self._retry_after = 0.0
+
+    def _watch(self, directory: str) -> None:
+        """Start watching ``directory`` (called by the scanning threads)."""
+        try:
+            wd = self._inotify.add_watch(directory, self._mask)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                log_message(
+                    "ERROR: cannot watch every directory, increase "
+                    "fs.inotify.max_user_watches (e.g., with sysctl)."
+                )
+                raise
+            return  # Removed in the meantime, its removal is also an event.
+        with self._watch_lock:
+            self._directories[wd] = directory
+
+    def _track(self, path: str, time_ns: int, size_bytes: int) -> None:
+        """Track (or update) the file ``path``."""
+        if self.files.get(path, (None,))[0] != time_ns:
+            self.files[path] = (time_ns, size_bytes)
+            heapq.heappush(self.heap, (time_ns, path))
+
+    def _track_stat(self, path: str) -> None:
+        """Track the file ``path`` as it currently is."""
+        try:
+            f_stat = os.stat(path, follow_symlinks=False)
+        except OSError:
+            self.files.pop(path, None)
+            return
+        self._track(path, getattr(f_stat, self._attribute), allocated_bytes(f_stat))
+
+    def _drain(self) -> None:
+        """Read the events available into ``_pending``, so that the kernel queue does
+        not overflow while busy."""
+        now_ns = time.time_ns()
+        self._pending.extend((e, now_ns) for e in self._inotify.read_events())
+
+    def _apply_pending(self) -> bool:
+        """Apply the events read so far, and those read meanwhile (e.g., while
+        scanning a new directory).  Returns ``False`` if events were lost."""
+        while self._pending:
+            pending, self._pending = self._pending, []
+            for event, received_ns in pending:
+                if not self._apply(event, received_ns):
+                    return False
+        return True
+
+    def _scan_tree(self, directory: Path, jobs: int, *, bulk: bool = False) -> int:
+        """Watch every directory and track every file under ``directory``, return the
+        number of files found.  With ``bulk``, the heap must be heapified afterwards."""
+        n_files = 0
+        for f, f_stat in scan_files(directory, jobs, on_directory=self._watch):
+            if isinstance(f_stat, Exception):
+                continue
+            time_ns = getattr(f_stat, self._attribute)
+            if bulk:
+                self.files[f] = (time_ns, allocated_bytes(f_stat))
+                self.heap.append((time_ns, f))
+            else:
+                self._track(f, time_ns, allocated_bytes(f_stat))
+            n_files += 1
+            if n_files % DRAIN_EVERY == 0:
+                self._drain()
+        return n_files
+
+    def scan(self) -> None:
+        """Forget everything, then watch every directory and track every file."""
+        self._inotify.close()
+        self._inotify = Inotify()
+        self._directories.clear()
+        self._pending.clear()
+        self.files.clear()
+        self.heap.clear()
+        log_message(f"==> Scanning {self.root}")
+        with timed_phase("scan", root=self.root) as phase:
+            n_files = self._scan_tree(self.root, self.jobs, bulk=True)
+            heapq.heapify(self.heap)
+            # Apply the changes that happened while scanning.
+            complete = self._apply_pending()
+            phase["files"] = n_files
+            phase["directories"] = len(self._directories)
+        if not complete:
+            log_message("Events were lost while scanning, scanning again.")
+            self.scan()
+            return
+        log_message(
+            f"Tracking {len(self.files)} file(s) in {len(self._directories)} "
+            "watched directories."
+        )
+
+    def _forget_tree(self, directory: str) -> None:
+        """Stop watching and tracking everything under ``directory`` (which was moved
+        or removed)."""
+        prefix = directory + os.sep
+        for wd, d in list(self._directories.items()):
+            if d == directory or d.startswith(prefix):
+                self._inotify.rm_watch(wd)
+                del self._directories[wd]
+        for path in [p for p in self.files if p.startswith(prefix)]:
+            del self.files[path]
+
+    def _apply(self, event: InotifyEvent, received_ns: int) -> bool:
+        """Update the tracked files with ``event``, read at ``received_ns``.  Returns
+        ``False`` if events were lost and everything must be scanned again."""
+        if event.mask & IN_Q_OVERFLOW:
+            return False
+        if event.mask & IN_IGNORED:
+            self._directories.pop(event.wd, None)
+            return True
+        directory = self._directories.get(event.wd)
+        if directory is None or not event.name:
+            return True
+        path = os.path.join(directory, event.name)
+        if event.mask & IN_ISDIR:
+            if event.mask & (IN_CREATE | IN_MOVED_TO):
+                if not event.name.startswith(REMOVING_PREFIX):
+                    self._scan_tree(Path(path), 1)
+            elif event.mask & (IN_DELETE | IN_MOVED_FROM):
+                self._forget_tree(path)
+        elif event.mask & (IN_DELETE | IN_MOVED_FROM):
+            self.files.pop(path, None)
+        elif event.mask & (IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO):
+            self._track_stat(path)
+        elif event.mask & IN_ACCESS:
+            tracked = self.files.get(path)
+            # A single download reads many times, update at most once per second.
+            if tracked is not None and received_ns - tracked[0] >= 1_000_000_000:
+                self._track(path, received_ns, tracked[1])
+        return True
+
+    def _compact(self) -> None:
+        """Drop the outdated entries of the heap once they outnumber the files."""
+        if len(self.heap) > 2 * len(self.files) + DELETE_BATCH_SIZE:
+            self.heap = [(t, p) for p, (t, _) in self.files.items()]
+            heapq.heapify(self.heap)
+
+    def percent_used(self) -> tuple[float, int, int]:
+        """Return the utilization of the volume, and its bytes used and total."""
+        du = shutil.disk_usage(self.root)
+        return (du.used / du.total) * 100.0, du.used, du.total
+
+    def evict(self, bytes_needed: int) -> None:
+        """Remove the oldest files (older than ``min_age``) totaling at least
+        ``bytes_needed`` bytes."""
+        start_time = time.time()
+        newest_ns = time.time_ns() - int(self.min_age.total_seconds() * 1e9)
+        batches: dict[str, list[tuple[str, int, int]]] = {}
+        n_files = 0
+        n_bytes = 0
+        while self.heap and n_bytes < bytes_needed:
+            time_ns, path = self.heap[0]
+            if time_ns > newest_ns:
+                break
+            heapq.heappop(self.heap)
+            tracked = self.files.get(path)
+            if tracked is None or tracked[0] != time_ns:
+                continue  # Outdated.
+            del self.files[path]
+            directory, name = os.path.split(path)
+            batches.setdefault(directory, []).append((name, tracked[1], time_ns))
+            n_files += 1
+            n_bytes += tracked[1]
+
+        self.files_scanned = len(self.files) + n_files
+        self.files_removed = 0
+        self.bytes_removed = 0
+        self.removal_errors = 0
+        chunks = [
+            (directory, entries[i : i + DELETE_BATCH_SIZE])
+            for directory, entries in batches.items()
+            for i in range(0, len(entries), DELETE_BATCH_SIZE)
+        ]
+        with timed_phase("evict", bytes_needed=bytes_needed) as phase:
+            with ThreadPoolExecutor(max_workers=self.delete_jobs) as pool:
+                futures = [
+                    pool.submit(
+                        remove_batch,
+                        directory,
+                        batch,
+                        recheck_metric=self.time_metric,
+                        throttle=self.throttle,
+                    )
+                    for directory, batch in chunks
+                ]
+                for future, (directory, batch) in zip(futures, chunks):
+                    batch_skipped, batch_bytes, batch_errors = future.result()
+                    self.files_removed += len(batch) - batch_skipped - len(batch_errors)
+                    self.bytes_removed += batch_bytes
+                    self.removal_errors += len(batch_errors)
+                    for f_path, message in batch_errors[:1]:
+                        log_message(f"ERROR: could not remove {f_path}: {message}")
+                    if batch_skipped or batch_errors:
+                        # Track again the files used since, or not removed.
+                        for name, _, _ in batch:
+                            self._track_stat(os.path.join(directory, name))
+                    # Removals are events too, read them as they come.
+                    self._drain()
+            phase["files_removed"] = self.files_removed
+            phase["bytes_removed"] = self.bytes_removed
+            phase["removal_errors"] = self.removal_errors
+        if n_bytes < bytes_needed:
+            log_message(
+                f"Cannot reach {self.low_watermark}%: only "
+                f"{bytes_to_human_string(n_bytes)} of files older than {self.min_age} "
+                f"were tracked, {bytes_to_human_string(bytes_needed)} needed."
+            )
+            self._retry_after = time.monotonic() + RETRY_AFTER.total_seconds()
+        write_run_summary(
+            self.run_summary, mode="daemon", start_time=start_time, pruned=self
+        )
+        self._compact()
+
+    def check(self) -> None:
+        """Evict files if the volume is above the high watermark."""
+        if time.monotonic() < self._retry_after:
+            return
+        percent_used, used, total = self.percent_used()
+        if percent_used <= self.high_watermark:
+            return
+        if self.lock is not None and not self.lock.acquire(
+            root=str(self.root.absolute())
+        ):
+            state = read_prune_state(self.lock.path) or {}
+            log_message(
+                f"{round(percent_used, 2)}% used exceeds {self.high_watermark}%, but "
+                f"process {state.get('pid', '?')} holds {self.lock.path} (phase: "
+                f"{state.get('phase', '?')}), evicting again in {RETRY_AFTER}.",
+                event="prune_lock_skip",
+                pid=state.get("pid"),
+                phase=state.get("phase"),
+            )
+            self._retry_after = time.monotonic() + RETRY_AFTER.total_seconds()
+            return
+        try:
+            if self.lock is not None:
+                self.lock.set_phase("evict")
+            log_message(
+                f"==> {round(percent_used, 2)}% used exceeds {self.high_watermark}%, "
+                f"evicting down to {self.low_watermark}%."
+            )
+            self.evict(int(used - (self.low_watermark / 100.0) * total) + 1)
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+    def run(self) -> None:
+        """Follow the changes and evict files as needed, forever."""
+        self.check()
+        last_check = time.monotonic()
+        while True:
+            timeout = max(0.0, last_check + self.check_interval - time.monotonic())
+            readable, _, _ = select.select([self._inotify], [], [], timeout)
+            if readable:
+                self._drain()
+            if not self._apply_pending():
+                log_message("Events were lost, scanning again.")
+                self.scan()
+            if time.monotonic() - last_check >= self.check_interval:
+                self.check()
+                last_check = time.monotonic()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "-m",
+        "--metric",
+        type=TimeMetric,
+        choices=list(TimeMetric),
+        default=TimeMetric.ACCESS_TIME,
+        help="Which time metric of the file to consider (default: %(default)s).",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help="Number of threads of the initial scan (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--delete-jobs",
+        type=int,
+        default=DEFAULT_DELETE_JOBS,
+        help="Number of threads removing files (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--delete-max-mib-per-second",
+        type=float,
+        default=None,
+        help="Limit the rate of removal to this many MiB of files per second.",
+    )
+    parser.add_argument(
+        "--high-watermark",
+        type=float,
+        default=75.0,
+        help="Start evicting above this percent utilization (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--low-watermark",
+        type=float,
+        default=70.0,
+        help="Stop evicting at this percent utilization (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--min-age-minutes",
+        type=float,
+        default=30.0,
+        help="Never evict files more recent than this (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--check-interval-seconds",
+        type=float,
+        default=0.2,
+        help=(
+            "Minimum time between two checks of the utilization "
+            "(default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--run-summary",
+        type=Path,
+        default=DEFAULT_RUN_SUMMARY_PATH,
+        help=(
+            "Where the statistics of every eviction are saved (default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--lock",
+        type=Path,
+        default=DEFAULT_LOCK_PATH,
+        help=(
+            "The lock file of remove_old_files.py, held while evicting "
+            "(default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "cache_dir",
+        type=Path,
+        help="The cache directory to prune, e.g., `/cache/data`.",
+    )
+
+    args = parser.parse_args()
+
+    if sys.platform != "linux":
+        parser.error("this script only runs on linux.")
+    if not args.cache_dir.is_dir():
+        parser.error(f"the provided cache_dir='{args.cache_dir}' is not a directory.")
+    if args.jobs < 1 or args.delete_jobs < 1:
+        parser.error("jobs and delete-jobs must be at least 1.")
+    if not 1.0 <= args.low_watermark < args.high_watermark <= 99.0:
+        parser.error(
+            "watermarks must satisfy 1 <= low-watermark < high-watermark <= 99."
+        )
+    if args.min_age_minutes < 0.0:
+        parser.error("min-age-minutes must not be negative.")
+    if args.check_interval_seconds <= 0.0:
+        parser.error("check-interval-seconds must be positive.")
+
+    cache_logging_basic_setup()
+    log_message(f"Age strategy:   {args.metric}")
+    log_message(f"Watermarks:     {args.high_watermark}% => {args.low_watermark}%")
+    daemon = PruneDaemon(
+        root=args.cache_dir,
+        time_metric=args.metric,
+        high_watermark=args.high_watermark,
+        low_watermark=args.low_watermark,
+        min_age=timedelta(minutes=args.min_age_minutes),
+        check_interval=args.check_interval_seconds,
+        jobs=args.jobs,
+        delete_jobs=args.delete_jobs,
+        throttle=(
+            Throttle(bytes_per_second=args.delete_max_mib_per_second * 1048576.0)
+            if args.delete_max_mib_per_second
+            else None
+        ),
+        run_summary=args.run_summary,
+        lock=PruneLock(args.lock),
+    )
+    daemon.scan()
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
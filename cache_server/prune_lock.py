@@ -0,0 +1,133 @@
+"""Coordination of the runs of ``remove_old_files.py``.
+
+A run that removes files holds an exclusive ``fcntl`` lock on
+``/cache/log/drake-ci/remove_old_files.lock`` for its whole duration, so that a run
+started while the previous one is still scanning (e.g., by ``cron`` 15 minutes later)
+either skips or waits behind it, rather than doubling the I/O load and racing to
+remove the same files.  The lock is released by the kernel when the process exits,
+even if it crashes or is killed.
+
+While held, the lock file describes the run (process, arguments, and current phase)
+as JSON, which ``disk_usage.py`` reports with :func:`read_prune_state`.
+
+The evictions of ``prune_daemon.py`` hold the same lock, so that they never overlap a
+run of ``remove_old_files.py`` either.
+
+This file must live in the same directory as the helper scripts that use it."""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+DEFAULT_LOCK_PATH = Path("/cache/log/drake-ci/remove_old_files.lock")
+"""The lock file of ``remove_old_files.py``."""
+
+POLL_SECONDS = 0.1
+"""How often a waiting run tries to acquire the lock."""
+
+MIN_WAIT_SECONDS = 1.0
+"""Minimum time a run tries to acquire the lock: :func:`read_prune_state` briefly holds
+a shared lock, which must not make a run skip."""
+
+
+class PruneLock:
+    """The exclusive lock of a pruning run.
+
+    Usage:
+
+    1. Create the PruneLock instance.
+    2. Call :func:`PruneLock.acquire`, and if it succeeds, describe the progress of the
+       run with :func:`PruneLock.set_phase`.
+    3. Call :func:`PruneLock.release` (or let the process exit).
+
+    **Attributes**
+    path: Path
+        Path to the lock file, created if needed.
+
+    state: dict[str, Any]
+        What the lock file describes while held.
+    """
+
+    def __init__(self, path: Path = DEFAULT_LOCK_PATH) -> None:
+        self.path = path
+        self.state: dict[str, Any] = {}
+        self._fd: int | None = None
+
+    def acquire(self, wait_seconds: float = 0.0, **state: Any) -> bool:
+        """Try to acquire the lock for up to ``wait_seconds``, return whether it was
+        acquired.  The lock file then describes this process and ``state``."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + max(wait_seconds, MIN_WAIT_SECONDS)
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    return False
+                time.sleep(POLL_SECONDS)
+        self._fd = fd
+        now = time.time()
+        self.state = {
+            "pid": os.getpid(),
+            "argv": sys.argv,
+            "started": now,
+            "phase": "start",
+            "phase_started": now,
+        }
+        self.state.update(state)
+        self._write()
+        return True
+
+    def set_phase(self, phase: str) -> None:
+        """Describe the current ``phase`` of the run (e.g., ``scan``) in the lock."""
+        if self._fd is None:
+            return
+        self.state["phase"] = phase
+        self.state["phase_started"] = time.time()
+        self._write()
+
+    def _write(self) -> None:
+        assert self._fd is not None
+        data = json.dumps(self.state).encode()
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, data, 0)
+
+    def release(self) -> None:
+        """Release the lock (if held)."""
+        if self._fd is None:
+            return
+        os.ftruncate(self._fd, 0)
+        os.close(self._fd)
+        self._fd = None
+
+
+def read_prune_state(path: Path = DEFAULT_LOCK_PATH) -> dict[str, Any] | None:
+    """Return the state of the run holding the lock at ``path``, ``None`` if no run
+    holds it."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        try:
+            # A shared lock is only refused while a run holds the exclusive lock.
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            return None
+        except BlockingIOError:
+            pass
+        try:
+            state = json.loads(os.pread(fd, 65536, 0) or b"{}")
+        except ValueError:
+            state = {}
+        return state if isinstance(state, dict) else {}
+    finally:
+        os.close(fd)
@@ -0,0 +1,122 @@
+"""Minimal decoding of the remote execution API protobufs stored in the cache.
+
+The action cache (``ac/<hash>``) holds serialized ``ActionResult`` messages, which
+reference the blobs of the content addressed storage (``cas/<hash>``) by ``Digest``.
+Output directories are described by a ``Tree`` message, itself stored as a blob,
+which references the blobs of every file in the directory.  Only the fields needed to
+find those references are decoded here, so that the cron scripts do not depend on the
+``protobuf`` package.  See ``remote_execution.proto`` in
+https://github.com/bazelbuild/remote-apis for the message definitions.
+
+This file must live in the same directory as the helper scripts that use it."""
+
+from __future__ import annotations
+
+from typing import Iterator
+
+_VARINT = 0
+_I64 = 1
+_LEN = 2
+_I32 = 5
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    """Return the varint starting at ``data[pos]`` and the position after it."""
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("truncated varint")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+        if shift >= 64:
+            raise ValueError("varint too long")
+
+
+def _fields(data: bytes) -> Iterator[tuple[int, int | bytes]]:
+    """Yield the (field number, value) of every field of the message ``data``.
+    Length delimited values are returned as ``bytes``, all others as ``int``."""
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        field_number, wire_type = key >> 3, key & 0x7
+        if wire_type == _VARINT:
+            value, pos = _read_varint(data, pos)
+            yield field_number, value
+        elif wire_type == _LEN:
+            length, pos = _read_varint(data, pos)
+            if pos + length > len(data):
+                raise ValueError("truncated length delimited field")
+            yield field_number, data[pos : pos + length]
+            pos += length
+        elif wire_type == _I64:
+            pos += 8
+        elif wire_type == _I32:
+            pos += 4
+        else:
+            raise ValueError(f"unsupported wire type {wire_type}")
+    if pos != len(data):
+        raise ValueError("truncated fixed width field")
+
+
+def _submessages(data: bytes, field_number: int) -> Iterator[bytes]:
+    """Yield every length delimited value of ``field_number`` in ``data``."""
+    for number, value in _fields(data):
+        if number == field_number and isinstance(value, bytes):
+            yield value
+
+
+def _digest_hash(digest: bytes) -> str | None:
+    """Return the ``hash`` (field 1) of a ``Digest`` message, or ``None`` for an empty
+    blob (``size_bytes``, field 2, is zero).  Bazel never uploads or downloads empty
+    blobs, so they are not expected to exist in the cache."""
+    hash = None
+    size_bytes = 0
+    for number, value in _fields(digest):
+        if number == 1 and isinstance(value, bytes):
+            hash = value.decode("ascii")
+        elif number == 2 and isinstance(value, int):
+            size_bytes = value
+    if hash is None:
+        raise ValueError("digest without a hash")
+    return hash if size_bytes else None
+
+
+def action_result_references(data: bytes) -> tuple[list[str], list[str]]:
+    """Return the blob hashes and the ``Tree`` blob hashes referenced by the
+    serialized ``ActionResult`` ``data``.
+
+    Raises ``ValueError`` if ``data`` is not a valid message."""
+    blobs: list[str | None] = []
+    trees: list[str | None] = []
+    for number, value in _fields(data):
+        if not isinstance(value, bytes):
+            continue
+        if number == 2:  # OutputFile output_files
+            for digest in _submessages(value, 2):
+                blobs.append(_digest_hash(digest))
+        elif number == 3:  # OutputDirectory output_directories
+            for digest in _submessages(value, 3):  # tree_digest
+                trees.append(_digest_hash(digest))
+        elif number in (6, 8):  # stdout_digest, stderr_digest
+            blobs.append(_digest_hash(value))
+    return [b for b in blobs if b], [t for t in trees if t]
+
+
+def tree_references(data: bytes) -> list[str]:
+    """Return the blob hashes of every file in the serialized ``Tree`` ``data``.
+
+    Raises ``ValueError`` if ``data`` is not a valid message."""
+    blobs: list[str | None] = []
+    for number, directory in _fields(data):
+        # Tree root (1) and children (2) are both Directory messages.
+        if number not in (1, 2) or not isinstance(directory, bytes):
+            continue
+        for file_node in _submessages(directory, 1):  # FileNode files
+            for digest in _submessages(file_node, 2):
+                blobs.append(_digest_hash(digest))
+    return [b for b in blobs if b]
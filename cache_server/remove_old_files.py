@@ -6,33 +6,120 @@
 
 **Automatic Mode**
     By default seek approximately 70% utilization threshold of the volume, searching
-    more recent times if 2 days does not provide enough data to be removed.
-    WARNING: this mode can and will delete more data than would be required for the
-    provided utilization threshold.  It simply chooses the first value that will get
-    under the limit.
+    more recent times if 2 days does not provide enough data to be removed.  The most
+    recent time is solved for exactly (to the file): only the data required to reach
+    the provided utilization threshold is removed, unless 2 days already removes more.
+    The ``--policy`` option chooses which more recent files go first: the oldest
+    (``age``), old and large (``gds``), or from the largest salts (``fair-share``).
 
 **Manual Mode**
     Remove files with an access time of 2 days ago or longer.  If you desire to delete
     all files that have not been accessed within the last 5 hours, for example, you
     must supply both ``--days 0`` and ``--hours 5``.  Providing just ``--hours 5`` will
     result in two days and five hours.
+
+**Streaming**
+    With ``--stream``, files are removed while the cache is scanned, using constant
+    memory (nothing is recorded per file).  The automatic mode then scans twice: first
+    to build a histogram of bytes by age, then to remove every file older than the
+    bucket that frees enough space.  Only the ``age`` policy is supported.
+
+**Access Times**
+    On ``relatime`` mounts, ``st_atime`` is only updated once a day.  With
+    ``--recency-map``, the access time of every file is the most recent of its
+    ``st_atime`` and of its latest download logged by ``nginx`` (see
+    ``access_recency.py``), i.e., files are removed least recently used first.  Right
+    before removing files, the downloads logged since the scan are read too, and files
+    downloaded since are kept.
+
+**Concurrent Runs**
+    Runs that remove files hold a lock (see ``prune_lock.py``): a run started while
+    another is active skips (``--on-lock skip``) or waits for it (``--on-lock wait``).
+    The files being removed are saved to a checkpoint first, so that a run interrupted
+    while removing them is resumed by the next run rather than scanning again.
 """
 
 from __future__ import annotations
 
 import argparse
+import json
+import math
 import os
+import re
 import shutil
+import sqlite3
 import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from enum import Enum, unique
+from itertools import accumulate
 from pathlib import Path
-
-from cache_logging import cache_logging_basic_setup, log_message
+from typing import Callable, Iterable, Iterator, NamedTuple, Protocol
+
+from access_log import DEFAULT_ACCESS_LOG, HIT_STATUSES, read_entries
+from access_recency import (
+    DEFAULT_RECENCY_PATH,
+    RETENTION as RECENCY_RETENTION,
+    AccessRecency,
+    update_access_recency,
+)
+from cache_index import DEFAULT_INDEX_PATH, IndexedStat, ScanIndex
+from cache_layout import (
+    AC,
+    CAS,
+    SaltDirectory,
+    cas_path,
+    parse_relative_directory,
+    relative_path,
+    uri_from_path,
+)
+from cache_logging import cache_logging_basic_setup, log_message, timed_phase
+from prune_lock import DEFAULT_LOCK_PATH, PruneLock, read_prune_state
+from remote_cache_proto import action_result_references, tree_references
+from usage_series import UsageSample, UsageSeries, series_path, upload_rate
 
 DEFAULT_DELTA_MAX = timedelta(days=2)
 """Default time duration for determining files to remove."""
 
+DEFAULT_JOBS = 1
+"""Default number of directory scanning threads.  More threads only pay off when the
+scan waits on the volume (e.g., a cold network volume), a tree in the page cache is
+scanned faster by a single one (see ``benchmark_scan.py``)."""
+
+DEFAULT_DELETE_JOBS = 4
+"""Default number of threads removing files, a few so that removals overlap without
+competing with ``nginx`` for the volume."""
+
+DELETE_BATCH_SIZE = 1024
+"""Maximum number of files of a single directory removed by one deletion task."""
+
+CACHE_CMAKE_PATH = (
+    Path(__file__).parent.absolute().parent / "driver/configurations/cache.cmake"
+)
+"""Where ``DASHBOARD_REMOTE_CACHE_KEY_VERSION`` is set (in this repository)."""
+
+REMOVING_PREFIX = ".removing-"
+"""Salts being removed as a whole are first renamed with this prefix."""
+
+DEFAULT_RUN_SUMMARY_PATH = Path("/cache/log/drake-ci/remove_old_files_last_run.json")
+"""Where the statistics of the latest run are saved (see ``metrics_exporter.py``)."""
+
+DEFAULT_CHECKPOINT_PATH = Path("/cache/log/drake-ci/remove_old_files_checkpoint.jsonl")
+"""Where the files being removed are saved, see :class:`RemovalCheckpoint`."""
+
+CHECKPOINT_MAX_AGE = timedelta(hours=6)
+"""Older checkpoints are not resumed: the cache has changed too much since."""
+
+STOP_CHECK_ROUNDS = 20
+"""The files that :func:`CacheDirectory.maybe_remove_files` may spare once the target
+disk usage is reached are removed in this many rounds, the disk usage is measured
+before each."""
+
 
 def bytes_to_human_string(size_bytes: int) -> str:
     """Return a human readable conversion of the provided ``size_bytes`` to either GiB,
@@ -56,6 +143,193 @@ def bytes_to_human_string(size_bytes: int) -> str:
     return f"{round(value, 2)} {units}"
 
 
+def allocated_bytes(f_stat: os.stat_result | IndexedStat) -> int:
+    """Return the disk space allocated to a file, i.e., what removing it frees.
+
+    ``st_size`` undercounts small files (a 100 byte action cache entry still takes a
+    whole 4 KiB block) and overcounts sparse ones, so the space freed by removing
+    millions of files differs markedly from the sum of their sizes."""
+    # NOTE: st_blocks is in 512 byte units regardless of the file system block size.
+    return f_stat.st_blocks * 512
+
+
+class _DirectoryListing(NamedTuple):
+    """The result of listing a single directory (see :func:`_scan_directory`)."""
+
+    directory: str
+    mtime_ns: int | None
+    """The ``st_mtime_ns`` of ``directory`` before it was listed, ``None`` if it was
+    not queried (no index) or the directory could not be listed."""
+
+    subdirectories: list[str]
+    files: list[tuple[str, os.stat_result | Exception]] | None
+    """``None`` if the ``directory`` is unchanged since it was indexed."""
+
+
+def _scan_directory(
+    directory: str,
+    index: ScanIndex | None = None,
+    on_directory: Callable[[str], None] | None = None,
+) -> _DirectoryListing:
+    """List a single ``directory`` with ``os.scandir``.
+
+    Returns the subdirectories to descend into, and a (file path, stat result or the
+    exception raised while querying it) tuple for every file.  Directory traversal
+    mirrors ``os.walk(followlinks=False)``: directories that cannot be listed are
+    skipped, symbolic links to directories are neither descended into nor reported
+    as files, and broken symbolic links are reported as files (whose stat fails).
+
+    When an ``index`` is provided and the modification time of ``directory`` has not
+    changed since it was indexed, the directory is not listed at all.
+
+    ``on_directory`` is called with ``directory`` before it is listed."""
+    if on_directory is not None:
+        on_directory(directory)
+    subdirectories: list[str] = []
+    files: list[tuple[str, os.stat_result | Exception]] = []
+    mtime_ns = None
+    try:
+        if index is not None:
+            mtime_ns = os.stat(directory).st_mtime_ns
+            if index.is_unchanged(directory, mtime_ns):
+                return _DirectoryListing(
+                    directory, mtime_ns, index.subdirectories[directory], None
+                )
+        with os.scandir(directory) as it:
+            entries = list(it)
+    except OSError:
+        return _DirectoryListing(directory, None, subdirectories, files)
+
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if is_dir:
+            if not entry.is_symlink():
+                subdirectories.append(entry.path)
+            continue
+
+        try:
+            # NOTE: DirEntry.stat() follows symlinks the same as Path.stat(), and
+            # caches its result so that no file is stat'ed twice.
+            files.append((entry.path, entry.stat()))
+        except Exception as e:
+            files.append((entry.path, e))
+
+    return _DirectoryListing(directory, mtime_ns, subdirectories, files)
+
+
+def scan_files(
+    root: Path,
+    jobs: int = 1,
+    index: ScanIndex | None = None,
+    on_directory: Callable[[str], None] | None = None,
+) -> Iterator[tuple[str, os.stat_result | IndexedStat | Exception]]:
+    """Recursively yield (file path, stat result or exception) for every file under
+    ``root``.
+
+    Every directory is listed by its own task on a pool of ``jobs`` threads.  The
+    subdirectories found are queued back onto the shared pool, so whichever thread is
+    idle picks up the next (e.g., sharded ``ac`` / ``cas``) directory.  The order in
+    which files are yielded is not deterministic when ``jobs > 1``.
+
+    When an ``index`` is provided, files of unchanged directories are loaded from the
+    index, and the index is updated with every directory that was listed.  The index
+    is only committed once the generator has been exhausted.
+
+    ``on_directory`` is called (from the scanning threads) with every directory right
+    before it is listed, e.g., to start watching it for changes."""
+    visited: set[str] = set()
+
+    def process(
+        listing: _DirectoryListing,
+    ) -> list[tuple[str, os.stat_result | IndexedStat | Exception]]:
+        if index is None:
+            return listing.files or []
+        visited.add(listing.directory)
+        if listing.files is None:
+            return index.cached_files(listing.directory)
+        # Directories that could not be listed are recorded with an impossible
+        # modification time so that they are retried by the next scan.
+        index.update_directory(
+            listing.directory,
+            listing.mtime_ns if listing.mtime_ns is not None else -1,
+            listing.subdirectories,
+            listing.files,
+        )
+        return listing.files
+
+    if jobs <= 1:
+        queue = deque([str(root)])
+        while queue:
+            listing = _scan_directory(queue.popleft(), index, on_directory)
+            queue.extend(listing.subdirectories)
+            yield from process(listing)
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            pending = {pool.submit(_scan_directory, str(root), index, on_directory)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    listing = future.result()
+                    pending.update(
+                        pool.submit(_scan_directory, d, index, on_directory)
+                        for d in listing.subdirectories
+                    )
+                    yield from process(listing)
+
+    if index is not None:
+        index.finish(visited)
+
+
+def read_without_atime(path: str | Path) -> bytes:
+    """Return the contents of the file at ``path`` without updating its access time
+    (which would make it look recently used), when the platform allows it."""
+    flags = os.O_RDONLY | getattr(os, "O_NOATIME", 0)
+    try:
+        fd = os.open(path, flags)
+    except PermissionError:
+        # O_NOATIME requires owning the file (or CAP_FOWNER, e.g., root).
+        fd = os.open(path, os.O_RDONLY)
+    with os.fdopen(fd, "rb") as f:
+        return f.read()
+
+
+class Throttle:
+    """Limit the rate at which files are removed, shared by all deletion threads.
+
+    Every removal reserves the next slot on a virtual clock, sized by whichever limit
+    (bytes per second or files per second) is the most restrictive, and sleeps until
+    its slot starts.  This keeps pruning from starving ``nginx`` of disk bandwidth.
+    """
+
+    def __init__(
+        self,
+        *,
+        bytes_per_second: float | None = None,
+        files_per_second: float | None = None,
+    ) -> None:
+        self.bytes_per_second = bytes_per_second
+        self.files_per_second = files_per_second
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self, size_bytes: int) -> None:
+        """Block until removing a file of ``size_bytes`` is within the limits."""
+        cost = 0.0
+        if self.bytes_per_second:
+            cost = max(cost, size_bytes / self.bytes_per_second)
+        if self.files_per_second:
+            cost = max(cost, 1.0 / self.files_per_second)
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot)
+            self._next_slot = start + cost
+        if start > now:
+            time.sleep(start - now)
+
+
 @unique
 class TimeMetric(Enum):
     """Which time to query from stat (https://docs.python.org/3/library/stat.html)."""
@@ -92,6 +366,325 @@ class Mode(Enum):
     as --days 1 --hours 12."""
 
 
+def remove_batch(
+    directory: str,
+    entries: list[tuple[str, int, int]],
+    *,
+    recheck_metric: TimeMetric | None = None,
+    logged_ns: Callable[[str], int | None] | None = None,
+    throttle: Throttle | None = None,
+) -> tuple[int, int, list[tuple[Path, str]]]:
+    """Remove the files (name, size bytes, time metric in nanoseconds) ``entries``,
+    which all live in ``directory``.  Files are unlinked relative to a single
+    descriptor of the directory, avoiding a path lookup of every parent directory per
+    file.
+
+    When ``recheck_metric`` is provided, files whose ``recheck_metric`` is now more
+    recent than the one in ``entries`` are skipped, as are files that no longer exist
+    (e.g., removed by ``nginx``).  When the times of ``entries`` were the most recent
+    of the access time and of the latest download logged (``--recency-map``),
+    ``logged_ns`` returns the latest download of a file path (see
+    :func:`recency_lookup`), and the same is compared.  Returns the number of skipped
+    files, the total size in bytes of the files removed, and the (path, error
+    message) of every file that could not be removed."""
+    n_skipped = 0
+    bytes_removed = 0
+    errors: list[tuple[Path, str]] = []
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except FileNotFoundError:
+        return len(entries), 0, []
+    except Exception as e:
+        return 0, 0, [(Path(directory, name), str(e)) for name, _, _ in entries]
+    try:
+        for name, size_bytes, time_ns in entries:
+            try:
+                if recheck_metric is not None:
+                    current_ns = getattr(
+                        os.stat(name, dir_fd=dir_fd), f"{repr(recheck_metric)}_ns"
+                    )
+                    if logged_ns is not None:
+                        current_ns = max(
+                            current_ns, logged_ns(os.path.join(directory, name)) or 0
+                        )
+                    if current_ns > time_ns:
+                        n_skipped += 1
+                        continue
+                if throttle is not None:
+                    throttle.wait(size_bytes)
+                os.unlink(name, dir_fd=dir_fd)
+                bytes_removed += size_bytes
+            except FileNotFoundError:
+                n_skipped += 1
+            except Exception as e:
+                errors.append((Path(directory, name), str(e)))
+    finally:
+        os.close(dir_fd)
+    return n_skipped, bytes_removed, errors
+
+
+def recency_lookup(root: Path, recency: AccessRecency) -> Callable[[str], int | None]:
+    """Return the function of a file path under ``root`` returning the time of its
+    latest download recorded in ``recency`` (see :func:`AccessRecency.get_ns`)."""
+    root_str = str(root)
+    return lambda f_path: recency.get_ns(uri_from_path(root_str, f_path))
+
+
+def exit_on_removal_errors() -> None:
+    """Exit with a failing code after files could not be removed."""
+    # NOTE: runs removing files hold the prune lock (see prune_lock.py), so no other
+    # run removes the same files meanwhile, and files removed by someone else are
+    # skipped by remove_batch.  Any error left is real.
+    sys.exit(1)
+
+
+class RemovalCheckpoint:
+    """The batches of files a run is removing, so that a run interrupted while
+    removing them (e.g., killed, or the server rebooted) is resumed by the next run
+    rather than scanning again.
+
+    The checkpoint is a JSON header line (cache directory, time metric, creation time)
+    followed by a JSON line per batch: its directory and (name, size bytes, time metric
+    in nanoseconds) entries.  The indices of the batches removed are appended to a
+    sibling ``.done`` file as they complete.
+
+    **Attributes**
+    path: Path
+        Path to the checkpoint file.
+
+    done_path: Path
+        Path to the indices of the batches removed.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CHECKPOINT_PATH) -> None:
+        self.path = path
+        self.done_path = path.with_name(path.name + ".done")
+        self._done_file = None
+        self._lock = threading.Lock()
+
+    def save(
+        self,
+        root: Path,
+        time_metric: TimeMetric,
+        batches: list[tuple[str, list[tuple[str, int, int]]]],
+    ) -> None:
+        """Replace the checkpoint with the ``batches`` to remove from ``root``."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.done_path.unlink(missing_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            header = {
+                "root": str(root.absolute()),
+                "time_metric": time_metric.value,
+                "created": time.time(),
+            }
+            f.write(json.dumps(header) + "\n")
+            for batch in batches:
+                f.write(json.dumps(batch) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._done_file = open(self.done_path, "a")
+
+    def load(
+        self, root: Path, max_age: timedelta
+    ) -> tuple[TimeMetric, list[tuple[int, str, list[tuple[str, int, int]]]]] | None:
+        """Return the time metric and the (index, directory, entries) of every batch
+        left to remove from ``root``, ``None`` if there is no checkpoint of ``root``
+        younger than ``max_age``.  Resuming continues to mark batches done."""
+        try:
+            with open(self.path) as f:
+                header = json.loads(f.readline())
+                if (
+                    header["root"] != str(root.absolute())
+                    or time.time() - header["created"] > max_age.total_seconds()
+                ):
+                    return None
+                time_metric = TimeMetric(header["time_metric"])
+                batches = [
+                    (i, directory, [tuple(e) for e in entries])
+                    for i, (directory, entries) in enumerate(map(json.loads, f))
+                ]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log_message(f"ERROR: ignoring the unreadable checkpoint {self.path}: {e}")
+            return None
+        try:
+            done = {int(line) for line in self.done_path.read_text().split()}
+        except FileNotFoundError:
+            done = set()
+        self._done_file = open(self.done_path, "a")
+        return time_metric, [b for b in batches if b[0] not in done]
+
+    def mark_done(self, index: int) -> None:
+        """Record that the batch ``index`` has been removed."""
+        assert self._done_file is not None
+        with self._lock:
+            self._done_file.write(f"{index}\n")
+            self._done_file.flush()
+
+    def discard(self) -> None:
+        """Remove the checkpoint, once every batch has been removed."""
+        if self._done_file is not None:
+            self._done_file.close()
+            self._done_file = None
+        self.path.unlink(missing_ok=True)
+        self.done_path.unlink(missing_ok=True)
+
+
+def remove_batches(
+    batches: list[tuple[int, str, list[tuple[str, int, int]]]],
+    *,
+    delete_jobs: int,
+    recheck_metric: TimeMetric | None = None,
+    logged_ns: Callable[[str], int | None] | None = None,
+    throttle: Throttle | None = None,
+    checkpoint: RemovalCheckpoint | None = None,
+) -> tuple[int, int, int, list[tuple[Path, str]]]:
+    """Remove the (index, directory, entries) ``batches`` (see :func:`remove_batch`)
+    on ``delete_jobs`` threads, marking every batch removed as done in
+    ``checkpoint``.  Returns the number of files removed and skipped, the total size
+    in bytes of the files removed, and the (path, error message) of every file that
+    could not be removed."""
+    n_removed = 0
+    n_skipped = 0
+    bytes_removed = 0
+    errors: list[tuple[Path, str]] = []
+
+    def remove(index: int, directory: str, entries: list[tuple[str, int, int]]):
+        result = remove_batch(
+            directory,
+            entries,
+            recheck_metric=recheck_metric,
+            logged_ns=logged_ns,
+            throttle=throttle,
+        )
+        if checkpoint is not None:
+            checkpoint.mark_done(index)
+        return result
+
+    with ThreadPoolExecutor(max_workers=delete_jobs) as pool:
+        futures = [pool.submit(remove, *batch) for batch in batches]
+        for future, (_, _, entries) in zip(futures, batches):
+            batch_skipped, batch_bytes, batch_errors = future.result()
+            n_removed += len(entries) - batch_skipped - len(batch_errors)
+            n_skipped += batch_skipped
+            bytes_removed += batch_bytes
+            errors.extend(batch_errors)
+    return n_removed, n_skipped, bytes_removed, errors
+
+
+def resume_removal(
+    checkpoint: RemovalCheckpoint,
+    root: Path,
+    delete_jobs: int,
+    throttle: Throttle | None = None,
+    recency: AccessRecency | None = None,
+) -> None:
+    """Remove the files that an interrupted run of ``root`` saved to ``checkpoint``
+    and had yet to remove, if any.  Files accessed since (in the time metric of the
+    interrupted run, or downloaded according to ``recency``) are kept."""
+    saved = checkpoint.load(root, CHECKPOINT_MAX_AGE)
+    if saved is None:
+        checkpoint.discard()
+        return
+    time_metric, batches = saved
+    n_files = sum(len(entries) for _, _, entries in batches)
+    log_message(
+        f"==> Resuming the interrupted removal of {n_files} file(s) saved to "
+        f"{checkpoint.path}."
+    )
+    with timed_phase("resume", root=root) as phase:
+        n_removed, n_skipped, n_bytes, errors = remove_batches(
+            batches,
+            delete_jobs=delete_jobs,
+            recheck_metric=time_metric,
+            logged_ns=(
+                recency_lookup(root, recency)
+                if recency is not None and time_metric == TimeMetric.ACCESS_TIME
+                else None
+            ),
+            throttle=throttle,
+            checkpoint=checkpoint,
+        )
+        phase["files_removed"] = n_removed
+        phase["bytes_removed"] = n_bytes
+        phase["removal_errors"] = len(errors)
+    checkpoint.discard()
+    log_message(
+        f"Removed {n_removed} file(s), {bytes_to_human_string(n_bytes)}, skipped "
+        f"{n_skipped} file(s) accessed or removed since."
+    )
+    for path, error_message in errors:
+        log_message(f"ERROR: could not remove {path}: {error_message}")
+
+
+class FileTable:
+    """Compact, column oriented table of the files found by a scan.
+
+    A cache holds millions of files, storing a ``Path`` and ``datetime`` object for
+    each costs gigabytes of memory.  Instead, every directory path is stored once, and
+    each file is a row in parallel ``array`` columns: the index of its directory, the
+    offset of its (file system encoded) name in one shared buffer, its size on disk,
+    and its time metric in nanoseconds since the epoch.  Rows are referred to by their
+    index.
+
+    **Attributes**
+    directories: list[str]
+        Every distinct directory path, referred to by ``directory_ids``.
+
+    directory_ids: array
+        Index into ``directories`` of the directory of every file.
+
+    sizes: array
+        Disk space in bytes allocated to every file (see :func:`allocated_bytes`).
+
+    times_ns: array
+        Access or modification time (nanoseconds since the epoch) of every file.
+    """
+
+    def __init__(self) -> None:
+        self.directories: list[str] = []
+        self._directory_lookup: dict[str, int] = {}
+        self.directory_ids = array("q")
+        self._names = bytearray()
+        self._name_offsets = array("q", [0])
+        self.sizes = array("q")
+        self.times_ns = array("q")
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def append(self, f_path: str, size_bytes: int, time_ns: int) -> None:
+        """Add a row for the file ``f_path``."""
+        directory, name = os.path.split(f_path)
+        directory_id = self._directory_lookup.get(directory)
+        if directory_id is None:
+            directory_id = len(self.directories)
+            self.directories.append(directory)
+            self._directory_lookup[directory] = directory_id
+        self.directory_ids.append(directory_id)
+        self._names += os.fsencode(name)
+        self._name_offsets.append(len(self._names))
+        self.sizes.append(size_bytes)
+        self.times_ns.append(time_ns)
+
+    def name(self, i: int) -> str:
+        """Return the file name (without its directory) of row ``i``."""
+        return os.fsdecode(
+            bytes(self._names[self._name_offsets[i] : self._name_offsets[i + 1]])
+        )
+
+    def directory(self, i: int) -> str:
+        """Return the directory path of row ``i``."""
+        return self.directories[self.directory_ids[i]]
+
+    def path(self, i: int) -> Path:
+        """Return the full path of row ``i``."""
+        return Path(self.directory(i), self.name(i))
+
+
 class CacheDirectory:
     """Scan and encapsulate the cache directory, accumulating files to be pruned.
 
@@ -100,8 +693,10 @@ class CacheDirectory:
     1. Create the CacheDirectory instance once.  Accumulating the list of all files
        takes the longest amount of time.
     2. Call :func:`CacheDirectory.gather_files_for_removal` with your desired timedelta
-       to populate :attr:`CacheDirectory.files_to_remove`.
-    3. Repeat step 2 as desired with new timedelta, e.g., for :data:`Mode.AUTO`.
+       to populate :attr:`CacheDirectory.files_to_remove`.  For :data:`Mode.AUTO`, the
+       timedelta needed to free a given number of bytes is found by
+       :func:`CacheDirectory.find_delta_for_bytes`.
+    3. Repeat step 2 as desired with new timedelta.
     4. Call :func:`CacheDirectory.maybe_remove_files` to remove the list of files that
        matched the latest gather / timedelta query (if not a dry run).
 
@@ -118,18 +713,54 @@ class CacheDirectory:
     verbose: bool
         If true, information on every file being removed will be logged.
 
+    jobs: int
+        Number of threads used to scan the ``root`` directory.
+
+    delete_jobs: int
+        Number of threads used to remove files.
+
+    throttle: Throttle | None
+        Optional limit on the rate at which files are removed.
+
+    index: ScanIndex | None
+        Persistent index of the previous scan, only directories modified since then
+        are listed again.  Access times of files loaded from the index may be stale,
+        so they are re-checked before removal.
+
+    recency: AccessRecency | None
+        For the access time metric, the time every file was last downloaded according
+        to the ``nginx`` access log, used when more recent than its ``st_atime``.
+
+    recency_log: Path | None
+        The access log ``recency`` was updated from.  The downloads logged since the
+        scan are read from it right before removing files, which are re-checked
+        against both their access time and ``recency``.
+
+    checkpoint: RemovalCheckpoint | None
+        Where the files being removed are saved, so that an interrupted removal is
+        resumed by the next run.
+
     start_time: datetime
         The time at which scanning began for access time comparison to delta_max.
 
-    files: list[tuple[Path, int, datetime]]
-        The list of all files found.  Holds (file path, size bytes, access/modify time)
-        tuples describing files to consider for deletion.
+    start_time_ns: int
+        The ``start_time`` in nanoseconds since the epoch.
 
-    files_to_remove: list[tuple[Path, int, datetime]]
-        Candidates for deletion.  This list holds
-        (file path, size bytes, access/modify time) tuples describing all files found
+    files: FileTable
+        All files found (path, size bytes, access/modify time) to consider for
+        deletion.
+
+    delta_max: timedelta | None
+        The timedelta of the latest gather query.
+
+    files_to_remove: array
+        Candidates for deletion.  Holds the ``files`` row indices of all files found
         under ``root`` that are older than ``delta`` time units.
 
+    protected: bytearray | None
+        Mask over the ``files`` rows that must never be gathered for removal (see
+        :func:`CacheDirectory.protect_referenced_blobs`).
+
     invalid_files: list[tuple[Path, str]]
         A list of tuples (file path, error message) of files whose access times could
         not be discovered.
@@ -138,10 +769,20 @@ class CacheDirectory:
         Total number of files examined from the ``root`` directory.
 
     size_bytes: int
-        Total size in bytes of all files described by ``files`` attribute.
+        Total disk space in bytes of all files described by ``files`` attribute.
 
     bytes_to_remove: int
-        Total size in bytes of all files described by ``files_to_remove`` attribute.
+        Total disk space in bytes of all files described by ``files_to_remove``
+        attribute.
+
+    always_remove: array
+        The rows of ``files_to_remove`` that :func:`CacheDirectory.maybe_remove_files`
+        removes even once the target disk usage is reached: orphaned action cache
+        entries, and files of salts over their quota.
+
+    files_removed, bytes_removed, removal_errors: int
+        Number of files and total size in bytes actually removed, and number of files
+        that could not be removed, by :func:`CacheDirectory.maybe_remove_files`.
     """
 
     def __init__(
@@ -151,40 +792,71 @@ def __init__(
         time_metric: TimeMetric,
         dry_run: bool,
         verbose: bool,
+        jobs: int = 1,
+        delete_jobs: int = 1,
+        throttle: Throttle | None = None,
+        index: ScanIndex | None = None,
+        recency: AccessRecency | None = None,
+        recency_log: Path | None = None,
+        checkpoint: RemovalCheckpoint | None = None,
     ) -> None:
         self.root = root
         self.time_metric = time_metric
         self.dry_run = dry_run
         self.verbose = verbose
-        self.start_time = datetime.now()
-        self.files: list[tuple[Path, int, datetime]] = []
-        self.files_to_remove: list[tuple[Path, int, datetime]] = []
+        self.jobs = jobs
+        self.delete_jobs = delete_jobs
+        self.throttle = throttle
+        self.index = index
+        self.recency = recency
+        self.recency_log = recency_log
+        self.checkpoint = checkpoint
+        self.start_time_ns = time.time_ns()
+        self.start_time = datetime.fromtimestamp(self.start_time_ns / 1e9)
+        self.delta_max: timedelta | None = None
+        self.files = FileTable()
+        self.files_to_remove = array("q")
+        self.always_remove = array("q")
+        self.protected: bytearray | None = None
         self.invalid_files: list[tuple[Path, str]] = []
         self.files_scanned = 0
         self.size_bytes = 0
         self.bytes_to_remove = 0
+        self.files_removed = 0
+        self.bytes_removed = 0
+        self.removal_errors = 0
+        # Lazily computed by find_delta_for_bytes().
+        self._sorted_times_ns: array | None = None
+        self._cumulative_bytes: array | None = None
+        # Lazily computed by salt_directories().
+        self._salt_directories: list[SaltDirectory | None] | None = None
 
         # Gather all files that can be potentially removed, storing their time metric.
-        for directory_root, _, file_names in os.walk(self.root):
-            directory_root_path = Path(directory_root)
-            for f in file_names:
+        root = str(self.root)
+        with timed_phase("scan", root=self.root) as phase:
+            for f, f_stat in scan_files(self.root, self.jobs, self.index):
                 self.files_scanned += 1
-                f_path: Path = directory_root_path / f
-                try:
-                    # NOTE: Path.stat() can raise on e.g., broken symlinks.
-                    f_stat = f_path.stat()
-
-                    time_query = self.get_time(f_stat)
-                    # Skip if the file is newer than the start_time (this script may run
-                    # while the cache is being populated, ignore newer files).
-                    if time_query >= self.start_time:
-                        continue
-
-                    # Gather the list of all possible files once.
-                    self.files.append((f_path, f_stat.st_size, time_query))
-                    self.size_bytes += f_stat.st_size
-                except Exception as e:
-                    self.invalid_files.append((f_path, str(e)))
+                # NOTE: stat can fail on e.g., broken symlinks.
+                if isinstance(f_stat, Exception):
+                    self.invalid_files.append((Path(f), str(f_stat)))
+                    continue
+
+                time_ns = self.get_time_ns(f_stat)
+                if recency is not None:
+                    logged_ns = recency.get_ns(uri_from_path(root, f))
+                    if logged_ns is not None and logged_ns > time_ns:
+                        time_ns = logged_ns
+                # Skip if the file is newer than the start_time (this script may run
+                # while the cache is being populated, ignore newer files).
+                if time_ns >= self.start_time_ns:
+                    continue
+
+                # Gather the table of all possible files once.
+                size_bytes = allocated_bytes(f_stat)
+                self.files.append(f, size_bytes, time_ns)
+                self.size_bytes += size_bytes
+            phase["files_scanned"] = self.files_scanned
+            phase["size_bytes"] = self.size_bytes
 
     def get_time(
         self,
@@ -196,17 +868,306 @@ def get_time(
             time_metric = self.time_metric
         return datetime.fromtimestamp(getattr(f_stat, repr(time_metric)))
 
+    def get_time_ns(
+        self,
+        f_stat: os.stat_result | IndexedStat,
+        time_metric: TimeMetric | None = None) -> int:
+        """Return the requested time metric of the given file in nanoseconds since
+        the epoch."""
+        if time_metric is None:
+            time_metric = self.time_metric
+        return getattr(f_stat, f"{repr(time_metric)}_ns")
+
+    @staticmethod
+    def _delta_ns(delta: timedelta) -> int:
+        """Return ``delta`` as an integer number of nanoseconds."""
+        return (delta // timedelta(microseconds=1)) * 1000
+
     def gather_files_for_removal(self, delta_max: timedelta):
         """Return total number of bytes that will be deleted by delta_max.
 
         All files able to be deleted will be added to self.files_to_remove."""
-        self.bytes_to_remove = 0
-        self.files_to_remove.clear()
-        for f_path, size_bytes, time_query in self.files:
-            # Add anything accessed/modified longer ago than the threshold.
-            if (self.start_time - time_query) >= delta_max:
-                self.files_to_remove.append((f_path, size_bytes, time_query))
-                self.bytes_to_remove += size_bytes
+        self.delta_max = delta_max
+        # Add anything accessed/modified longer ago than the threshold.
+        cutoff_ns = self.start_time_ns - self._delta_ns(delta_max)
+        protected = self.protected
+        self.files_to_remove = array(
+            "q",
+            (
+                i
+                for i, t in enumerate(self.files.times_ns)
+                if t <= cutoff_ns and not (protected and protected[i])
+            ),
+        )
+        self.always_remove = array("q")
+        sizes = self.files.sizes
+        self.bytes_to_remove = sum(sizes[i] for i in self.files_to_remove)
+
+    def find_delta_for_bytes(self, bytes_needed: int) -> timedelta:
+        """Return the largest timedelta for which
+        :func:`CacheDirectory.gather_files_for_removal` gathers at least
+        ``bytes_needed`` bytes.
+
+        The files are sorted by time once, and the running total of their sizes (oldest
+        first) is binary searched for the file that reaches ``bytes_needed``.  Its age
+        is the answer, so every file at least as old is removed and nothing newer.  If
+        even all files are not enough, a zero timedelta (remove everything) is
+        returned, and if no bytes are needed, one just older than the oldest file
+        (remove nothing).  Protected files are never gathered, so they are not
+        counted."""
+        if self._sorted_times_ns is None or self._cumulative_bytes is None:
+            times_ns = self.files.times_ns
+            sizes = self.files.sizes
+            protected = self.protected
+            order = sorted(
+                (i for i in range(len(self.files)) if not (protected and protected[i])),
+                key=times_ns.__getitem__,
+            )
+            self._sorted_times_ns = array("q", (times_ns[i] for i in order))
+            self._cumulative_bytes = array("q", accumulate(sizes[i] for i in order))
+
+        if not self._sorted_times_ns:
+            return timedelta(0)
+        if bytes_needed <= 0:
+            oldest_ns = self._sorted_times_ns[0]
+            return timedelta(microseconds=(self.start_time_ns - oldest_ns) // 1000 + 1)
+        i = bisect_left(self._cumulative_bytes, bytes_needed)
+        if i >= len(self._sorted_times_ns):
+            return timedelta(0)
+        # Round down so that the file at index i is included by the gather query.
+        return timedelta(
+            microseconds=(self.start_time_ns - self._sorted_times_ns[i]) // 1000
+        )
+
+    def salt_directories(self) -> list[SaltDirectory | None]:
+        """Return the :class:`SaltDirectory` of every directory of ``files`` (``None``
+        for directories that are not an ``ac`` / ``cas`` directory)."""
+        if self._salt_directories is None:
+            root = str(self.root)
+            self._salt_directories = [
+                parse_relative_directory(relative_path(root, directory))
+                for directory in self.files.directories
+            ]
+        return self._salt_directories
+
+    def _rows_of_kind(self, kind: str) -> Iterator[tuple[SaltDirectory, list[int]]]:
+        """Yield the (salt directory, rows) of every ``kind`` directory, in batches of
+        at most :data:`DELETE_BATCH_SIZE` rows."""
+        salt_directories = self.salt_directories()
+        rows_by_directory: dict[int, list[int]] = {}
+        for i, directory_id in enumerate(self.files.directory_ids):
+            salt_directory = salt_directories[directory_id]
+            if salt_directory is not None and salt_directory.kind == kind:
+                rows_by_directory.setdefault(directory_id, []).append(i)
+        for directory_id, rows in rows_by_directory.items():
+            salt_directory = salt_directories[directory_id]
+            assert salt_directory is not None
+            for j in range(0, len(rows), DELETE_BATCH_SIZE):
+                yield salt_directory, rows[j : j + DELETE_BATCH_SIZE]
+
+    def _read_references(
+        self, salt_directory: SaltDirectory, rows: list[int]
+    ) -> list[set[str] | None]:
+        """Return the CAS hashes referenced by each ``ActionResult`` at ``rows`` (all in
+        the ``ac`` directory ``salt_directory``), including the files of the output
+        directory trees.  A missing tree blob is returned as a reference to it, and
+        entries that cannot be read or parsed are returned as ``None``."""
+        root = str(self.root)
+        references: list[set[str] | None] = []
+        for i in rows:
+            try:
+                blobs, trees = action_result_references(
+                    read_without_atime(self.files.path(i))
+                )
+                f_references = set(blobs)
+                for tree in trees:
+                    f_references.add(tree)
+                    try:
+                        tree_path = cas_path(
+                            root, salt_directory.version, salt_directory.salt, tree
+                        )
+                        f_references.update(
+                            tree_references(read_without_atime(tree_path))
+                        )
+                    except FileNotFoundError:
+                        pass
+                references.append(f_references)
+            except Exception:
+                references.append(None)
+        return references
+
+    def _iter_references(
+        self, include: Callable[[int], bool]
+    ) -> Iterator[tuple[SaltDirectory, int, set[str] | None]]:
+        """Yield (salt directory, row, referenced CAS hashes) of every action cache
+        entry whose row passes ``include``, reading the entries on
+        :attr:`CacheDirectory.jobs` threads."""
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = []
+            for salt_directory, rows in self._rows_of_kind(AC):
+                rows = [i for i in rows if include(i)]
+                if rows:
+                    future = pool.submit(self._read_references, salt_directory, rows)
+                    futures.append((salt_directory, rows, future))
+            for salt_directory, rows, future in futures:
+                for i, references in zip(rows, future.result()):
+                    yield salt_directory, i, references
+
+    def protect_referenced_blobs(self, since: timedelta) -> int:
+        """Protect every CAS blob referenced by an action cache entry used within
+        ``since`` of the start time from being gathered for removal.  Bazel fails to
+        download the outputs of an action cache hit whose blobs are gone.
+
+        Returns the number of blobs protected."""
+        cutoff_ns = self.start_time_ns - self._delta_ns(since)
+        times_ns = self.files.times_ns
+        referenced: dict[tuple[str, str], set[str]] = {}
+        for salt_directory, _, references in self._iter_references(
+            lambda i: times_ns[i] > cutoff_ns
+        ):
+            if references:
+                referenced.setdefault(salt_directory[:2], set()).update(references)
+
+        self.protected = bytearray(len(self.files))
+        n_protected = 0
+        for salt_directory, rows in self._rows_of_kind(CAS):
+            salt_referenced = referenced.get(salt_directory[:2])
+            if not salt_referenced:
+                continue
+            for i in rows:
+                if self.files.name(i) in salt_referenced:
+                    self.protected[i] = 1
+                    n_protected += 1
+        # The protected rows can no longer be gathered, re-sort on the next query.
+        self._sorted_times_ns = None
+        self._cumulative_bytes = None
+        return n_protected
+
+    def gather_orphaned_action_results(self) -> int:
+        """Add every action cache entry that references a CAS blob that does not exist,
+        or is already in :attr:`CacheDirectory.files_to_remove`, to the files to
+        remove.  Bazel would otherwise get an action cache hit whose outputs fail to
+        download.
+
+        Entries that cannot be parsed are left alone.  Returns the number of orphaned
+        entries added."""
+        to_remove = bytearray(len(self.files))
+        for i in self.files_to_remove:
+            to_remove[i] = 1
+
+        # The CAS blobs of every (version, salt) that are kept / removed.
+        present: dict[tuple[str, str], set[str]] = {}
+        removed: dict[tuple[str, str], set[str]] = {}
+        for salt_directory, rows in self._rows_of_kind(CAS):
+            salt_present = present.setdefault(salt_directory[:2], set())
+            salt_removed = removed.setdefault(salt_directory[:2], set())
+            for i in rows:
+                (salt_removed if to_remove[i] else salt_present).add(self.files.name(i))
+
+        root = str(self.root)
+        n_orphans = 0
+        n_unparsable = 0
+        for salt_directory, i, references in self._iter_references(
+            lambda i: not to_remove[i]
+        ):
+            if references is None:
+                n_unparsable += 1
+                continue
+            salt = salt_directory[:2]
+            salt_present = present.get(salt, set())
+            salt_removed = removed.get(salt, set())
+            for digest in references:
+                if digest in salt_present:
+                    continue
+                # Blobs newer than the start time are not in the table, check the
+                # filesystem for anything that is not being removed.
+                if digest in salt_removed or not os.path.exists(
+                    cas_path(root, *salt, digest)
+                ):
+                    self.files_to_remove.append(i)
+                    self.always_remove.append(i)
+                    self.bytes_to_remove += self.files.sizes[i]
+                    n_orphans += 1
+                    break
+
+        log_message(
+            f"Found: {n_orphans} orphaned action cache entries to remove "
+            f"({n_unparsable} could not be parsed and are kept)."
+        )
+        return n_orphans
+
+    def gather_over_quota(
+        self, quota_bytes: int | None, salt_quota_bytes: dict[tuple[str, str], int]
+    ) -> int:
+        """Add the oldest files of every ``<version>/<salt>`` holding more than its
+        quota to the files to remove, until it fits.  The quota of a salt is its
+        ``salt_quota_bytes[(version, salt)]``, or ``quota_bytes`` (``None`` for no
+        quota).  Files already in :attr:`CacheDirectory.files_to_remove` count as
+        freed.  Protected files are never gathered but still count against the quota,
+        a salt whose protected files alone exceed it is logged.  Returns the number
+        of salts over their quota."""
+        files = self.files
+        sizes = files.sizes
+        gathered = bytearray(len(files))
+        for i in self.files_to_remove:
+            gathered[i] = 1
+        protected = self.protected or bytearray(len(files))
+
+        salt_directories = self.salt_directories()
+        rows_by_salt: dict[tuple[str, str], list[int]] = {}
+        for i, directory_id in enumerate(files.directory_ids):
+            salt_directory = salt_directories[directory_id]
+            if salt_directory is not None:
+                rows_by_salt.setdefault(salt_directory[:2], []).append(i)
+
+        n_over_quota = 0
+        for salt, rows in sorted(rows_by_salt.items()):
+            quota = salt_quota_bytes.get(salt, quota_bytes)
+            if quota is None:
+                continue
+            kept_bytes = sum(sizes[i] for i in rows if not gathered[i])
+            if kept_bytes <= quota:
+                continue
+            n_over_quota += 1
+            n_gathered = 0
+            bytes_gathered = 0
+            for i in sorted(rows, key=files.times_ns.__getitem__):
+                if kept_bytes - bytes_gathered <= quota:
+                    break
+                if gathered[i] or protected[i]:
+                    continue
+                self.files_to_remove.append(i)
+                self.always_remove.append(i)
+                n_gathered += 1
+                bytes_gathered += sizes[i]
+            self.bytes_to_remove += bytes_gathered
+            log_message(
+                f"Quota: {'/'.join(salt)} holds {bytes_to_human_string(kept_bytes)}, "
+                f"over its quota of {bytes_to_human_string(quota)}: {n_gathered} "
+                f"file(s), {bytes_to_human_string(bytes_gathered)} to remove.",
+                event="salt_quota",
+                version=salt[0],
+                salt=salt[1],
+                kept_bytes=kept_bytes,
+                quota_bytes=quota,
+                files_to_remove=n_gathered,
+                bytes_to_remove=bytes_gathered,
+            )
+            protected_bytes = sum(
+                sizes[i] for i in rows if protected[i] and not gathered[i]
+            )
+            if protected_bytes > quota:
+                log_message(
+                    f"Quota: {'/'.join(salt)} holds "
+                    f"{bytes_to_human_string(protected_bytes)} of protected files "
+                    f"alone, over its quota of {bytes_to_human_string(quota)}.",
+                    event="salt_quota_protected",
+                    version=salt[0],
+                    salt=salt[1],
+                    protected_bytes=protected_bytes,
+                    quota_bytes=quota,
+                )
+        return n_over_quota
 
     def log_invalid_files(self):
         # NOTE: rarely found in production, can happen when developers copy directories
@@ -229,7 +1190,8 @@ def log_files_to_remove(self):
         )
         if self.verbose and self.files_to_remove:
             log_message("--- FILES TO BE REMOVED:")
-            for (f_path, size_bytes, _) in self.files_to_remove:
+            for i in self.files_to_remove:
+                f_path = self.files.path(i)
                 # Log all time metrics on the file for debugging.
                 f_time_metrics = dict()
                 for time_metric in TimeMetric:
@@ -242,7 +1204,7 @@ def log_files_to_remove(self):
                 tms_msg = [ f'{metric}: {time}'
                           for metric, time in f_time_metrics.items()]
                 log_message(f"  {f_path}, "
-                            f"{bytes_to_human_string(size_bytes)}, "
+                            f"{bytes_to_human_string(self.files.sizes[i])}, "
                             f"{', '.join(tms_msg)}")
             log_message("--- END FILES TO BE REMOVED")
 
@@ -257,35 +1219,883 @@ def log_all_statistics(self) -> None:
         self.log_total_storage_found()
         self.log_files_to_remove()
 
-    def maybe_remove_files(self) -> None:
+    def _batches(self, rows: list[int]) -> list[tuple[str, list[tuple[str, int, int]]]]:
+        """Return the (directory, entries) batches removing ``rows``, see
+        :func:`remove_batch`."""
+        files = self.files
+        rows_by_directory: dict[int, list[int]] = {}
+        for i in rows:
+            rows_by_directory.setdefault(files.directory_ids[i], []).append(i)
+        return [
+            (
+                files.directories[directory_id],
+                [
+                    (files.name(i), files.sizes[i], files.times_ns[i])
+                    for i in rows[j : j + DELETE_BATCH_SIZE]
+                ],
+            )
+            for directory_id, rows in rows_by_directory.items()
+            for j in range(0, len(rows), DELETE_BATCH_SIZE)
+        ]
+
+    def _removal_rounds(self, stop_at_used_bytes: int | None) -> list[list[int]]:
+        """Split :attr:`CacheDirectory.files_to_remove` into the rounds removed by
+        :func:`CacheDirectory.maybe_remove_files`."""
+        if stop_at_used_bytes is None:
+            return [list(self.files_to_remove)]
+        files = self.files
+        cutoff_ns = self.start_time_ns - self._delta_ns(DEFAULT_DELTA_MAX)
+        always = bytearray(len(files))
+        for i in self.always_remove:
+            always[i] = 1
+        required: list[int] = []
+        optional: list[int] = []
+        for i in self.files_to_remove:
+            if always[i] or files.times_ns[i] <= cutoff_ns:
+                required.append(i)
+            else:
+                optional.append(i)
+        round_bytes = sum(files.sizes[i] for i in optional) / STOP_CHECK_ROUNDS
+        rounds = [required]
+        rows: list[int] = []
+        size_bytes = 0
+        for i in optional:
+            rows.append(i)
+            size_bytes += files.sizes[i]
+            if size_bytes >= round_bytes:
+                rounds.append(rows)
+                rows = []
+                size_bytes = 0
+        if rows:
+            rounds.append(rows)
+        return rounds
+
+    def maybe_remove_files(self, stop_at_used_bytes: int | None = None) -> None:
         """Print relevant data to the console and perform the pruning (if
-        ``self.dry_run=False``)."""
+        ``self.dry_run=False``).
+
+        Files are grouped by directory into batches of at most
+        :data:`DELETE_BATCH_SIZE`, which are removed concurrently by
+        :attr:`CacheDirectory.delete_jobs` threads.  The batches are saved to
+        :attr:`CacheDirectory.checkpoint` (if any) first, and it is discarded once they
+        have all been removed.
+
+        When ``stop_at_used_bytes`` is provided, the files older than
+        :data:`DEFAULT_DELTA_MAX` and :attr:`CacheDirectory.always_remove` are removed
+        first.  The others are then removed in the order of
+        :attr:`CacheDirectory.files_to_remove` (first evicted first), in
+        :data:`STOP_CHECK_ROUNDS` rounds: before each, the used bytes of the volume are
+        measured (``statvfs``), and the removal stops once they are at most
+        ``stop_at_used_bytes``."""
         if not self.dry_run and self.files_to_remove:
             log_message("Removing files. This may take a while.")
+            # Reading a file does not modify its directory, so access times loaded
+            # from the index may be older than the real ones.  Skip files that were
+            # accessed since they were indexed, or downloaded since the scan.
+            recheck_time = self.time_metric == TimeMetric.ACCESS_TIME and (
+                self.index is not None or self.recency is not None
+            )
+            logged_ns = None
+            if recheck_time and self.recency is not None:
+                if self.recency_log is not None:
+                    try:
+                        self.recency.update_from_log(self.recency_log)
+                    except (OSError, ValueError) as e:
+                        log_message(
+                            f"ERROR: could not read '{self.recency_log}', only the "
+                            f"downloads logged before the scan are re-checked: {e}"
+                        )
+                logged_ns = recency_lookup(self.root, self.recency)
+
+            rounds = [
+                self._batches(rows) for rows in self._removal_rounds(stop_at_used_bytes)
+            ]
+            if self.checkpoint is not None:
+                self.checkpoint.save(
+                    self.root, self.time_metric, [b for r in rounds for b in r]
+                )
+
+            n_skipped = 0
+            n_kept = 0
             errors: list[tuple[Path, str]] = []  # (path, error message)
-            for i, (f_path, _, _) in enumerate(self.files_to_remove):
-                try:
-                    f_path.unlink()
-                except Exception as e:
-                    errors.append((f_path, str(e)))
+            with timed_phase("unlink", root=self.root) as phase:
+                first_index = 0
+                for k, batches in enumerate(rounds):
+                    if k > 0 and stop_at_used_bytes is not None:
+                        # NOTE: some file systems free the blocks of removed files in
+                        # the background, the usage may lag (never lead) the removal.
+                        used_bytes = shutil.disk_usage(self.root).used
+                        if used_bytes <= stop_at_used_bytes:
+                            n_kept = sum(len(e) for r in rounds[k:] for _, e in r)
+                            log_message(
+                                f"Target reached ({bytes_to_human_string(used_bytes)} "
+                                f"used), keeping the {n_kept} file(s) left."
+                            )
+                            break
+                    n_removed, batch_skipped, n_bytes, batch_errors = remove_batches(
+                        [
+                            (first_index + j, directory, entries)
+                            for j, (directory, entries) in enumerate(batches)
+                        ],
+                        delete_jobs=self.delete_jobs,
+                        recheck_metric=self.time_metric if recheck_time else None,
+                        logged_ns=logged_ns,
+                        throttle=self.throttle,
+                        checkpoint=self.checkpoint,
+                    )
+                    first_index += len(batches)
+                    self.files_removed += n_removed
+                    self.bytes_removed += n_bytes
+                    n_skipped += batch_skipped
+                    errors.extend(batch_errors)
+                self.removal_errors += len(errors)
+                phase["files_removed"] = self.files_removed
+                phase["bytes_removed"] = self.bytes_removed
+                phase["files_skipped"] = n_skipped
+                phase["files_kept"] = n_kept
+                phase["removal_errors"] = self.removal_errors
+            if self.checkpoint is not None:
+                self.checkpoint.discard()
             log_message("DONE.")
+            if n_skipped:
+                log_message(
+                    f"Skipped {n_skipped} file(s) accessed or removed since they were "
+                    "found."
+                )
 
             if errors:
                 log_message("Errors found deleting files:")
                 for f_path, error_message in errors:
                     log_message(f"- {f_path}: {error_message}")
+                exit_on_removal_errors()
 
-                # When this script is running under cron (see README.md, the
-                # crontab exports this environment variable), do not give a
-                # failing exit code if files could not be removed.  If two cron
-                # jobs are running at the same time, they may try to delete the
-                # same files, meaning one will error.
-                if "DRAKE_CRON_JOB" not in os.environ:
-                    log_message(
-                        "NOT failing the job as this ran from cron, another "
-                        "job may have already deleted the file(s) above."
+
+class StreamingPruner:
+    """Remove old files while the cache directory is being scanned.
+
+    :class:`CacheDirectory` records every file before deciding anything, so its memory
+    grows with the size of the cache and nothing is removed until the whole scan has
+    completed.  The StreamingPruner runs the scan as a pipeline instead: files are
+    filtered by age as they are found, grouped into batches of at most
+    :data:`DELETE_BATCH_SIZE` files of the same directory, and removed by
+    ``delete_jobs`` threads while the scan continues.  Only a bounded number of batches
+    are in flight at any time, nothing is kept per file.
+
+    For :data:`Mode.AUTO`, a first pass only sums the bytes of the files by age into
+    a histogram of fixed width buckets, from which the timedelta that frees enough
+    space is chosen (to the bucket).  The second pass removes the files older than it.
+
+    Usage:
+
+    1. Create the StreamingPruner instance.
+    2. For :data:`Mode.AUTO`, call :func:`StreamingPruner.build_age_histogram` and
+       then :func:`StreamingPruner.find_delta_for_bytes`.
+    3. Call :func:`StreamingPruner.remove_files_older_than` with the timedelta.
+
+    **Attributes**
+    root, time_metric, dry_run, verbose, jobs, delete_jobs, throttle, index
+        Same as :class:`CacheDirectory`.
+
+    start_time_ns: int
+        The time (nanoseconds since the epoch) at which the pruner was created, newer
+        files are never removed.
+
+    bucket_ns: int
+        Width in nanoseconds of the buckets of ``histogram``.
+
+    histogram: Counter[int]
+        Total size in bytes of the files whose age is in ``[b, b + 1) * bucket_ns``,
+        by bucket ``b``.  Populated by :func:`StreamingPruner.build_age_histogram`.
+
+    files_scanned: int
+        Total number of files examined by the latest pass.
+
+    size_bytes: int
+        Total size in bytes of the (valid, older than the start time) files examined
+        by the latest pass.
+
+    files_to_remove: int
+        Number of files removed (or that would be removed, for a dry run) by
+        :func:`StreamingPruner.remove_files_older_than`.
+
+    bytes_to_remove: int
+        Total size in bytes of the ``files_to_remove``.
+
+    files_removed, bytes_removed, removal_errors: int
+        Number of files and total size in bytes actually removed, and number of files
+        that could not be removed, by :func:`StreamingPruner.remove_files_older_than`.
+    """
+
+    def __init__(
+        self,
+        *,
+        root: Path,
+        time_metric: TimeMetric,
+        dry_run: bool,
+        verbose: bool,
+        jobs: int = 1,
+        delete_jobs: int = 1,
+        throttle: Throttle | None = None,
+        index: ScanIndex | None = None,
+        bucket: timedelta = timedelta(minutes=5),
+    ) -> None:
+        self.root = root
+        self.time_metric = time_metric
+        self.dry_run = dry_run
+        self.verbose = verbose
+        self.jobs = jobs
+        self.delete_jobs = delete_jobs
+        self.throttle = throttle
+        self.index = index
+        self.start_time_ns = time.time_ns()
+        self.bucket_ns = max(1, CacheDirectory._delta_ns(bucket))
+        self.histogram: Counter[int] = Counter()
+        self.files_scanned = 0
+        self.size_bytes = 0
+        self.files_to_remove = 0
+        self.bytes_to_remove = 0
+        self.files_removed = 0
+        self.bytes_removed = 0
+        self.removal_errors = 0
+
+    def _scan(self) -> Iterator[tuple[str, int, int]]:
+        """Yield the (path, size bytes, time metric in nanoseconds) of every file
+        older than the start time.  Files of a directory are yielded consecutively."""
+        self.files_scanned = 0
+        self.size_bytes = 0
+        attribute = f"{repr(self.time_metric)}_ns"
+        for f, f_stat in scan_files(self.root, self.jobs, self.index):
+            self.files_scanned += 1
+            if isinstance(f_stat, Exception):
+                log_message(f"INVALID: {f}: {f_stat}")
+                continue
+            time_ns = getattr(f_stat, attribute)
+            if time_ns >= self.start_time_ns:
+                continue
+            size_bytes = allocated_bytes(f_stat)
+            self.size_bytes += size_bytes
+            yield f, size_bytes, time_ns
+
+    def build_age_histogram(self) -> None:
+        """First pass: populate :attr:`StreamingPruner.histogram`."""
+        self.histogram.clear()
+        with timed_phase("histogram", root=self.root) as phase:
+            for _, size_bytes, time_ns in self._scan():
+                bucket = (self.start_time_ns - time_ns) // self.bucket_ns
+                self.histogram[bucket] += size_bytes
+            phase["files_scanned"] = self.files_scanned
+            phase["size_bytes"] = self.size_bytes
+
+    def find_delta_for_bytes(self, bytes_needed: int) -> timedelta:
+        """Return the largest timedelta, at a bucket boundary of the histogram, such
+        that the files older than it total at least ``bytes_needed`` bytes.  At most
+        the size of one bucket more than ``bytes_needed`` is selected."""
+        cumulative = 0
+        for bucket in sorted(self.histogram, reverse=True):
+            cumulative += self.histogram[bucket]
+            if cumulative >= bytes_needed:
+                return timedelta(microseconds=bucket * self.bucket_ns // 1000)
+        return timedelta(0)
+
+    def _batches(
+        self, delta: timedelta
+    ) -> Iterator[tuple[str, list[tuple[str, int, int]]]]:
+        """Yield (directory, [(name, size bytes, time metric in nanoseconds)]) batches
+        of the files older than ``delta``, as they are scanned."""
+        cutoff_ns = self.start_time_ns - CacheDirectory._delta_ns(delta)
+        batch_directory = ""
+        batch: list[tuple[str, int, int]] = []
+        for f, size_bytes, time_ns in self._scan():
+            if time_ns > cutoff_ns:
+                continue
+            self.files_to_remove += 1
+            self.bytes_to_remove += size_bytes
+            if self.verbose:
+                f_time = datetime.fromtimestamp(time_ns / 1e9)
+                log_message(
+                    f"  {f}, {bytes_to_human_string(size_bytes)}, "
+                    f"{self.time_metric}: {f_time}"
+                )
+            directory, name = os.path.split(f)
+            if directory != batch_directory or len(batch) >= DELETE_BATCH_SIZE:
+                if batch:
+                    yield batch_directory, batch
+                batch_directory, batch = directory, []
+            batch.append((name, size_bytes, time_ns))
+        if batch:
+            yield batch_directory, batch
+
+    def remove_files_older_than(self, delta: timedelta) -> None:
+        """Second pass: remove (unless a dry run) every file older than ``delta`` as
+        it is scanned, and log the statistics of the pass."""
+        self.files_to_remove = 0
+        self.bytes_to_remove = 0
+        self.files_removed = 0
+        self.bytes_removed = 0
+        self.removal_errors = 0
+        recheck_metric = (
+            self.time_metric
+            if self.index is not None and self.time_metric == TimeMetric.ACCESS_TIME
+            else None
+        )
+        n_skipped = 0
+        n_errors = 0
+
+        def collect(future: Future, n_files: int) -> None:
+            nonlocal n_skipped, n_errors
+            batch_skipped, batch_bytes, batch_errors = future.result()
+            n_skipped += batch_skipped
+            n_errors += len(batch_errors)
+            self.files_removed += n_files - batch_skipped - len(batch_errors)
+            self.bytes_removed += batch_bytes
+            for f_path, error_message in batch_errors:
+                log_message(f"ERROR: could not remove {f_path}: {error_message}")
+
+        log_message(f"==> {self.root}")
+        with timed_phase("stream", root=self.root, dry_run=self.dry_run) as phase:
+            if self.dry_run:
+                for _ in self._batches(delta):
+                    pass
+            else:
+                log_message("Removing files while scanning. This may take a while.")
+                in_flight: deque[tuple[Future, int]] = deque()
+                with ThreadPoolExecutor(max_workers=self.delete_jobs) as pool:
+                    for directory, entries in self._batches(delta):
+                        future = pool.submit(
+                            remove_batch,
+                            directory,
+                            entries,
+                            recheck_metric=recheck_metric,
+                            throttle=self.throttle,
+                        )
+                        in_flight.append((future, len(entries)))
+                        # Bound the memory used by pending batches, this also throttles
+                        # the scan to the pace of the removal.
+                        while len(in_flight) > 2 * self.delete_jobs:
+                            collect(*in_flight.popleft())
+                    while in_flight:
+                        collect(*in_flight.popleft())
+                self.removal_errors = n_errors
+                log_message("DONE.")
+            phase["files_scanned"] = self.files_scanned
+            phase["files_removed"] = self.files_removed
+            phase["bytes_removed"] = self.bytes_removed
+            phase["removal_errors"] = n_errors
+
+        log_message(f"Found: {self.files_scanned} total files.")
+        log_message(f"       {bytes_to_human_string(self.size_bytes)} total data.")
+        log_message(f"Found: {self.files_to_remove} file(s) to remove.")
+        log_message(
+            f"       {bytes_to_human_string(self.bytes_to_remove)} disk space "
+            "eligible for removal."
+        )
+        if n_skipped:
+            log_message(
+                f"Skipped {n_skipped} file(s) accessed or removed since they were "
+                "found."
+            )
+        if n_errors:
+            log_message(f"Errors found deleting {n_errors} file(s), see above.")
+            exit_on_removal_errors()
+
+
+class EvictionPolicy:
+    """Decides which files :data:`Mode.AUTO` removes to free a number of bytes.
+
+    Subclasses order the files by eviction priority (the first file is evicted first)
+    in :func:`EvictionPolicy.eviction_order`.  :func:`EvictionPolicy.gather` then
+    takes the shortest prefix of that order that frees enough space."""
+
+    name = ""
+    """The value of ``--policy`` that selects this policy."""
+
+    def eviction_order(self, cache_dir: CacheDirectory) -> list[int]:
+        """Return every row index of ``cache_dir.files``, first evicted first."""
+        raise NotImplementedError
+
+    def gather(self, cache_dir: CacheDirectory, bytes_needed: int) -> None:
+        """Add files to ``cache_dir.files_to_remove`` (which may already hold files,
+        e.g., those older than :data:`DEFAULT_DELTA_MAX`) in eviction order, until at
+        least ``bytes_needed`` bytes are to be removed in total."""
+        files = cache_dir.files
+        # Protected files are skipped as if already selected, on a copy of their mask.
+        if cache_dir.protected is not None:
+            selected = bytearray(cache_dir.protected)
+        else:
+            selected = bytearray(len(files))
+        for i in cache_dir.files_to_remove:
+            selected[i] = 1
+        order = [i for i in self.eviction_order(cache_dir) if not selected[i]]
+        cumulative_bytes = array("q", accumulate(files.sizes[i] for i in order))
+        k = bisect_left(cumulative_bytes, bytes_needed - cache_dir.bytes_to_remove)
+        chosen = order[: k + 1]
+        cache_dir.files_to_remove.extend(chosen)
+        cache_dir.bytes_to_remove += sum(files.sizes[i] for i in chosen)
+
+
+class AgePolicy(EvictionPolicy):
+    """Evict the least recently accessed (or modified) files first."""
+
+    name = "age"
+
+    def eviction_order(self, cache_dir: CacheDirectory) -> list[int]:
+        times_ns = cache_dir.files.times_ns
+        return sorted(range(len(cache_dir.files)), key=times_ns.__getitem__)
+
+    def gather(self, cache_dir: CacheDirectory, bytes_needed: int) -> None:
+        # Solve for the exact timedelta instead.  Every file older than the last file
+        # needed (including those already gathered) is removed, and nothing newer.
+        cache_dir.gather_files_for_removal(cache_dir.find_delta_for_bytes(bytes_needed))
+        # Oldest first, in case the removal stops early.
+        cache_dir.files_to_remove = array(
+            "q",
+            sorted(cache_dir.files_to_remove, key=cache_dir.files.times_ns.__getitem__),
+        )
+
+
+class GreedyDualSizePolicy(EvictionPolicy):
+    """Evict old **and** large files first, a static form of GreedyDual-Size.
+
+    Each file gets the priority ``H = t + cost / size``, where ``t`` is its time metric
+    (standing in for the inflation value ``L`` of GreedyDual-Size) and ``cost`` is the
+    price of a cache miss, in seconds times bytes.  Files with the lowest ``H`` are
+    evicted first: a 1 KiB action cache entry keeps 1024 times more credit than a
+    1 MiB blob, so small hot entries outlive cold large blobs."""
+
+    name = "gds"
+
+    def __init__(self, credit_hours: float = 1.0) -> None:
+        self.cost = credit_hours * 3600.0 * 1048576.0
+        """Credit (in seconds) of a 1 MiB file, scaled to seconds times bytes."""
+
+    def eviction_order(self, cache_dir: CacheDirectory) -> list[int]:
+        times_ns = cache_dir.files.times_ns
+        sizes = cache_dir.files.sizes
+        return sorted(
+            range(len(cache_dir.files)),
+            key=lambda i: times_ns[i] / 1e9 + self.cost / max(sizes[i], 1),
+        )
+
+
+class FairSharePolicy(EvictionPolicy):
+    """Evict from the salts holding the most (recently used) data first.
+
+    Each file's priority is the number of bytes of files at least as recent as it in
+    the same ``<version>/<salt>``.  Evicting the highest priority first trims every
+    salt down to the same budget of its most recent data (max-min fairness), so one
+    runaway build configuration cannot push the others out of the cache."""
+
+    name = "fair-share"
+
+    def eviction_order(self, cache_dir: CacheDirectory) -> list[int]:
+        files = cache_dir.files
+        group_ids: dict[tuple[str, ...], int] = {}
+        directory_groups = array("q")
+        for directory, salt_directory in zip(
+            files.directories, cache_dir.salt_directories()
+        ):
+            group = salt_directory[:2] if salt_directory is not None else (directory,)
+            directory_groups.append(group_ids.setdefault(group, len(group_ids)))
+
+        newest_first = sorted(
+            range(len(files)), key=files.times_ns.__getitem__, reverse=True
+        )
+        group_bytes = [0] * len(group_ids)
+        priority = array("q", bytes(8 * len(files)))
+        for i in newest_first:
+            group = directory_groups[files.directory_ids[i]]
+            group_bytes[group] += files.sizes[i]
+            priority[i] = group_bytes[group]
+        return sorted(range(len(files)), key=priority.__getitem__, reverse=True)
+
+
+EVICTION_POLICIES: dict[str, type[EvictionPolicy]] = {
+    policy.name: policy
+    for policy in (AgePolicy, GreedyDualSizePolicy, FairSharePolicy)
+}
+"""Every available eviction policy, by name."""
+
+
+def log_hit_rate_impact(cache_dir: CacheDirectory, access_logs: list[Path]) -> None:
+    """Log how many of the recent cache hits in ``access_logs`` were for files in
+    ``cache_dir.files_to_remove``, an estimate of the hit rate lost by removing them."""
+    hits: Counter[str] = Counter()
+    for entry in read_entries(p for p in access_logs if p.is_file()):
+        if entry.method == "GET" and entry.status in HIT_STATUSES:
+            hits[entry.uri.split("?", 1)[0]] += 1
+    n_hits = sum(hits.values())
+
+    root = str(cache_dir.root)
+    n_lost_hits = 0
+    n_hot_files = 0
+    for i in cache_dir.files_to_remove:
+        f_hits = hits.get(uri_from_path(root, str(cache_dir.files.path(i))), 0)
+        if f_hits:
+            n_lost_hits += f_hits
+            n_hot_files += 1
+
+    log_message(
+        f"Expected: {bytes_to_human_string(cache_dir.bytes_to_remove)} freed, "
+        f"{n_hot_files} of the file(s) removed were hit in the access log(s)."
+    )
+    percent = (n_lost_hits / n_hits) * 100.0 if n_hits else 0.0
+    log_message(
+        f"          {n_lost_hits} of {n_hits} recent cache hits "
+        f"({round(percent, 2)}%) would have been misses."
+    )
+
+
+class SaltSummary(NamedTuple):
+    """Aggregate information about a single ``<version>/<salt>`` directory."""
+
+    path: Path
+    version: str
+    salt: str
+    last_access: datetime
+    """The most recent access or modification time of the files of the salt, and of
+    the salt, ``ac``, and ``cas`` directories (i.e., when an entry was last downloaded
+    or uploaded), or of a download of the salt logged in the recency map."""
+
+    size_bytes: int
+    """Disk space allocated to the files of the salt."""
+
+
+def _version_number(version: str) -> int | None:
+    """Return the number of a cache key version (e.g., 7 for ``v7``) or ``None``."""
+    match = re.fullmatch(r"v([0-9]+)", version)
+    return int(match.group(1)) if match else None
+
+
+def configured_cache_key_version() -> str | None:
+    """Return the ``DASHBOARD_REMOTE_CACHE_KEY_VERSION`` that CI currently uses, as set
+    in ``cache.cmake`` of this repository, or ``None`` if it cannot be found."""
+    try:
+        text = CACHE_CMAKE_PATH.read_text()
+    except OSError:
+        return None
+    match = re.search(r'set\(DASHBOARD_REMOTE_CACHE_KEY_VERSION "(v[0-9]+)"\)', text)
+    return match.group(1) if match else None
+
+
+def salt_usage(
+    root: Path,
+    salt_path: str,
+    jobs: int = 1,
+    index: ScanIndex | None = None,
+    recency: AccessRecency | None = None,
+) -> tuple[int, int]:
+    """Return the most recent access or modification time (in nanoseconds since the
+    epoch, 0 if none) of the files under ``salt_path``, or of their latest download
+    according to ``recency``, and the disk space allocated to them.
+
+    The files are read from the ``index`` if it describes ``salt_path`` (their access
+    times may then be stale, i.e., too old), otherwise ``salt_path`` is scanned on
+    ``jobs`` threads."""
+    files: Iterable[tuple[str, os.stat_result | IndexedStat | Exception]]
+    if index is not None and salt_path in index.directory_mtimes:
+        files = index.files_under(salt_path)
+    else:
+        files = scan_files(Path(salt_path), jobs)
+    root_str = str(root)
+    last_ns = 0
+    size_bytes = 0
+    for f, f_stat in files:
+        if isinstance(f_stat, Exception):
+            continue
+        last_ns = max(last_ns, f_stat.st_atime_ns, f_stat.st_mtime_ns)
+        size_bytes += allocated_bytes(f_stat)
+        if recency is not None:
+            logged_ns = recency.get_ns(uri_from_path(root_str, f))
+            if logged_ns is not None and logged_ns > last_ns:
+                last_ns = logged_ns
+    return last_ns, size_bytes
+
+
+def summarize_salts(
+    root: Path,
+    jobs: int = 1,
+    index: ScanIndex | None = None,
+    recency: AccessRecency | None = None,
+) -> list[SaltSummary]:
+    """Return a :class:`SaltSummary` of every ``<version>/<salt>`` under ``root``.
+
+    The files of every salt are read from the ``index`` when it describes them, and
+    scanned otherwise (see :func:`salt_usage`).  Reading an entry does not modify its
+    directory, so downloads are only accounted for by the access times of the files
+    (updated at most once a day on ``relatime`` mounts) and by the ``recency`` map."""
+    summaries: list[SaltSummary] = []
+    with os.scandir(root) as versions:
+        version_dirs = [
+            v
+            for v in versions
+            if _version_number(v.name) is not None and v.is_dir(follow_symlinks=False)
+        ]
+    for version_dir in version_dirs:
+        with os.scandir(version_dir.path) as salts:
+            salt_dirs = [
+                s
+                for s in salts
+                if not s.name.startswith(REMOVING_PREFIX)
+                and s.is_dir(follow_symlinks=False)
+            ]
+        for salt_dir in salt_dirs:
+            last_ns = salt_dir.stat(follow_symlinks=False).st_mtime_ns
+            for kind in (AC, CAS):
+                try:
+                    last_ns = max(
+                        last_ns, os.stat(os.path.join(salt_dir.path, kind)).st_mtime_ns
                     )
-                    sys.exit(1)
+                except OSError:
+                    pass
+            files_ns, size_bytes = salt_usage(
+                root, salt_dir.path, jobs, index, recency
+            )
+            summaries.append(
+                SaltSummary(
+                    path=Path(salt_dir.path),
+                    version=version_dir.name,
+                    salt=salt_dir.name,
+                    last_access=datetime.fromtimestamp(max(last_ns, files_ns) / 1e9),
+                    size_bytes=size_bytes,
+                )
+            )
+    return summaries
+
+
+def remove_stale_salts(
+    *,
+    root: Path,
+    stale_after: timedelta | None,
+    current_version: str | None,
+    dry_run: bool,
+    jobs: int = 1,
+    index: ScanIndex | None = None,
+    recency: AccessRecency | None = None,
+) -> list[tuple[Path, str]]:
+    """Remove whole salts before any per-file work: every salt not accessed within
+    ``stale_after`` (see :func:`summarize_salts`), and every salt of a key version
+    older than ``current_version``.  Access times loaded from the ``index`` may be
+    stale, so a salt found stale by the index is scanned again before it is removed.
+
+    Key versions newer than ``current_version`` are always kept, the clone of this
+    repository on the cache server may lag behind the one CI uses.  Each salt is first
+    renamed with :data:`REMOVING_PREFIX` (so that ``nginx`` stops serving it at once),
+    then removed recursively without stat'ing every file.  Leftovers of interrupted
+    removals are removed again.  Returns the (path, error message) of everything that
+    could not be removed."""
+    now = datetime.now()
+    current_number = (
+        _version_number(current_version) if current_version is not None else None
+    )
+    to_remove: list[Path] = []
+    for summary in summarize_salts(root, jobs, index, recency):
+        version_number = _version_number(summary.version)
+        if (
+            current_number is not None
+            and version_number is not None
+            and version_number < current_number
+        ):
+            reason = f"obsolete key version (current is {current_version})"
+        elif stale_after is not None and now - summary.last_access >= stale_after:
+            if index is not None:
+                last_ns, _ = salt_usage(root, str(summary.path), jobs, None, recency)
+                last_access = datetime.fromtimestamp(last_ns / 1e9)
+                if now - last_access < stale_after:
+                    continue
+                summary = summary._replace(
+                    last_access=max(summary.last_access, last_access)
+                )
+            reason = f"not accessed in {now - summary.last_access}"
+        else:
+            continue
+        log_message(
+            f"STALE SALT: {summary.path}, "
+            f"{bytes_to_human_string(summary.size_bytes)}: {reason}"
+        )
+        to_remove.append(summary.path)
+
+    for version_dir in root.iterdir():
+        if _version_number(version_dir.name) is None or not version_dir.is_dir():
+            continue
+        for leftover in version_dir.glob(f"{REMOVING_PREFIX}*"):
+            log_message(f"STALE SALT: {leftover}: interrupted removal")
+            to_remove.append(leftover)
+
+    log_message(f"Found: {len(to_remove)} stale salt(s) to remove.")
+    if dry_run or not to_remove:
+        return []
+
+    errors: list[tuple[Path, str]] = []
+
+    def remove(path: Path) -> list[tuple[Path, str]]:
+        path_errors: list[tuple[Path, str]] = []
+        if not path.name.startswith(REMOVING_PREFIX):
+            renamed = path.with_name(f"{REMOVING_PREFIX}{path.name}")
+            try:
+                path.rename(renamed)
+                path = renamed
+            except OSError as e:
+                path_errors.append((path, str(e)))
+                return path_errors
+        shutil.rmtree(
+            path, onerror=lambda _, f, e: path_errors.append((Path(f), str(e[1])))
+        )
+        return path_errors
+
+    log_message("Removing stale salts. This may take a while.")
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for path_errors in pool.map(remove, to_remove):
+            errors.extend(path_errors)
+    log_message("DONE.")
+    return errors
+
+
+def check_index_consistency(root: Path, index: ScanIndex, jobs: int) -> int:
+    """Compare a scan using the ``index`` against a full scan of ``root``.  The
+    ``index`` should be ``read_only``: directories changed since it was last updated
+    are listed again (not an inconsistency), but must not be recorded, so that it is
+    left as stale as it was for the next check.
+
+    Logs and returns the number of files that are missing from, extra in, or differ
+    (size, modification time, or stat error) in the index.  Access times are not
+    compared since they are expected to be stale, and files modified after the check
+    started are ignored as they may have been written by ``nginx`` in between."""
+    check_start_ns = time.time_ns()
+    indexed = dict(scan_files(root, jobs, index))
+    full = dict(scan_files(root, jobs))
+
+    def describe(f_stat: os.stat_result | IndexedStat | Exception) -> str:
+        if isinstance(f_stat, Exception):
+            return "stat error"
+        return f"size={f_stat.st_size}, mtime_ns={f_stat.st_mtime_ns}"
+
+    n_inconsistent = 0
+    for f_path in sorted(indexed.keys() | full.keys()):
+        f_indexed = indexed.get(f_path)
+        f_full = full.get(f_path)
+        if isinstance(f_full, os.stat_result) and f_full.st_mtime_ns >= check_start_ns:
+            continue
+        if f_indexed is None:
+            message = "missing from the index"
+        elif f_full is None:
+            message = "no longer exists"
+        elif isinstance(f_indexed, Exception) or isinstance(f_full, Exception):
+            if isinstance(f_indexed, Exception) == isinstance(f_full, Exception):
+                continue
+            message = f"index has {describe(f_indexed)}, found {describe(f_full)}"
+        elif (f_indexed.st_size, f_indexed.st_mtime_ns) == (
+            f_full.st_size,
+            f_full.st_mtime_ns,
+        ):
+            continue
+        else:
+            message = f"index has {describe(f_indexed)}, found {describe(f_full)}"
+        log_message(f"INCONSISTENT: {f_path}: {message}")
+        n_inconsistent += 1
+
+    log_message(
+        f"Index consistency check: {len(full)} file(s) scanned, "
+        f"{n_inconsistent} inconsistent."
+    )
+    return n_inconsistent
+
+
+def cache_disk_usage(parser: argparse.ArgumentParser, cache_dir: Path):
+    """Return the ``shutil.disk_usage`` of the volume of ``cache_dir``, or exit with a
+    parser error if it cannot be determined."""
+    try:
+        du = shutil.disk_usage(cache_dir)
+    except Exception as e:
+        parser.error(f"error collecting disk usage on '{cache_dir}': {e}")
+
+    # An invalid path may result in zero total size being reported.
+    if du.total <= 0:
+        parser.error(f"the provided cache_dir='{cache_dir}' has zero total size.")
+    return du
+
+
+def record_disk_usage(cache_dir: Path, du=None) -> None:
+    """Append the current disk usage (or ``du``) of the volume of ``cache_dir`` to its
+    usage time series, see ``usage_series.py``.  Errors are logged, not raised."""
+    series = UsageSeries(series_path(cache_dir))
+    try:
+        if du is None:
+            du = shutil.disk_usage(cache_dir)
+        series.append(UsageSample(time.time(), du.used, du.total))
+    except Exception as e:
+        log_message(f"ERROR: could not record the disk usage to '{series.path}': {e}")
+
+
+def project_disk_usage(cache_dir: Path, du, hours: float, forecast_hours: float):
+    """Return ``du`` with the bytes used that are expected ``hours`` from now, given the
+    rate at which data was uploaded during the last ``forecast_hours`` according to
+    the usage time series of the volume of ``cache_dir``."""
+    record_disk_usage(cache_dir, du)
+    series = UsageSeries(series_path(cache_dir))
+    try:
+        samples = series.samples(since=time.time() - forecast_hours * 3600.0)
+    except Exception as e:
+        log_message(f"ERROR: could not read '{series.path}': {e}")
+        samples = []
+    rate = upload_rate(samples)
+    if rate is None:
+        log_message("Upload rate: not enough samples recorded yet, not pruning ahead.")
+        return du
+    expected_bytes = math.ceil(rate * hours * 3600.0)
+    log_message(
+        f"Upload rate: {bytes_to_human_string(math.ceil(rate * 3600.0))}/hour over "
+        f"the last {forecast_hours} hours, pruning ahead for "
+        f"{bytes_to_human_string(expected_bytes)} expected in {hours} hours."
+    )
+    return du._replace(used=min(du.total, du.used + expected_bytes))
+
+
+class PruneStatistics(Protocol):
+    """The statistics of a run saved by :func:`write_run_summary`, e.g., a
+    :class:`CacheDirectory` or :class:`StreamingPruner`."""
+
+    files_scanned: int
+    files_removed: int
+    bytes_removed: int
+    removal_errors: int
+
+
+def write_run_summary(
+    path: Path,
+    *,
+    mode: str,
+    start_time: float,
+    pruned: PruneStatistics | None,
+) -> None:
+    """Save the statistics of a run in ``mode`` that started at ``start_time`` (seconds
+    since the epoch) and removed the files of ``pruned`` (``None`` if nothing had to be
+    scanned) to the JSON file ``path``, replacing the previous run.  Errors are logged,
+    not raised."""
+    end_time = time.time()
+    summary = {
+        "mode": mode,
+        "start_time": start_time,
+        "end_time": end_time,
+        "duration_seconds": end_time - start_time,
+        "files_scanned": pruned.files_scanned if pruned is not None else 0,
+        "files_removed": pruned.files_removed if pruned is not None else 0,
+        "bytes_removed": pruned.bytes_removed if pruned is not None else 0,
+        "removal_errors": pruned.removal_errors if pruned is not None else 0,
+    }
+    log_message(
+        f"Run: {round(summary['duration_seconds'], 2)} seconds, "
+        f"{summary['files_removed']} file(s) removed, "
+        f"{bytes_to_human_string(summary['bytes_removed'])} freed.",
+        event="run_summary",
+        **summary,
+    )
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(summary, indent=2) + "\n")
+        os.replace(tmp_path, path)
+    except Exception as e:
+        log_message(f"ERROR: could not save the run summary to '{path}': {e}")
 
 
 def main() -> None:
@@ -307,6 +2117,187 @@ def main() -> None:
         default=TimeMetric.ACCESS_TIME,
         help="Which time metric of the file to consider (default: %(default)s).",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help="Number of threads scanning the cache directory (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--delete-jobs",
+        type=int,
+        default=DEFAULT_DELETE_JOBS,
+        help="Number of threads removing files (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--delete-max-mib-per-second",
+        type=float,
+        default=None,
+        help="Limit the rate of removal to this many MiB of files per second.",
+    )
+    parser.add_argument(
+        "--delete-max-iops",
+        type=float,
+        default=None,
+        help="Limit the rate of removal to this many files per second.",
+    )
+    parser.add_argument(
+        "--prune-orphans",
+        action="store_true",
+        help=(
+            "Also remove action cache entries referencing CAS blobs that no longer "
+            "exist (or that are being removed in this run)."
+        ),
+    )
+    parser.add_argument(
+        "--protect-referenced-hours",
+        type=float,
+        default=None,
+        metavar="HOURS",
+        help=(
+            "Never remove CAS blobs referenced by action cache entries used within "
+            "the last HOURS hours."
+        ),
+    )
+    parser.add_argument(
+        "--salt-quota",
+        action="append",
+        default=[],
+        metavar="[VERSION/SALT=]GIB",
+        help=(
+            "Remove the oldest files of every <version>/<salt> holding more than GIB "
+            "GiB on disk, in the same pass.  With VERSION/SALT=, only for that salt.  "
+            "May be repeated."
+        ),
+    )
+    parser.add_argument(
+        "--stale-salt-hours",
+        type=float,
+        default=None,
+        metavar="HOURS",
+        help=(
+            "Before any per-file work, remove every <version>/<salt> that nothing was "
+            "uploaded to or downloaded from in the last HOURS hours (according to the "
+            "access times of its files, and the --recency-map if any)."
+        ),
+    )
+    parser.add_argument(
+        "--remove-obsolete-versions",
+        action="store_true",
+        help=(
+            "Before any per-file work, remove every salt of a cache key version older "
+            "than the current one."
+        ),
+    )
+    parser.add_argument(
+        "--current-version",
+        type=str,
+        default=None,
+        help=(
+            "The current cache key version for --remove-obsolete-versions (default: "
+            "DASHBOARD_REMOTE_CACHE_KEY_VERSION in cache.cmake)."
+        ),
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help=(
+            "Remove files while scanning with bounded memory, rather than recording "
+            "every file first.  The auto mode scans twice, see --stream-bucket-minutes."
+        ),
+    )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        nargs="?",
+        const=DEFAULT_INDEX_PATH,
+        default=None,
+        metavar="INDEX_PATH",
+        help=(
+            "Use a persistent scan index so that only directories modified since the "
+            "previous run are scanned again (default path: %(const)s)."
+        ),
+    )
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help="Discard the existing scan index and rebuild it from a full scan.",
+    )
+    parser.add_argument(
+        "--check-index",
+        action="store_true",
+        help=(
+            "Compare the scan index against a full scan and exit (nonzero if they are "
+            "inconsistent).  No files are removed."
+        ),
+    )
+    parser.add_argument(
+        "--recency-map",
+        type=Path,
+        nargs="?",
+        const=DEFAULT_RECENCY_PATH,
+        default=None,
+        metavar="MAP_PATH",
+        help=(
+            "For the access time metric, also use the time every file was last "
+            "downloaded according to the nginx access log (see --recency-log), kept "
+            "in a persistent map updated by every run (default path: %(const)s)."
+        ),
+    )
+    parser.add_argument(
+        "--recency-log",
+        type=Path,
+        default=DEFAULT_ACCESS_LOG,
+        help="The nginx access log read by --recency-map (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--lock",
+        type=Path,
+        default=DEFAULT_LOCK_PATH,
+        help=(
+            "The lock file held while removing files, so that runs never overlap "
+            "(default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--on-lock",
+        choices=("skip", "wait"),
+        default="skip",
+        help=(
+            "Whether to skip this run, or to wait for the active one to finish (see "
+            "--lock-wait-minutes), when another run holds the lock (default: "
+            "%(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--lock-wait-minutes",
+        type=float,
+        default=60.0,
+        help=(
+            "With --on-lock=wait, how long to wait before skipping this run "
+            "(default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=DEFAULT_CHECKPOINT_PATH,
+        help=(
+            "Where the files being removed are saved, so that a run interrupted while "
+            "removing them is resumed by the next one rather than scanning again "
+            "(default: %(default)s)."
+        ),
+    )
+    parser.add_argument(
+        "--run-summary",
+        type=Path,
+        default=DEFAULT_RUN_SUMMARY_PATH,
+        help=(
+            "Where the statistics of the run (duration, files and bytes removed) are "
+            "saved, except for dry runs (default: %(default)s)."
+        ),
+    )
     parser.add_argument(
         "-n",
         "--dry_run",
@@ -333,6 +2324,64 @@ def main() -> None:
             "inclusive."
         ),
     )
+    parser_auto.add_argument(
+        "--policy",
+        choices=list(EVICTION_POLICIES),
+        default=AgePolicy.name,
+        help=(
+            "Eviction policy used when removing files older than 2 days is not "
+            "enough (default: %(default)s)."
+        ),
+    )
+    parser_auto.add_argument(
+        "--gds-credit-hours",
+        type=float,
+        default=1.0,
+        help=(
+            "For --policy=gds, the recency credit in hours of a 1 MiB file, smaller "
+            "files receive proportionally more (default: %(default)s)."
+        ),
+    )
+    parser_auto.add_argument(
+        "--access-log",
+        type=Path,
+        action="append",
+        nargs="?",
+        const=DEFAULT_ACCESS_LOG,
+        help=(
+            "Report the hit rate impact of the removal using this nginx access log "
+            "(default path: %(const)s).  May be repeated, e.g., for rotated logs."
+        ),
+    )
+
+    parser_auto.add_argument(
+        "--prune-ahead-hours",
+        type=float,
+        default=None,
+        metavar="HOURS",
+        help=(
+            "Also free the space expected to be uploaded within HOURS hours, at the "
+            "rate recorded in the usage time series of the volume (see disk_usage.py)."
+        ),
+    )
+    parser_auto.add_argument(
+        "--forecast-hours",
+        type=float,
+        default=6.0,
+        help=(
+            "For --prune-ahead-hours, estimate the upload rate from this many hours "
+            "of samples (default: %(default)s)."
+        ),
+    )
+    parser_auto.add_argument(
+        "--stream-bucket-minutes",
+        type=float,
+        default=5.0,
+        help=(
+            "For --stream, the width of the age histogram buckets, i.e., the precision "
+            "of the timedelta solved for (default: %(default)s)."
+        ),
+    )
 
     parser_manual = subparsers.add_parser(
         Mode.MANUAL.value,
@@ -375,10 +2424,60 @@ def main() -> None:
     else:
         parser.error(f"unrecognized mode: {args.mode}")
 
+    if args.check_index and args.rebuild_index:
+        parser.error("check-index compares the existing index, not a rebuilt one.")
+
     # Make sure they provided us a directory.
     if not args.cache_dir.is_dir():
         parser.error(f"the provided cache_dir='{args.cache_dir}' is not a directory...")
 
+    if args.jobs < 1:
+        parser.error(f"jobs={args.jobs} invalid, must be at least 1.")
+    if args.stale_salt_hours is not None and args.stale_salt_hours <= 0:
+        parser.error("stale-salt-hours must be positive.")
+    if args.current_version and _version_number(args.current_version) is None:
+        parser.error(f"current-version={args.current_version} invalid, e.g., v7.")
+    if args.protect_referenced_hours is not None and args.protect_referenced_hours < 0:
+        parser.error("protect-referenced-hours must be greater than or equal to 0.")
+    if args.delete_jobs < 1:
+        parser.error(f"delete-jobs={args.delete_jobs} invalid, must be at least 1.")
+    if args.lock_wait_minutes < 0.0:
+        parser.error("lock-wait-minutes must be greater than or equal to 0.")
+    quota_bytes = None
+    salt_quota_bytes: dict[tuple[str, str], int] = {}
+    for quota in args.salt_quota:
+        salt, _, gib = quota.rpartition("=")
+        try:
+            size_bytes = math.floor(float(gib) * 1073741824.0)
+        except ValueError:
+            size_bytes = -1
+        version, _, salt_name = salt.partition("/")
+        if size_bytes < 0 or (salt and not (version and salt_name)):
+            parser.error(f"salt-quota={quota} invalid, e.g., 50 or v7/<salt>=50.")
+        if salt:
+            salt_quota_bytes[(version, salt_name)] = size_bytes
+        else:
+            quota_bytes = size_bytes
+    for rate in ("delete_max_mib_per_second", "delete_max_iops"):
+        value = getattr(args, rate)
+        if value is not None and value <= 0.0:
+            parser.error(f"{rate.replace('_', '-')}={value} invalid, must be positive.")
+
+    if args.stream and (
+        args.prune_orphans
+        or args.protect_referenced_hours is not None
+        or args.salt_quota
+    ):
+        parser.error(
+            "stream cannot be combined with prune-orphans, protect-referenced-hours, "
+            "or salt-quota, which need every file recorded."
+        )
+    if args.recency_map is not None:
+        if args.metric != TimeMetric.ACCESS_TIME:
+            parser.error("recency-map requires the access time metric.")
+        if args.stream:
+            parser.error("stream cannot be combined with recency-map.")
+
     # This script must be run as root in order to do all of its pruning.
     if os.geteuid() != 0:
         parser.error("this script must be run as root!")
@@ -389,6 +2488,23 @@ def main() -> None:
         # Do not allow anything outside of [1,99] inclusive.
         if args.threshold < 1.0 or args.threshold > 99.0:
             parser.error(f"threshold {args.threshold}% invalid, must be in [1,99].")
+        if args.policy == GreedyDualSizePolicy.name:
+            if args.gds_credit_hours <= 0.0:
+                parser.error("gds-credit-hours must be positive.")
+            policy: EvictionPolicy = GreedyDualSizePolicy(args.gds_credit_hours)
+        else:
+            policy = EVICTION_POLICIES[args.policy]()
+        for hours in ("prune_ahead_hours", "forecast_hours"):
+            value = getattr(args, hours)
+            if value is not None and value <= 0.0:
+                parser.error(f"{hours.replace('_', '-')} must be positive.")
+        if args.stream:
+            if args.policy != AgePolicy.name or args.access_log:
+                parser.error(
+                    "stream only supports the age policy, without access-log."
+                )
+            if args.stream_bucket_minutes <= 0.0:
+                parser.error("stream-bucket-minutes must be positive.")
     else:  # Mode.MANUAL
         # Make sure all timedelta kwargs are positive to avoid invalid comparisons.
         td_kwargs = {
@@ -414,30 +2530,228 @@ def main() -> None:
 
     # Set up logging configurations.
     cache_logging_basic_setup()
+    start_time = time.time()
+
+    # Only one run removes files at a time.  Dry runs and index checks never remove
+    # anything, they run regardless.
+    lock = PruneLock(args.lock)
+    if not (args.dry_run or args.check_index):
+        wait_seconds = 0.0
+        if args.on_lock == "wait":
+            wait_seconds = args.lock_wait_minutes * 60.0
+            log_message(f"Waiting for the lock {args.lock}...")
+        if not lock.acquire(wait_seconds, root=str(args.cache_dir.absolute())):
+            state = read_prune_state(args.lock) or {}
+            since = time.time() - state.get("started", time.time())
+            log_message(
+                f"Skipping this run: process {state.get('pid', '?')} has been "
+                f"pruning for {round(since)} second(s) (phase: "
+                f"{state.get('phase', '?')}), see {args.lock}.",
+                event="prune_lock_skip",
+                pid=state.get("pid"),
+                phase=state.get("phase"),
+                seconds=round(since, 3),
+            )
+            return
+
+    index = None
+    if args.index is not None or args.rebuild_index or args.check_index:
+        index_path = args.index if args.index is not None else DEFAULT_INDEX_PATH
+        log_message(f"Scan index:     {index_path}")
+        if args.check_index:
+            # Compare a snapshot: never repair (or wait for) the index being checked.
+            try:
+                index = ScanIndex(path=index_path, root=args.cache_dir, read_only=True)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                parser.error(f"cannot check the scan index: {e}")
+        else:
+            index = ScanIndex(
+                path=index_path, root=args.cache_dir, rebuild=args.rebuild_index
+            )
+    if args.check_index:
+        assert index is not None
+        if check_index_consistency(args.cache_dir, index, args.jobs):
+            sys.exit(1)
+        return
+
+    throttle = None
+    if args.delete_max_mib_per_second or args.delete_max_iops:
+        throttle = Throttle(
+            bytes_per_second=(
+                args.delete_max_mib_per_second * 1048576.0
+                if args.delete_max_mib_per_second
+                else None
+            ),
+            files_per_second=args.delete_max_iops,
+        )
+
     log_message(f"Age strategy:   {args.metric}")
     log_message(f"Time delta max: {delta_max}")
     if args.dry_run:
         log_message("NOTE: dry run (no files will be removed).")
 
+    recency = None
+    if args.recency_map is not None:
+        log_message(f"Recency map:    {args.recency_map}")
+        lock.set_phase("recency")
+        try:
+            with timed_phase("recency", access_log=args.recency_log) as phase:
+                recency, n_downloads = update_access_recency(
+                    args.recency_log, args.recency_map
+                )
+                phase["downloads"] = n_downloads
+                phase["uris"] = len(recency)
+            log_message(
+                f"Recorded {n_downloads} download(s) of {args.recency_log}, "
+                f"{len(recency)} URI(s) downloaded in the last "
+                f"{RECENCY_RETENTION.days} days."
+            )
+        except (OSError, ValueError) as e:
+            # Fall back to st_atime rather than not pruning at all.
+            log_message(f"ERROR: could not update the recency map, ignoring it: {e}")
+
+    if args.stale_salt_hours is not None or args.remove_obsolete_versions:
+        current_version = None
+        if args.remove_obsolete_versions:
+            current_version = args.current_version or configured_cache_key_version()
+            if current_version is None:
+                parser.error(
+                    f"could not find the current cache key version in "
+                    f"'{CACHE_CMAKE_PATH}', please provide --current-version."
+                )
+        log_message(f"==> Stale salts of {args.cache_dir}")
+        lock.set_phase("stale_salts")
+        with timed_phase("stale_salts", root=args.cache_dir) as phase:
+            errors = remove_stale_salts(
+                root=args.cache_dir,
+                stale_after=(
+                    timedelta(hours=args.stale_salt_hours)
+                    if args.stale_salt_hours is not None
+                    else None
+                ),
+                current_version=current_version,
+                dry_run=args.dry_run,
+                jobs=args.delete_jobs,
+                index=index,
+                recency=recency,
+            )
+            phase["removal_errors"] = len(errors)
+        if errors:
+            log_message("Errors found deleting stale salts:")
+            for path, error_message in errors:
+                log_message(f"- {path}: {error_message}")
+
+    checkpoint = None
+    if not args.dry_run:
+        checkpoint = RemovalCheckpoint(args.checkpoint)
+        lock.set_phase("resume")
+        resume_removal(checkpoint, args.cache_dir, args.delete_jobs, throttle, recency)
+
+    if args.stream:
+        lock.set_phase("stream")
+        pruner = StreamingPruner(
+            root=args.cache_dir,
+            time_metric=args.metric,
+            dry_run=args.dry_run,
+            verbose=args.verbose,
+            jobs=args.jobs,
+            delete_jobs=args.delete_jobs,
+            throttle=throttle,
+            index=index,
+            bucket=(
+                timedelta(minutes=args.stream_bucket_minutes)
+                if mode == Mode.AUTO
+                else timedelta(minutes=5)
+            ),
+        )
+        if mode == Mode.AUTO:
+            du = cache_disk_usage(parser, args.cache_dir)
+            if args.prune_ahead_hours is not None:
+                du = project_disk_usage(
+                    args.cache_dir, du, args.prune_ahead_hours, args.forecast_hours
+                )
+            current_percent_used = (du.used / du.total) * 100.0
+            if current_percent_used <= args.threshold:
+                log_message(
+                    f"Disk usage for {args.cache_dir} is currently at "
+                    f"{round(current_percent_used, 2)}%,\nwhich is beneath the "
+                    f"requested threshold of {args.threshold}.\nNo files to remove."
+                )
+                if not args.dry_run:
+                    write_run_summary(
+                        args.run_summary,
+                        mode=mode.value,
+                        start_time=start_time,
+                        pruned=None,
+                    )
+                return
+            log_message(f"==> Age histogram of {args.cache_dir}")
+            pruner.build_age_histogram()
+            bytes_needed = math.ceil(du.used - (args.threshold / 100.0) * du.total)
+            min_possible_percent_used = (
+                (du.used - pruner.size_bytes) / du.total
+            ) * 100.0
+            if min_possible_percent_used > args.threshold:
+                parser.error(
+                    f"cannot trim to {args.threshold}% usage, the {args.cache_dir} "
+                    f"has {du.used} / {du.total} bytes used, and cumulatively "
+                    f"{pruner.size_bytes} total bytes eligbile for removal were "
+                    "found.  The best threshold that can be achieved is "
+                    f"{round(min_possible_percent_used, 2)}%."
+                )
+            # Files older than DEFAULT_DELTA_MAX are always removed.
+            delta_max = min(
+                DEFAULT_DELTA_MAX, pruner.find_delta_for_bytes(bytes_needed)
+            )
+            log_message(
+                f"Time delta max: {delta_max} to achieve <= {args.threshold}% "
+                f"utilization ({bytes_to_human_string(bytes_needed)} needed)"
+            )
+        pruner.remove_files_older_than(delta_max)
+        if mode == Mode.AUTO and args.prune_ahead_hours is not None:
+            record_disk_usage(args.cache_dir)
+        if not args.dry_run:
+            write_run_summary(
+                args.run_summary, mode=mode.value, start_time=start_time, pruned=pruner
+            )
+        return
+
+    lock.set_phase("scan")
     cache_dir = CacheDirectory(
         root=args.cache_dir,
         time_metric=args.metric,
         dry_run=args.dry_run,
         verbose=args.verbose,
+        jobs=args.jobs,
+        delete_jobs=args.delete_jobs,
+        throttle=throttle,
+        index=index,
+        recency=recency,
+        recency_log=args.recency_log,
+        checkpoint=checkpoint,
     )
+    if args.protect_referenced_hours is not None:
+        n_protected = cache_dir.protect_referenced_blobs(
+            timedelta(hours=args.protect_referenced_hours)
+        )
+        log_message(
+            f"Protected: {n_protected} CAS blob(s) referenced by action cache entries "
+            f"used in the last {args.protect_referenced_hours} hour(s)."
+        )
     if mode == Mode.AUTO:
-        try:
-            du = shutil.disk_usage(args.cache_dir)
-        except Exception as e:
-            parser.error(f"error collecting disk usage on '{args.cache_dir}': {e}")
-
-        # An invalid path may result in zero total size being reported.
-        if du.total <= 0:
-            parser.error(
-                f"the provided cache_dir='{args.cache_dir}' has zero total size."
+        du = cache_disk_usage(parser, args.cache_dir)
+        measured_used = du.used
+        if args.prune_ahead_hours is not None:
+            du = project_disk_usage(
+                args.cache_dir, du, args.prune_ahead_hours, args.forecast_hours
             )
+        # Removal stops once the volume (as measured, without the space pruned ahead
+        # for) is at the threshold.
+        stop_at_used_bytes = math.floor((args.threshold / 100.0) * du.total) - (
+            du.used - measured_used
+        )
 
-        # Iterate backward until we find a suitable number to delete.
+        # Determine whether (and how much) data must be removed.
         current_percent_used = (du.used / du.total) * 100.0
         min_possible_percent_used = (
             (du.used - cache_dir.size_bytes) / du.total
@@ -448,6 +2762,15 @@ def main() -> None:
                 f"{round(current_percent_used, 2)}%,\nwhich is beneath the requested "
                 f"threshold of {args.threshold}.\nNo files to remove."
             )
+            n_gathered = 0
+            if args.prune_orphans:
+                n_gathered += cache_dir.gather_orphaned_action_results()
+            if args.salt_quota:
+                n_gathered += cache_dir.gather_over_quota(quota_bytes, salt_quota_bytes)
+            if n_gathered:
+                cache_dir.log_files_to_remove()
+                lock.set_phase("unlink")
+                cache_dir.maybe_remove_files()
         elif min_possible_percent_used > args.threshold:
             cache_dir.log_all_statistics()
             parser.error(
@@ -459,46 +2782,59 @@ def main() -> None:
             )
         else:
             log_message(f"==> {cache_dir.root}")
-            log_message(
-                f"Scanning for timedelta to achieve <= {args.threshold}% utilization:"
-            )
-            delta_max = DEFAULT_DELTA_MAX
-            # WARNING: keep this fairly small, searching is fast compared to initial
-            # file gather.  Larger windows (e.g., 2 hours) can result in 70% requests
-            # reducing to 50%, or 30% requests to 6%.  A lot of this is unpredictable,
-            # and depends primarily on PR merge rate on drake.
-            time_step = timedelta(minutes=15)
-            while (
-                delta_max.total_seconds() > 0 and current_percent_used > args.threshold
-            ):
-                cache_dir.gather_files_for_removal(delta_max)
-                new_du_used = du.used - cache_dir.bytes_to_remove
-                current_percent_used = (new_du_used / du.total) * 100.0
-                log_message(
-                    f"Delta: {delta_max} => {len(cache_dir.files_to_remove)} file(s), "
-                    f"{bytes_to_human_string(cache_dir.bytes_to_remove)} eligbile for "
-                    "removal"
-                )
-
-                delta_max -= time_step
-
-            # Even if delta_max.total_seconds() is why the loop terminated, remove.  In
-            # production we always need the space freed up.  The disk usage monitoring
-            # component is responsible for alerting when usage is too high.
-            if (delta_max + time_step).total_seconds() < 0:
+            bytes_needed = math.ceil(du.used - (args.threshold / 100.0) * du.total)
+            lock.set_phase("search")
+            with timed_phase("search", policy=policy.name) as phase:
+                # Files older than DEFAULT_DELTA_MAX are always removed, only consult
+                # the eviction policy if they do not free enough space.
+                cache_dir.gather_files_for_removal(DEFAULT_DELTA_MAX)
+                if cache_dir.bytes_to_remove < bytes_needed:
+                    log_message(
+                        f"Applying the {policy.name} eviction policy to achieve "
+                        f"<= {args.threshold}% utilization:"
+                    )
+                    policy.gather(cache_dir, bytes_needed)
                 log_message(
-                    "WARNING: loop terminated unable to find a small enough time "
-                    f"metric to satisfy {args.threshold}% utilization."
+                    f"Policy: {policy.name} => {len(cache_dir.files_to_remove)} "
+                    f"file(s), {bytes_to_human_string(cache_dir.bytes_to_remove)} "
+                    f"eligbile for removal ({bytes_to_human_string(bytes_needed)} "
+                    "needed)"
                 )
+                if args.prune_orphans:
+                    cache_dir.gather_orphaned_action_results()
+                if args.salt_quota:
+                    cache_dir.gather_over_quota(quota_bytes, salt_quota_bytes)
+                phase["bytes_needed"] = bytes_needed
+                phase["files_to_remove"] = len(cache_dir.files_to_remove)
+                phase["bytes_to_remove"] = cache_dir.bytes_to_remove
+            if args.access_log:
+                log_hit_rate_impact(cache_dir, args.access_log)
 
             cache_dir.log_total_storage_found()
             cache_dir.log_files_to_remove()
-            cache_dir.maybe_remove_files()
+            lock.set_phase("unlink")
+            cache_dir.maybe_remove_files(stop_at_used_bytes)
+            if args.prune_ahead_hours is not None:
+                record_disk_usage(args.cache_dir)
     else:  # mode == Mode.MANUAL
-        cache_dir.gather_files_for_removal(delta_max)
+        lock.set_phase("search")
+        with timed_phase("search", delta_max=delta_max) as phase:
+            cache_dir.gather_files_for_removal(delta_max)
+            if args.prune_orphans:
+                cache_dir.gather_orphaned_action_results()
+            if args.salt_quota:
+                cache_dir.gather_over_quota(quota_bytes, salt_quota_bytes)
+            phase["files_to_remove"] = len(cache_dir.files_to_remove)
+            phase["bytes_to_remove"] = cache_dir.bytes_to_remove
         cache_dir.log_all_statistics()
+        lock.set_phase("unlink")
         cache_dir.maybe_remove_files()
 
+    if not args.dry_run:
+        write_run_summary(
+            args.run_summary, mode=mode.value, start_time=start_time, pruned=cache_dir
+        )
+
 
 if __name__ == "__main__":
     main()
@@ -10,6 +10,14 @@
 ``nginx -s reload`` will close the file handles ``nginx`` had open to the previous
 (now possibly rotated to a new filename) log files, and open new ones.  Without
 reloading, all nginx logging for logs that have been rotated will stop.
+
+Before running ``logrotate``, the requests logged to ``/cache/log/nginx/access.log``
+since the previous run are digested into per-minute aggregates appended to
+``/cache/log/drake-ci/access_log_digest.csv`` (see ``access_digest.py``), which keeps
+the traffic history after the rotated logs have been deleted.  If
+``remove_old_files.py --recency-map`` is in use, the downloads logged since are also
+recorded in its map (see ``access_recency.py``), so that none are lost when the access
+log is rotated several times between two runs of ``remove_old_files.py``.
 """
 
 from __future__ import annotations
@@ -23,7 +31,9 @@
 from pathlib import Path
 from typing import NoReturn
 
-from cache_logging import cache_logging_basic_setup, log_message
+from access_digest import DEFAULT_DIGEST_PATH, digest_access_log
+from access_recency import DEFAULT_RECENCY_PATH, update_access_recency
+from cache_logging import cache_logging_basic_setup, log_message, timed_phase
 
 
 def error(msg: str, exit_code: int = 1) -> NoReturn:
@@ -79,15 +89,46 @@ def main():
         str(logrotate_conf_path),
     ]
 
+    nginx_log_dir = cache_log / "nginx"
+    access_log = nginx_log_dir / "access.log"
+    error_log = nginx_log_dir / "error.log"
+
     cache_logging_basic_setup()
+
+    # Digest the access log before it is (possibly) rotated.  The digest is only for
+    # keeping history, never let it prevent the rotation.
+    try:
+        with timed_phase("digest", access_log=access_log) as phase:
+            n_digested = digest_access_log(access_log)
+            phase["requests"] = n_digested
+        log_message(
+            f"Digested {n_digested} request(s) of {access_log} into "
+            f"{DEFAULT_DIGEST_PATH}."
+        )
+    except Exception as e:
+        log_message(f"ERROR: could not digest {access_log}: {e}")
+
+    if DEFAULT_RECENCY_PATH.is_file():
+        try:
+            with timed_phase("recency", access_log=access_log) as phase:
+                _, n_downloads = update_access_recency(access_log)
+                phase["downloads"] = n_downloads
+            log_message(
+                f"Recorded {n_downloads} download(s) of {access_log} into "
+                f"{DEFAULT_RECENCY_PATH}."
+            )
+        except Exception as e:
+            log_message(f"ERROR: could not update {DEFAULT_RECENCY_PATH}: {e}")
+
     log_message(f"Running: {logrotate_args}")
 
     # Run and log ``logrotate``.
-    logrotate_proc = subprocess.run(
-        logrotate_args,
-        capture_output=True,
-        check=True,
-    )
+    with timed_phase("logrotate"):
+        logrotate_proc = subprocess.run(
+            logrotate_args,
+            capture_output=True,
+            check=True,
+        )
     log_stdout_stderr(logrotate_proc)
 
     # Log any messages from the ``logrotate`` logfile.  It gets recreated each time the
@@ -117,9 +158,6 @@ def main():
     )
     log_stdout_stderr(systemctl_proc)
 
-    nginx_log_dir = cache_log / "nginx"
-    access_log = nginx_log_dir / "access.log"
-    error_log = nginx_log_dir / "error.log"
     nginx_log_files = [access_log, error_log]
     log_message(
         "Verifying nginx logging files ("
@@ -0,0 +1,115 @@
+"""Unit tests of :mod:`cache_layout`, run with ``python3 -m unittest`` from this
+directory."""
+
+from __future__ import annotations
+
+import random
+import unittest
+
+from cache_layout import (
+    AC,
+    CAS,
+    CacheKey,
+    cas_path,
+    parse_relative_path,
+    parse_uri,
+    path_from_uri,
+    uri_from_path,
+)
+
+_ROOT = "/cache/data"
+_SALT = "0123456789abcdef0123456789abcdef01234567"
+
+
+def random_digest(rng: random.Random) -> str:
+    """Return a random (hexadecimal) sha256 digest."""
+    return f"{rng.getrandbits(256):064x}"
+
+
+class ParseTest(unittest.TestCase):
+    def test_ac(self) -> None:
+        self.assertEqual(
+            parse_relative_path(f"v7/{_SALT}/ac/abcdef"),
+            CacheKey("v7", _SALT, AC, "abcdef"),
+        )
+        self.assertIsNone(parse_relative_path(f"v7/{_SALT}/ac/ab/abcdef"))
+
+    def test_sharded_cas(self) -> None:
+        self.assertEqual(
+            parse_relative_path(f"/v7/{_SALT}/cas/ab/cd/abcdef"),
+            CacheKey("v7", _SALT, CAS, "abcdef"),
+        )
+        # Not the shard of the digest, or a single level of shards.
+        self.assertIsNone(parse_relative_path(f"v7/{_SALT}/cas/cd/ab/abcdef"))
+        self.assertIsNone(parse_relative_path(f"v7/{_SALT}/cas/ab/abcdef"))
+
+    def test_flat_cas(self) -> None:
+        # No longer served by nginx, until migrate_cas_layout.py moves it.
+        self.assertIsNone(parse_relative_path(f"v7/{_SALT}/cas/abcdef"))
+
+    def test_not_entries(self) -> None:
+        for relative in (
+            "",
+            "index.html",
+            "client-body-temp/0000000001",
+            f"v7/{_SALT}",
+            f"v7/{_SALT}/ac",
+            f"v7/{_SALT}/other/abcdef",
+        ):
+            with self.subTest(relative=relative):
+                self.assertIsNone(parse_relative_path(relative))
+
+    def test_uri(self) -> None:
+        for kind in (AC, CAS):
+            key = CacheKey("v7", _SALT, kind, "abcdef")
+            self.assertEqual(parse_uri(f"/v7/{_SALT}/{kind}/abcdef"), key)
+            self.assertEqual(parse_uri(f"/v7/{_SALT}/{kind}/abcdef?x=1"), key)
+        self.assertIsNone(parse_uri(f"/v7/{_SALT}/cas/ab/cd/abcdef"))
+        self.assertIsNone(parse_uri(f"/v7/{_SALT}/cas/"))
+        self.assertIsNone(parse_uri("/"))
+
+
+class RoundTripTest(unittest.TestCase):
+    def test_entries(self) -> None:
+        rng = random.Random(9)
+        for _ in range(100):
+            digest = random_digest(rng)
+            for path, uri in (
+                (f"{_ROOT}/v7/{_SALT}/ac/{digest}", f"/v7/{_SALT}/ac/{digest}"),
+                (cas_path(_ROOT, "v7", _SALT, digest), f"/v7/{_SALT}/cas/{digest}"),
+            ):
+                for root in (_ROOT, _ROOT + "/"):
+                    self.assertEqual(uri_from_path(root, path), uri)
+                    self.assertEqual(path_from_uri(root, uri), path)
+                    self.assertEqual(path_from_uri(root, uri + "?x=1"), path)
+
+    def test_sharded_cas(self) -> None:
+        path = cas_path(_ROOT, "v7", _SALT, "abcdef")
+        self.assertEqual(path, f"{_ROOT}/v7/{_SALT}/cas/ab/cd/abcdef")
+        self.assertEqual(uri_from_path(_ROOT, path), f"/v7/{_SALT}/cas/abcdef")
+
+    def test_flat_cas(self) -> None:
+        # Its URI is the one of the sharded blob, which nginx serves instead.
+        uri = uri_from_path(_ROOT, f"{_ROOT}/v7/{_SALT}/cas/abcdef")
+        self.assertEqual(uri, f"/v7/{_SALT}/cas/abcdef")
+        self.assertEqual(
+            path_from_uri(_ROOT, uri), f"{_ROOT}/v7/{_SALT}/cas/ab/cd/abcdef"
+        )
+
+    def test_not_entries(self) -> None:
+        for relative in (
+            "index.html",
+            "client-body-temp/0000000001",
+            f"v7/{_SALT}/other/abcdef",
+            f"v7/{_SALT}/ac/ab/abcdef",
+        ):
+            with self.subTest(relative=relative):
+                path = f"{_ROOT}/{relative}"
+                uri = uri_from_path(_ROOT, path)
+                self.assertEqual(uri, f"/{relative}")
+                self.assertEqual(path_from_uri(_ROOT, uri), path)
+                self.assertEqual(path_from_uri(_ROOT, uri + "?x=1"), path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+"""Unit tests of :mod:`remove_old_files`, run with ``python3 -m unittest`` from this
+directory."""
+
+from __future__ import annotations
+
+import logging
+import random
+import tempfile
+import unittest
+from datetime import timedelta
+from pathlib import Path
+
+from remove_old_files import DEFAULT_DELTA_MAX, CacheDirectory, TimeMetric
+
+_MINUTE_NS = 60 * 10**9
+
+
+def setUpModule() -> None:
+    # Every CacheDirectory logs its (empty) scan phase.
+    logging.disable(logging.CRITICAL)
+
+
+def tearDownModule() -> None:
+    logging.disable(logging.NOTSET)
+
+
+def make_cache_directory(files: list[tuple[int, int]]) -> CacheDirectory:
+    """Return a :class:`CacheDirectory` of an empty directory, whose table is then
+    filled with ``files``: (age in nanoseconds, size bytes) of every file."""
+    with tempfile.TemporaryDirectory() as root:
+        cache_dir = CacheDirectory(
+            root=Path(root),
+            time_metric=TimeMetric.ACCESS_TIME,
+            dry_run=True,
+            verbose=False,
+        )
+    for i, (age_ns, size_bytes) in enumerate(files):
+        cache_dir.files.append(
+            f"{root}/cas/{i:06d}", size_bytes, cache_dir.start_time_ns - age_ns
+        )
+        cache_dir.size_bytes += size_bytes
+    return cache_dir
+
+
+def baseline_delta_for_bytes(
+    cache_dir: CacheDirectory, bytes_needed: int
+) -> tuple[timedelta, int]:
+    """Return the (timedelta, bytes to remove) found by the search that
+    :func:`CacheDirectory.find_delta_for_bytes` replaced: step back 15 minutes at a
+    time from :data:`DEFAULT_DELTA_MAX` until enough bytes are gathered."""
+    time_step = timedelta(minutes=15)
+    delta_max = DEFAULT_DELTA_MAX
+    while True:
+        cache_dir.gather_files_for_removal(delta_max)
+        if cache_dir.bytes_to_remove >= bytes_needed or delta_max <= timedelta(0):
+            return delta_max, cache_dir.bytes_to_remove
+        delta_max = max(delta_max - time_step, timedelta(0))
+
+
+class FindDeltaForBytesTest(unittest.TestCase):
+    def assert_smallest_gather(
+        self, cache_dir: CacheDirectory, bytes_needed: int
+    ) -> tuple[timedelta, int]:
+        """Check that the delta found gathers enough bytes (or every file if not
+        possible), and that any larger delta would not, then return the delta and the
+        bytes gathered."""
+        delta = cache_dir.find_delta_for_bytes(bytes_needed)
+        cache_dir.gather_files_for_removal(delta)
+        bytes_to_remove = cache_dir.bytes_to_remove
+        self.assertGreaterEqual(
+            bytes_to_remove, min(bytes_needed, cache_dir.size_bytes)
+        )
+        if bytes_needed <= cache_dir.size_bytes:
+            cache_dir.gather_files_for_removal(delta + timedelta(microseconds=1))
+            self.assertLess(cache_dir.bytes_to_remove, max(bytes_needed, 1))
+        return delta, bytes_to_remove
+
+    def test_random_tables(self) -> None:
+        rng = random.Random(20261018)
+        for _ in range(50):
+            files = [
+                (rng.randrange(1, 4 * 24 * 60 * _MINUTE_NS), rng.randrange(1, 10**6))
+                for _ in range(rng.randrange(1, 500))
+            ]
+            cache_dir = make_cache_directory(files)
+            for _ in range(10):
+                bytes_needed = rng.randrange(1, cache_dir.size_bytes + 1)
+                delta, bytes_to_remove = self.assert_smallest_gather(
+                    cache_dir, bytes_needed
+                )
+                baseline_delta, baseline_bytes = baseline_delta_for_bytes(
+                    cache_dir, bytes_needed
+                )
+                # Never older than the baseline (removes no more), unless the
+                # baseline could not find enough files within DEFAULT_DELTA_MAX.
+                if baseline_bytes >= bytes_needed:
+                    self.assertGreaterEqual(delta, baseline_delta)
+                    self.assertLessEqual(bytes_to_remove, baseline_bytes)
+
+    def test_same_as_baseline_on_steps(self) -> None:
+        # Every file is at a 15 minutes step of the baseline search, which then finds
+        # the exact delta too.
+        rng = random.Random(2)
+        steps = DEFAULT_DELTA_MAX // timedelta(minutes=15)
+        files = [
+            (rng.randrange(1, steps) * 15 * _MINUTE_NS, rng.randrange(1, 10**6))
+            for _ in range(300)
+        ]
+        cache_dir = make_cache_directory(files)
+        for bytes_needed in range(1, cache_dir.size_bytes + 1, 997_141):
+            delta, bytes_to_remove = self.assert_smallest_gather(
+                cache_dir, bytes_needed
+            )
+            self.assertEqual(
+                (delta, bytes_to_remove),
+                baseline_delta_for_bytes(cache_dir, bytes_needed),
+            )
+
+    def test_empty_table(self) -> None:
+        cache_dir = make_cache_directory([])
+        for bytes_needed in (-1, 0, 1):
+            delta = cache_dir.find_delta_for_bytes(bytes_needed)
+            self.assertEqual(delta, timedelta(0))
+            cache_dir.gather_files_for_removal(delta)
+            self.assertEqual(len(cache_dir.files_to_remove), 0)
+
+    def test_no_bytes_needed(self) -> None:
+        cache_dir = make_cache_directory([(5 * _MINUTE_NS, 10), (9 * _MINUTE_NS, 20)])
+        for bytes_needed in (-100, 0):
+            cache_dir.gather_files_for_removal(
+                cache_dir.find_delta_for_bytes(bytes_needed)
+            )
+            self.assertEqual(len(cache_dir.files_to_remove), 0)
+            self.assertEqual(cache_dir.bytes_to_remove, 0)
+
+    def test_more_than_total(self) -> None:
+        cache_dir = make_cache_directory([(5 * _MINUTE_NS, 10), (9 * _MINUTE_NS, 20)])
+        delta = cache_dir.find_delta_for_bytes(31)
+        self.assertEqual(delta, timedelta(0))
+        cache_dir.gather_files_for_removal(delta)
+        self.assertEqual(len(cache_dir.files_to_remove), 2)
+        self.assertEqual(cache_dir.bytes_to_remove, 30)
+
+    def test_tied_times(self) -> None:
+        # Files with the same time are gathered (or not) together.
+        cache_dir = make_cache_directory(
+            [(5 * _MINUTE_NS, 10), (9 * _MINUTE_NS, 20), (9 * _MINUTE_NS, 40)]
+        )
+        for bytes_needed in (1, 20, 21, 60):
+            delta, bytes_to_remove = self.assert_smallest_gather(
+                cache_dir, bytes_needed
+            )
+            self.assertEqual(delta, timedelta(minutes=9))
+            self.assertEqual(bytes_to_remove, 60)
+        delta, bytes_to_remove = self.assert_smallest_gather(cache_dir, 61)
+        self.assertEqual(delta, timedelta(minutes=5))
+        self.assertEqual(bytes_to_remove, 70)
+
+    def test_protected_files(self) -> None:
+        cache_dir = make_cache_directory(
+            [(5 * _MINUTE_NS, 10), (9 * _MINUTE_NS, 20), (7 * _MINUTE_NS, 40)]
+        )
+        cache_dir.protected = bytearray([0, 1, 0])
+        delta, bytes_to_remove = self.assert_smallest_gather(cache_dir, 1)
+        self.assertEqual(delta, timedelta(minutes=7))
+        self.assertEqual(bytes_to_remove, 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
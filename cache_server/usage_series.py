@@ -0,0 +1,203 @@
+"""Time series of the disk usage of the cache server volumes.
+
+Every time ``disk_usage.py`` (or ``remove_old_files.py auto``) measures the usage of a
+volume, the sample is appended to a ring buffer file for that volume, by default
+``/cache/log/drake-ci/disk_usage_<mount point>.series``.  The file holds a small
+header followed by fixed size binary samples (time, bytes used, bytes total), so it
+never grows past :data:`DEFAULT_CAPACITY` samples (about 200 KiB) and appending is a
+single write.
+
+From the samples, :func:`fill_rate` estimates how fast the volume is currently filling
+(net of pruning), :func:`upload_rate` how fast data is being added (ignoring pruning),
+and :func:`hourly_growth` the growth of every hour for correlating with the upload
+waves of the nightly and continuous builds.
+
+This file must live in the same directory as the helper scripts that use it."""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import struct
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple
+
+DEFAULT_SERIES_DIR = Path("/cache/log/drake-ci")
+"""Where the series of every volume is stored."""
+
+DEFAULT_CAPACITY = 8760
+"""Number of samples kept, a year of hourly samples (older ones are overwritten)."""
+
+MIN_SPAN = timedelta(minutes=30)
+"""Minimum duration spanned by samples to estimate a rate from them."""
+
+_HEADER = struct.Struct("<8sIIQ")
+"""Magic, format version, capacity, and total number of samples ever appended."""
+
+_MAGIC = b"DRKUSAGE"
+
+_VERSION = 1
+
+_SAMPLE = struct.Struct("<dqq")
+"""Time (seconds since the epoch), bytes used, bytes total."""
+
+
+class UsageSample(NamedTuple):
+    """A single measurement of the usage of a volume."""
+
+    time: float
+    """Seconds since the epoch."""
+
+    used: int
+    """Bytes used."""
+
+    total: int
+    """Bytes total."""
+
+
+def mount_point(path: Path) -> Path:
+    """Return the mount point of the volume ``path`` is on."""
+    path = path.absolute()
+    while not os.path.ismount(path):
+        path = path.parent
+    return path
+
+
+def series_path(path: Path, series_dir: Path = DEFAULT_SERIES_DIR) -> Path:
+    """Return the path of the series of the volume ``path`` is on, e.g.,
+    ``disk_usage_cache.series`` for anything under a volume mounted at ``/cache``."""
+    name = str(mount_point(path)).strip("/").replace("/", "_") or "root"
+    return series_dir / f"disk_usage_{name}.series"
+
+
+class UsageSeries:
+    """Ring buffer file of :class:`UsageSample`.
+
+    **Attributes**
+    path: Path
+        Path to the series file, created on the first append.
+
+    capacity: int
+        Maximum number of samples kept.  Only used when the file is created, an
+        existing file keeps its own capacity.
+    """
+
+    def __init__(self, path: Path, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.path = path
+        self.capacity = capacity
+
+    def _read_header(self, f) -> tuple[int, int]:
+        """Return the (capacity, count) of the open series ``f``."""
+        f.seek(0)
+        magic, version, capacity, count = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC or version != _VERSION or capacity <= 0:
+            raise ValueError(f"'{self.path}' is not a usage series.")
+        return capacity, count
+
+    def append(self, sample: UsageSample) -> None:
+        """Append ``sample``, overwriting the oldest one when full."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+b") as f:
+            # disk_usage.py and remove_old_files.py may append concurrently.
+            fcntl.flock(f, fcntl.LOCK_EX)
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                capacity, count = self.capacity, 0
+            else:
+                capacity, count = self._read_header(f)
+            f.seek(_HEADER.size + (count % capacity) * _SAMPLE.size)
+            f.write(_SAMPLE.pack(*sample))
+            f.seek(0)
+            f.write(_HEADER.pack(_MAGIC, _VERSION, capacity, count + 1))
+
+    def samples(self, since: float | None = None) -> list[UsageSample]:
+        """Return the samples (oldest first), only those at or after ``since`` (seconds
+        since the epoch) if provided.  Returns an empty list if there is no series."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return []
+        with f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            capacity, count = self._read_header(f)
+            n = min(count, capacity)
+            data = f.read(n * _SAMPLE.size)
+        # Rotate the ring buffer so that the oldest sample comes first.
+        start = count % capacity if count > capacity else 0
+        ordered = [
+            UsageSample(*_SAMPLE.unpack_from(data, ((start + i) % n) * _SAMPLE.size))
+            for i in range(n)
+        ]
+        if since is not None:
+            ordered = [s for s in ordered if s.time >= since]
+        return ordered
+
+
+def _spans_enough(samples: list[UsageSample]) -> bool:
+    """Return whether ``samples`` span at least :data:`MIN_SPAN`."""
+    return (
+        len(samples) >= 2
+        and samples[-1].time - samples[0].time >= MIN_SPAN.total_seconds()
+    )
+
+
+def fill_rate(samples: list[UsageSample]) -> float | None:
+    """Return the least squares slope of the bytes used over time (bytes per second),
+    or ``None`` if the samples span less than :data:`MIN_SPAN`."""
+    if not _spans_enough(samples):
+        return None
+    n = len(samples)
+    t0 = samples[0].time
+    mean_t = sum(s.time - t0 for s in samples) / n
+    mean_u = sum(s.used for s in samples) / n
+    var_t = sum((s.time - t0 - mean_t) ** 2 for s in samples)
+    if var_t == 0.0:
+        return None
+    cov = sum((s.time - t0 - mean_t) * (s.used - mean_u) for s in samples)
+    return cov / var_t
+
+
+def upload_rate(samples: list[UsageSample]) -> float | None:
+    """Return the rate at which data was added (bytes per second): the increases of the
+    bytes used between consecutive samples, over the time they span.  Decreases (data
+    that was pruned) are ignored.  Returns ``None`` if the samples span less than
+    :data:`MIN_SPAN`."""
+    if not _spans_enough(samples):
+        return None
+    added = sum(
+        max(0, after.used - before.used) for before, after in zip(samples, samples[1:])
+    )
+    return added / (samples[-1].time - samples[0].time)
+
+
+def time_to_reach(
+    samples: list[UsageSample], percent: float, rate: float | None
+) -> timedelta | None:
+    """Return how long until the volume reaches ``percent`` utilization from the latest
+    sample at ``rate`` bytes per second.  Returns ``timedelta(0)`` if it is already
+    reached, and ``None`` if it is never reached (or there are no samples)."""
+    if not samples:
+        return None
+    latest = samples[-1]
+    remaining = (percent / 100.0) * latest.total - latest.used
+    if remaining <= 0:
+        return timedelta(0)
+    if rate is None or rate <= 0.0:
+        return None
+    return timedelta(seconds=round(remaining / rate))
+
+
+def hourly_growth(samples: list[UsageSample]) -> list[tuple[datetime, int, int]]:
+    """Return (hour, bytes added, bytes removed) of every hour spanned by ``samples``.
+    The change between two consecutive samples is attributed to the hour of the later
+    one."""
+    growth: dict[datetime, list[int]] = {}
+    for before, after in zip(samples, samples[1:]):
+        hour = datetime.fromtimestamp(after.time).replace(
+            minute=0, second=0, microsecond=0
+        )
+        added_removed = growth.setdefault(hour, [0, 0])
+        delta = after.used - before.used
+        added_removed[0 if delta >= 0 else 1] += abs(delta)
+    return [(hour, added, removed) for hour, (added, removed) in sorted(growth.items())]
@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+"""Copy the most requested cache entries of another cache server into this one.
+
+Deleting the cache makes every pull request build over 10x slower until nightly and
+continuous have populated it again.  To start a new (or purged) cache server warm,
+this script ranks the ``ac`` / ``cas`` entries by their number of hits in ``nginx``
+access logs (e.g., copied from ``/cache/log/nginx`` of the old server), or reads them
+from a manifest saved by a previous run (``--save-manifest``).  The hottest entries
+are then downloaded from a server still serving them (``--source-url``) into the
+cache directory, over ``--jobs`` parallel keep-alive HTTP connections.
+
+Every entry is written to a temporary file and linked into place, never replacing an
+entry uploaded meanwhile, and blobs are verified against their SHA-256, so that an
+interrupted run leaves no partial entries behind.  Entries already present are
+skipped, and the entries done (copied, present, or missing from the source) are
+appended to the ``--progress`` file: running the same command again resumes where it
+stopped.  The progress file starts with the destination it describes (source URL,
+cache directory, ``--to-version`` and ``--to-salt``), and by default every
+destination has its own, so that progress is never resumed into another one.
+
+With ``--to-version`` / ``--to-salt``, blobs are copied into another version or salt,
+e.g., after bumping the cache key version.  Action cache entries are then skipped, as
+they are only valid for the version and salt they were uploaded to.
+
+Run this script as ``root`` on the new server, entries and directories are created
+with the owner of the cache directory (``www-data``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import http.client
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum, unique
+from pathlib import Path
+from typing import Iterable, NamedTuple
+from urllib.parse import urlsplit
+
+from access_log import (
+    DEFAULT_ACCESS_LOG,
+    HIT_STATUSES,
+    AccessLogEntry,
+    read_entries,
+    rotated_logs,
+)
+from cache_layout import AC, CAS, CacheKey, parse_uri, path_from_uri
+from cache_logging import cache_logging_basic_setup, log_message, timed_phase
+from remove_old_files import bytes_to_human_string
+
+DEFAULT_JOBS = 32
+"""Default number of parallel HTTP connections to the source server."""
+
+DEFAULT_PROGRESS_DIR = Path("/cache/log/drake-ci")
+"""Where the URIs done are appended, in a file per destination (see
+:func:`default_progress_path`)."""
+
+RETRIES = 3
+"""Number of attempts to download an entry, on connection errors and 5xx statuses."""
+
+PROGRESS_INTERVAL_SECONDS = 30.0
+"""How often the progress is logged."""
+
+
+class HotEntry(NamedTuple):
+    """A cache entry ranked by its number of hits."""
+
+    uri: str
+    hits: int
+    size_bytes: int
+    """The size logged for the entry (``$body_bytes_sent``), 0 if unknown."""
+
+
+def rank_entries(
+    entries: Iterable[AccessLogEntry], versions: set[str], salts: set[str]
+) -> list[HotEntry]:
+    """Return the ``ac`` / ``cas`` entries hit in the access log ``entries``, most hits
+    first, only those of ``versions`` and ``salts`` (when not empty)."""
+    hits: Counter[str] = Counter()
+    sizes: dict[str, int] = {}
+    for entry in entries:
+        if entry.method != "GET" or entry.status not in HIT_STATUSES:
+            continue
+        uri = entry.uri.split("?", 1)[0]
+        key = parse_uri(uri)
+        if key is None:
+            continue
+        if (versions and key.version not in versions) or (
+            salts and key.salt not in salts
+        ):
+            continue
+        hits[uri] += 1
+        if entry.body_bytes_sent > sizes.get(uri, 0):
+            sizes[uri] = entry.body_bytes_sent
+    return [HotEntry(uri, n, sizes.get(uri, 0)) for uri, n in hits.most_common()]
+
+
+def read_manifest(path: Path) -> list[HotEntry]:
+    """Return the entries of the manifest at ``path``, in its order.  Lines that are
+    not an ``ac`` / ``cas`` entry (see :func:`write_manifest`) are logged and
+    skipped."""
+    hot: list[HotEntry] = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            if line.startswith("#") or not line.strip():
+                continue
+            try:
+                hits, size_bytes, uri = line.split()
+                entry = HotEntry(uri, int(hits), int(size_bytes))
+            except ValueError:
+                entry = None
+            if entry is None or parse_uri(entry.uri) is None:
+                log_message(f"WARNING: {path}:{line_number}: not an entry, skipped.")
+                continue
+            hot.append(entry)
+    return hot
+
+
+def write_manifest(path: Path, hot: list[HotEntry]) -> None:
+    """Save ``hot`` to the manifest at ``path``: one ``hits size_bytes uri`` line per
+    entry."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write("# hits size_bytes uri\n")
+        for entry in hot:
+            f.write(f"{entry.hits} {entry.size_bytes} {entry.uri}\n")
+    os.replace(tmp_path, path)
+
+
+def select_entries(
+    hot: list[HotEntry], top: int | None, max_bytes: int | None
+) -> list[HotEntry]:
+    """Return the first ``top`` entries of ``hot``, up to a total of ``max_bytes``."""
+    if top is not None:
+        hot = hot[:top]
+    if max_bytes is not None:
+        total = 0
+        for i, entry in enumerate(hot):
+            total += entry.size_bytes
+            if total > max_bytes:
+                return hot[:i]
+    return hot
+
+
+def progress_target(
+    source_url: str, root: Path, to_version: str | None, to_salt: str | None
+) -> str:
+    """Return the description of the destination of a run, saved at the top of its
+    progress file."""
+    return (
+        f"source_url={source_url} cache_dir={root.absolute()} "
+        f"to_version={to_version or '-'} to_salt={to_salt or '-'}"
+    )
+
+
+def default_progress_path(target: str) -> Path:
+    """Return the progress file of the destination ``target`` (see
+    :func:`progress_target`) in :data:`DEFAULT_PROGRESS_DIR`."""
+    digest = hashlib.sha256(target.encode()).hexdigest()[:16]
+    return DEFAULT_PROGRESS_DIR / f"warm_cache_progress_{digest}.txt"
+
+
+@unique
+class Outcome(Enum):
+    """What became of an entry."""
+
+    COPIED = "copied"
+    PRESENT = "present"
+    """Already in the cache directory."""
+
+    MISSING = "missing"
+    """Not found (or corrupt) on the source server."""
+
+    FAILED = "failed"
+    """Could not be downloaded or written, retried by the next run."""
+
+
+class Source:
+    """Download entries from the source server, over one keep-alive connection per
+    thread.
+
+    **Attributes**
+    url: str
+        The base URL of the source server, e.g., ``http://172.31.18.175``.
+
+    timeout: float
+        Timeout in seconds of every connection attempt and read.
+    """
+
+    def __init__(self, url: str, timeout: float) -> None:
+        self.url = url
+        self.timeout = timeout
+        split = urlsplit(url)
+        if split.scheme not in ("http", "https") or not split.netloc:
+            raise ValueError(f"'{url}' is not an http(s) URL.")
+        self._connection_type = (
+            http.client.HTTPSConnection
+            if split.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self._netloc = split.netloc
+        self._prefix = split.path.rstrip("/")
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connection_type(self._netloc, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _reset(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def get(self, uri: str) -> bytes | None:
+        """Return the contents of ``uri``, ``None`` if the source does not have it.
+        Raises ``OSError`` (or ``http.client.HTTPException``) after :data:`RETRIES`
+        failed attempts."""
+        for attempt in range(RETRIES):
+            if attempt:
+                time.sleep(2 ** (attempt - 1))
+            try:
+                connection = self._connection()
+                connection.request("GET", self._prefix + uri)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                self._reset()
+                if attempt + 1 == RETRIES:
+                    raise
+                continue
+            if response.status == 200:
+                return body
+            if response.status == 404:
+                return None
+            if response.status < 500 or attempt + 1 == RETRIES:
+                raise OSError(f"GET {uri}: HTTP {response.status}")
+        raise AssertionError("unreachable")
+
+
+class Warmer:
+    """Copy entries from a :class:`Source` into the cache directory.
+
+    **Attributes**
+    root: Path
+        The cache directory, e.g., ``/cache/data``.
+
+    source: Source
+        Where entries are downloaded from.
+
+    to_version, to_salt: str | None
+        Copy blobs into this version / salt rather than their own.
+
+    owner: tuple[int, int] | None
+        The (uid, gid) given to the created files and directories, ``None`` to keep
+        those of this process.
+
+    target: str
+        The destination of the copies (see :func:`progress_target`).
+
+    counts: Counter[Outcome]
+        Number of entries of every outcome so far.
+
+    bytes_copied: int
+        Total size of the entries copied so far.
+    """
+
+    def __init__(
+        self,
+        *,
+        root: Path,
+        source: Source,
+        to_version: str | None = None,
+        to_salt: str | None = None,
+        owner: tuple[int, int] | None = None,
+    ) -> None:
+        self.root = root
+        self.source = source
+        self.to_version = to_version
+        self.to_salt = to_salt
+        self.owner = owner
+        self.target = progress_target(source.url, root, to_version, to_salt)
+        self.counts: Counter[Outcome] = Counter()
+        self.bytes_copied = 0
+        self._lock = threading.Lock()
+
+    def destination(self, key: CacheKey) -> CacheKey:
+        """Return the key ``key`` is copied to."""
+        return key._replace(
+            version=self.to_version or key.version, salt=self.to_salt or key.salt
+        )
+
+    def _makedirs(self, directory: str) -> None:
+        """Create ``directory`` and its missing parents, owned by ``owner``."""
+        if os.path.isdir(directory):
+            return
+        self._makedirs(os.path.dirname(directory))
+        try:
+            os.mkdir(directory)
+        except FileExistsError:
+            return
+        if self.owner is not None:
+            os.chown(directory, *self.owner)
+
+    def copy(self, uri: str) -> Outcome:
+        """Copy the entry at ``uri`` (see :class:`Outcome`)."""
+        key = parse_uri(uri)
+        assert key is not None
+        destination = self.destination(key)
+        target_uri = "/" + "/".join(destination)
+        path = path_from_uri(str(self.root), target_uri)
+        if os.path.exists(path):
+            return Outcome.PRESENT
+        try:
+            data = self.source.get(uri)
+        except (OSError, http.client.HTTPException) as e:
+            log_message(f"ERROR: could not download {uri}: {e}")
+            return Outcome.FAILED
+        if data is None:
+            return Outcome.MISSING
+        if (
+            key.kind == CAS
+            and len(key.digest) == 64
+            and hashlib.sha256(data).hexdigest() != key.digest
+        ):
+            log_message(f"ERROR: {uri} does not match its hash, skipped.")
+            return Outcome.MISSING
+
+        directory = os.path.dirname(path)
+        try:
+            self._makedirs(directory)
+            fd, tmp_path = tempfile.mkstemp(prefix=".warm-", dir=directory)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                    if self.owner is not None:
+                        os.fchown(f.fileno(), *self.owner)
+                # NOTE: os.link fails if the entry was uploaded meanwhile (unlike
+                # os.rename, which would replace it).
+                os.link(tmp_path, path)
+            except FileExistsError:
+                return Outcome.PRESENT
+            finally:
+                os.unlink(tmp_path)
+        except OSError as e:
+            log_message(f"ERROR: could not write {path}: {e}")
+            return Outcome.FAILED
+        with self._lock:
+            self.bytes_copied += len(data)
+        return Outcome.COPIED
+
+    def check_progress(self, progress: Path) -> None:
+        """Raise ``ValueError`` if ``progress`` exists and is the progress of another
+        destination than :attr:`Warmer.target`."""
+        if not progress.is_file():
+            return
+        with open(progress) as f:
+            header = f.readline().rstrip("\n")
+        if header != f"# {self.target}":
+            raise ValueError(
+                f"'{progress}' is the progress of another destination "
+                f"({header.lstrip('# ') or 'unknown'}), use another --progress."
+            )
+
+    def warm(self, hot: list[HotEntry], jobs: int, progress: Path | None) -> None:
+        """Copy every entry of ``hot`` that is not done according to ``progress``,
+        on ``jobs`` threads, appending the entries done to ``progress``.  Raises
+        ``ValueError`` if ``progress`` is that of another destination."""
+        done: set[str] = set()
+        if progress is not None and progress.is_file():
+            self.check_progress(progress)
+            with open(progress) as f:
+                f.readline()
+                done = set(f.read().split())
+        todo = [entry for entry in hot if entry.uri not in done]
+        log_message(
+            f"{len(hot) - len(todo)} of {len(hot)} entries already done, "
+            f"{len(todo)} to go."
+        )
+        progress_file = None
+        if progress is not None:
+            progress.parent.mkdir(parents=True, exist_ok=True)
+            progress_file = open(progress, "a")
+            if progress_file.tell() == 0:
+                progress_file.write(f"# {self.target}\n")
+
+        start = time.monotonic()
+        last_log = start
+        n_done = 0
+
+        def collect(uri: str, future: Future) -> None:
+            nonlocal n_done, last_log
+            outcome = future.result()
+            self.counts[outcome] += 1
+            n_done += 1
+            if outcome != Outcome.FAILED and progress_file is not None:
+                progress_file.write(uri + "\n")
+            now = time.monotonic()
+            if now - last_log >= PROGRESS_INTERVAL_SECONDS:
+                last_log = now
+                if progress_file is not None:
+                    progress_file.flush()
+                rate = self.bytes_copied / (now - start)
+                log_message(
+                    f"Progress: {n_done} of {len(todo)} entries, "
+                    f"{bytes_to_human_string(self.bytes_copied)} copied "
+                    f"({bytes_to_human_string(int(rate))}/s)."
+                )
+
+        try:
+            # Bound the entries in flight, rather than submitting millions at once.
+            in_flight: deque[tuple[str, Future]] = deque()
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                for entry in todo:
+                    if len(in_flight) >= 4 * jobs:
+                        collect(*in_flight.popleft())
+                    in_flight.append((entry.uri, pool.submit(self.copy, entry.uri)))
+                while in_flight:
+                    collect(*in_flight.popleft())
+        finally:
+            if progress_file is not None:
+                progress_file.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    origin = parser.add_mutually_exclusive_group()
+    origin.add_argument(
+        "--access-log",
+        type=Path,
+        action="append",
+        help=(
+            "Rank the entries by their hits in this nginx access log, and its rotated "
+            f"siblings.  May be repeated (default: {DEFAULT_ACCESS_LOG})."
+        ),
+    )
+    origin.add_argument(
+        "--manifest",
+        type=Path,
+        help="Copy the entries of this manifest (see --save-manifest), in its order.",
+    )
+    parser.add_argument(
+        "--save-manifest",
+        type=Path,
+        default=None,
+        help="Save the ranked entries to this manifest, for a later --manifest.",
+    )
+    parser.add_argument(
+        "--version",
+        action="append",
+        default=[],
+        help="Only copy entries of this cache key version, e.g., v7.  May be repeated.",
+    )
+    parser.add_argument(
+        "--salt",
+        action="append",
+        default=[],
+        help="Only copy entries of this salt.  May be repeated.",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=None,
+        help="Only copy this many of the most requested entries.",
+    )
+    parser.add_argument(
+        "--max-gib",
+        type=float,
+        default=None,
+        help="Only copy the most requested entries totaling this many GiB.",
+    )
+    parser.add_argument(
+        "--to-version",
+        default=None,
+        help="Copy the blobs into this cache key version (skips the action cache).",
+    )
+    parser.add_argument(
+        "--to-salt",
+        default=None,
+        help="Copy the blobs into this salt (skips the action cache).",
+    )
+    parser.add_argument(
+        "--source-url",
+        default=None,
+        help="The cache server to download from, e.g., http://172.31.18.175.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help="Number of parallel HTTP connections (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60.0,
+        help="Timeout in seconds of every HTTP request (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--progress",
+        type=Path,
+        default=None,
+        help=(
+            "Where the entries done are appended (default: a file of "
+            f"{DEFAULT_PROGRESS_DIR} specific to the source URL, cache directory, "
+            "to-version, and to-salt)."
+        ),
+    )
+    parser.add_argument(
+        "-n",
+        "--dry_run",
+        dest="dry_run",
+        action="store_true",
+        help="Rank (and save) the entries without copying them.",
+    )
+    parser.add_argument(
+        "cache_dir",
+        type=Path,
+        help="The cache directory to warm, e.g., `/cache/data`.",
+    )
+
+    args = parser.parse_args()
+
+    if not args.cache_dir.is_dir():
+        parser.error(f"the provided cache_dir='{args.cache_dir}' is not a directory.")
+    if args.jobs < 1:
+        parser.error("jobs must be at least 1.")
+    if args.top is not None and args.top < 1:
+        parser.error("top must be at least 1.")
+    if args.max_gib is not None and args.max_gib <= 0.0:
+        parser.error("max-gib must be positive.")
+    if not args.dry_run and args.source_url is None:
+        parser.error("source-url is required (unless a dry run).")
+    try:
+        source = (
+            Source(args.source_url, args.timeout)
+            if args.source_url is not None
+            else None
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    cache_logging_basic_setup()
+    with timed_phase("rank") as phase:
+        if args.manifest is not None:
+            log_message(f"==> Reading {args.manifest}")
+            hot = read_manifest(args.manifest)
+        else:
+            logs = [
+                p
+                for log in args.access_log or [DEFAULT_ACCESS_LOG]
+                for p in rotated_logs(log)
+            ]
+            log_message(f"==> Ranking the entries hit in {len(logs)} access log(s)")
+            hot = rank_entries(read_entries(logs), set(args.version), set(args.salt))
+        if args.to_version or args.to_salt:
+            hot = [e for e in hot if parse_uri(e.uri).kind != AC]
+        hot = select_entries(
+            hot,
+            args.top,
+            int(args.max_gib * 1024**3) if args.max_gib is not None else None,
+        )
+        phase["entries"] = len(hot)
+    log_message(
+        f"Selected {len(hot)} entries, {sum(e.hits for e in hot)} hit(s), "
+        f"{bytes_to_human_string(sum(e.size_bytes for e in hot))}."
+    )
+    if args.save_manifest is not None:
+        write_manifest(args.save_manifest, hot)
+        log_message(f"Saved the manifest to {args.save_manifest}.")
+    if args.dry_run:
+        return
+
+    assert source is not None
+    root_stat = args.cache_dir.stat()
+    warmer = Warmer(
+        root=args.cache_dir,
+        source=source,
+        to_version=args.to_version,
+        to_salt=args.to_salt,
+        owner=(
+            (root_stat.st_uid, root_stat.st_gid) if os.geteuid() == 0 else None
+        ),
+    )
+    progress = args.progress or default_progress_path(warmer.target)
+    try:
+        warmer.check_progress(progress)
+    except ValueError as e:
+        parser.error(str(e))
+    log_message(
+        f"==> Copying from {args.source_url} into {args.cache_dir} (progress saved "
+        f"to {progress})"
+    )
+    with timed_phase("copy", source_url=args.source_url) as phase:
+        warmer.warm(hot, args.jobs, progress)
+        phase.update({f"entries_{o.value}": warmer.counts[o] for o in Outcome})
+        phase["bytes_copied"] = warmer.bytes_copied
+    log_message(
+        "Done: "
+        + ", ".join(f"{warmer.counts[o]} {o.value}" for o in Outcome)
+        + f", {bytes_to_human_string(warmer.bytes_copied)} copied."
+    )
+    if warmer.counts[Outcome.FAILED]:
+        log_message("Some entries failed, run the same command again to retry them.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
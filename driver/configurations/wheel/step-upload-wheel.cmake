@@ -8,9 +8,10 @@ else()
   # Some builds will produce multiple wheels, and in any case the exact names
   # can be extremely hard to predict aside from simply listing known names
   # (which is a maintenance nightmare). So, don't even bother trying; just
-  # upload anything that's a '.whl' in the output directory.
+  # upload anything that's a '.whl' in the output directory (all at once, so
+  # that they are uploaded concurrently).
   file(GLOB DASHBOARD_WHEELS "${DASHBOARD_WHEEL_OUTPUT_DIRECTORY}/*.whl")
-  foreach(WHEEL IN LISTS DASHBOARD_WHEELS)
-    aws_upload("${WHEEL}" "WHEEL UPLOAD")
-  endforeach()
+  if(DASHBOARD_WHEELS)
+    aws_upload("${DASHBOARD_WHEELS}" "WHEEL UPLOAD")
+  endif()
 endif()
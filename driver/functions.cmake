@@ -216,16 +216,25 @@ endfunction()
 #------------------------------------------------------------------------------
 # Upload an artifact to AWS
 #------------------------------------------------------------------------------
-macro(aws_upload ARTIFACT UNSTABLE_MESSAGE)
+macro(aws_upload ARTIFACTS UNSTABLE_MESSAGE)
+  # The artifacts (a list) are uploaded concurrently by boto3.  Without it,
+  # upload-to-aws.py falls back to the aws executable.
+  setup_boto3_venv()
+  if(DASHBOARD_BOTO3_VENV_STATUS STREQUAL "OK")
+    set(upload_python_cmd "${DASHBOARD_BOTO3_PYTHON_COMMAND}")
+  else()
+    set(upload_python_cmd ${DASHBOARD_PYTHON_COMMAND})
+  endif()
   execute_process(
-    COMMAND ${DASHBOARD_PYTHON_COMMAND}
+    COMMAND ${upload_python_cmd}
       "${DASHBOARD_TOOLS_DIR}/upload-to-aws.py"
       --bucket "drake-packages"
       --group "${DASHBOARD_GROUP}"
       --aws "${DASHBOARD_AWS_COMMAND}"
       --log "${CTEST_BINARY_DIRECTORY}/aws_artifacts.log"
-      "${ARTIFACT}"
+      ${ARTIFACTS}
     RESULT_VARIABLE DASHBOARD_AWS_UPLOAD_RESULT_VARIABLE)
+  unset(upload_python_cmd)
   if(NOT DASHBOARD_AWS_UPLOAD_RESULT_VARIABLE EQUAL 0)
     append_step_status("${UNSTABLE_MESSAGE}" UNSTABLE)
   endif()
@@ -245,42 +254,61 @@ macro(aws_report)
 endmacro()
 
 #------------------------------------------------------------------------------
-# Generate the pip index url
+# Create a virtual environment providing boto3
 #------------------------------------------------------------------------------
-macro(generate_pip_index_url)
-  # NOTE: this macro should only run at the end *AFTER* the wheel build has
-  # completed.  Rather than making the setup/ logic for drake-ci more
-  # complicated, defer to the end and use a virtual environment to install
-  # boto3.  By the end of the script, python3 will be available.
-  set(venv "${DASHBOARD_TOOLS_DIR}/venv")
-  execute_process(
-    COMMAND ${DASHBOARD_PYTHON_COMMAND} -m venv "${venv}"
-    RESULT_VARIABLE DASHBOARD_PYTHON_VENV_RESULT_VARIABLE)
-  if(DASHBOARD_PYTHON_VENV_RESULT_VARIABLE EQUAL 0)
+macro(setup_boto3_venv)
+  # NOTE: rather than making the setup/ logic for drake-ci more complicated,
+  # install boto3 in a virtual environment the first time it is needed (at the
+  # end, *AFTER* the build has completed, by then python3 will be available).
+  # Sets DASHBOARD_BOTO3_VENV_STATUS to "OK" and DASHBOARD_BOTO3_PYTHON_COMMAND
+  # to the python3 of the virtual environment, or the status to the step that
+  # failed.
+  if(NOT DEFINED DASHBOARD_BOTO3_VENV_STATUS)
+    set(venv "${DASHBOARD_TOOLS_DIR}/venv")
     execute_process(
-      COMMAND "${venv}/bin/pip" install boto3
-      RESULT_VARIABLE DASHBOARD_PYTHON_PIP_BOTO3_RESULT_VARIABLE)
-    if(DASHBOARD_PYTHON_PIP_BOTO3_RESULT_VARIABLE EQUAL 0)
-      set(pip_index_cmd
-        "${venv}/bin/python3" "${DASHBOARD_TOOLS_DIR}/pip_index_url.py"
-      )
-      if(NOT DASHBOARD_GROUP STREQUAL "nightly")
-        # ONLY nightly jobs should ever populate the pip index.
-        list(APPEND pip_index_cmd "--dry-run")
-      endif()
+      COMMAND ${DASHBOARD_PYTHON_COMMAND} -m venv "${venv}"
+      RESULT_VARIABLE DASHBOARD_PYTHON_VENV_RESULT_VARIABLE)
+    if(DASHBOARD_PYTHON_VENV_RESULT_VARIABLE EQUAL 0)
       execute_process(
-        COMMAND ${pip_index_cmd}
-        RESULT_VARIABLE DASHBOARD_PIP_INDEX_URL_RESULT_VARIABLE)
-      if(NOT DASHBOARD_PIP_INDEX_URL_RESULT_VARIABLE EQUAL 0)
-        append_step_status("PIP INDEX URL" UNSTABLE)
+        COMMAND "${venv}/bin/pip" install boto3
+        RESULT_VARIABLE DASHBOARD_PYTHON_PIP_BOTO3_RESULT_VARIABLE)
+      if(DASHBOARD_PYTHON_PIP_BOTO3_RESULT_VARIABLE EQUAL 0)
+        set(DASHBOARD_BOTO3_VENV_STATUS "OK")
+        set(DASHBOARD_BOTO3_PYTHON_COMMAND "${venv}/bin/python3")
+      else()
+        set(DASHBOARD_BOTO3_VENV_STATUS "PIP INSTALL BOTO3")
       endif()
     else()
-      append_step_status("PIP INDEX URL PIP INSTALL BOTO3" UNSTABLE)
+      set(DASHBOARD_BOTO3_VENV_STATUS "VENV CREATION")
+    endif()
+    unset(venv)
+  endif()
+endmacro()
+
+#------------------------------------------------------------------------------
+# Generate the pip index url
+#------------------------------------------------------------------------------
+macro(generate_pip_index_url)
+  # NOTE: this macro should only run at the end *AFTER* the wheel build has
+  # completed, see setup_boto3_venv.
+  setup_boto3_venv()
+  if(DASHBOARD_BOTO3_VENV_STATUS STREQUAL "OK")
+    set(pip_index_cmd
+      "${DASHBOARD_BOTO3_PYTHON_COMMAND}" "${DASHBOARD_TOOLS_DIR}/pip_index_url.py"
+    )
+    if(NOT DASHBOARD_GROUP STREQUAL "nightly")
+      # ONLY nightly jobs should ever populate the pip index.
+      list(APPEND pip_index_cmd "--dry-run")
+    endif()
+    execute_process(
+      COMMAND ${pip_index_cmd}
+      RESULT_VARIABLE DASHBOARD_PIP_INDEX_URL_RESULT_VARIABLE)
+    if(NOT DASHBOARD_PIP_INDEX_URL_RESULT_VARIABLE EQUAL 0)
+      append_step_status("PIP INDEX URL" UNSTABLE)
     endif()
   else()
-    append_step_status("PIP INDEX URL VENV CREATION" UNSTABLE)
+    append_step_status("PIP INDEX URL ${DASHBOARD_BOTO3_VENV_STATUS}" UNSTABLE)
   endif()
-  unset(venv)
   unset(pip_index_cmd)
 endmacro()
 
@@ -1,59 +1,176 @@
 #!/usr/bin/env python3
-"""Create an ``index.html`` suitable for use with ``pip --extra-index-url``.
+"""Create the indexes of drake's wheels for ``pip --extra-index-url``.
 
-Scrape which nightly wheels are available (not in glacier storage) from drake's
-nightly s3 bucket.  Create a PEP 503 https://peps.python.org/pep-0503/
-compliant ``index.html`` and upload it to the drake s3 bucket.  To use::
+Scrape which wheels are available (not in glacier storage) from the nightly
+and continuous directories of drake's s3 bucket.  Create, for every channel,
+a PEP 503 https://peps.python.org/pep-0503/ compliant ``index.html`` and
+upload it to the drake s3 bucket.  To use::
 
     pip install \
         --extra-index-url https://drake-packages.csail.mit.edu/whl/nightly/ \
        'drake<0.1'
 
+(or ``whl/continuous/`` for the wheels of the continuous builds).
+
 This script runs at the end of the nightly wheel builds.
 
+Next to every ``index.html``, the same index is uploaded in the PEP 691
+https://peps.python.org/pep-0691/ JSON format as ``index.json``, which pip and
+uv parse faster than HTML.  S3 cannot choose between the two from the
+``Accept`` header of a request: the CDN must serve ``index.json`` to the
+``application/vnd.pypi.simple.v1+json`` requests.  The core metadata of every
+wheel (its ``*.dist-info/METADATA``) is also uploaded next to the wheel as
+``{wheel}.metadata`` (PEP 658 https://peps.python.org/pep-0658/), so that
+resolvers read the dependencies of a wheel without downloading all of it.  It
+is extracted with ranged requests, reading only the central directory and
+the ``METADATA`` entry of the wheel.
+
+Every channel only lists the builds of its last ``days_back`` days, with one
+(prefix) query per day; the queries of all the channels run concurrently.
+The ``*.sha512`` checksum of every wheel is downloaded concurrently
+(``--jobs``) through a single S3 client, whose connection pool is shared by
+the threads.  Transient errors (throttling, 5xx, dropped connections) are
+retried with exponential backoff.
+
+The checksums and core metadata are only downloaded once: a manifest of every
+wheel indexed (its sha512, the sha256 of its core metadata, and its ETag) is
+kept in the bucket next to the index of its channel.  Every run reuses the
+hashes of the wheels in the manifest that are unchanged (same ETag), downloads
+those of the new wheels, and drops the wheels older than ``days_back`` (or
+archived to Glacier) from it.
+
 NOTE: to develop locally, you must have your ~/.aws/config and
-~/.aws/credentials already configured for drake.
+~/.aws/credentials already configured for drake.  Alternatively, point
+``--endpoint-url`` at a local S3 stand-in (e.g., ``moto_server``) holding a
+``drake-packages`` bucket.
 """
 from __future__ import annotations
 
 import argparse
 import datetime
+import hashlib
 import io
+import json
 import operator
+import random
 import re
 import sys
+import time
+import urllib.parse
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
 
 import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+DEFAULT_JOBS = 32
+"""Number of concurrent S3 requests."""
+
+MAX_ATTEMPTS = 5
+"""Attempts of a download before giving up."""
+
+BACKOFF_DELAY = 0.5
+"""Seconds before the second attempt, doubled for every further attempt."""
+
+MANIFEST_VERSION = 2
+"""Version 2 added ``metadata_sha256``, version 1 manifests are upgraded."""
+
+RANGE_BUFFER_SIZE = 256 << 10
+"""Minimum size of the ranged requests reading a wheel: the local header and
+compressed ``METADATA`` of the wheel are then read in one request."""
+
+JSON_CONTENT_TYPE = "application/vnd.pypi.simple.v1+json"
+
+RETRYABLE_ERROR_CODES = {
+    "RequestTimeout",
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "InternalError",
+    "ServiceUnavailable",
+}
+
+
+@dataclass(frozen=True)
+class Channel:
+    name: str  # the --group of the builds, see upload-to-aws.py
+    title: str
+    days_back: int  # wheels built within this many days are indexed
+
+    @property
+    def prefix(self) -> str:
+        """The directory of the wheels of the channel in the bucket."""
+        return f"drake/{self.name}/"
+
+    @property
+    def index_prefix(self) -> str:
+        """The directory of the indexes (and manifest) of the channel."""
+        return f"whl/{self.name}/drake/"
+
+    @property
+    def manifest_key(self) -> str:
+        """The manifest of the wheels in the index, see ``load_manifest``."""
+        return f"{self.index_prefix}manifest.json"
+
+
+CHANNELS = {
+    channel.name: channel
+    for channel in (
+        Channel("nightly", "Nightly", days_back=48),
+        # Many continuous builds run every day, their wheels are only useful
+        # until the next nightly build anyway.
+        Channel("continuous", "Continuous", days_back=7),
+    )
+}
 
 
 @dataclass
 class Wheel:
     s3_key: str
+    version: str  # e.g. "0.0.20260812a1" or "0.0.20260812.93000+git0123abc"
     yyyymmdd: str
+    hhmmss: int  # of the continuous builds (without leading 0), 0 if nightly
     py_minor: int  # e.g. the 11 in "Python 3.11"
+    size: int = 0
+    upload_time: datetime.datetime | None = None
     sha512: str | None = None
+    metadata_sha256: str | None = None  # of its core metadata (PEP 658)
+    etag: str = ""  # of the .whl, changes if the wheel is uploaded again
 
+    @property
+    def url(self) -> str:
+        """The URL of the wheel (continuous versions contain a '+')."""
+        return "/" + urllib.parse.quote(self.s3_key)
 
-def main(args=None) -> None:
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        '--dry-run',
-        action='store_true',
-        help='Generate the index without uploading to S3',
-    )
-    options = parser.parse_args(args)
+    @property
+    def requires_python(self) -> str:
+        return f">=3.{self.py_minor},<3.{self.py_minor + 1}"
 
-    # Log in to s3.
-    print("==> Logging in to s3 ...")
-    s3 = boto3.resource("s3")
-    bucket_name = "drake-packages"
-    bucket = s3.Bucket(bucket_name)
 
-    # Query the drake-packages bucket for drake/nightly/... wheel files from
-    # the past 48 days that are not in Glacier storage.
-    #
+def list_day(client, bucket_name: str, prefix: str) -> list[dict]:
+    """
+    Returns the objects (``Key``, ``ETag``, ``StorageClass``, ...) whose key
+    starts with ``prefix``, e.g., everything uploaded by the nightly build of
+    a day: its wheels, but also its archives, checksums, etc.
+    """
+    paginator = client.get_paginator("list_objects_v2")
+    return [
+        obj
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix)
+        for obj in page.get("Contents", [])
+    ]
+
+
+def list_wheels(
+    client, bucket_name: str, channels: list[Channel], jobs: int
+) -> dict[str, list[Wheel]]:
+    """
+    Returns the wheels of the builds of the last ``days_back`` days of every
+    channel that are not in Glacier storage, querying ``jobs`` days at a time.
+    """
     # See the python.org binary distribution format for the naming conventions
     # that drake follows:
     # https://packaging.python.org/en/latest/specifications/binary-distribution-format/#binary-distribution-format.
@@ -64,109 +181,557 @@ def main(args=None) -> None:
     # for an abi3, glibc 2.34, x86_64 wheel built on 2026-08-12. "a1" denotes
     # our "alpha" nanobind releases. Alternatively, there may be:
     #   drake-0.0.20260812-cp314-cp314-manylinux_2_34_aarch64.whl
-    # for a Python 3.14-specific wheel on aarch64.
-    wheels: list[Wheel] = []
-    print(f"==> Querying {bucket_name} objects ...")
-    days_back = 48
-    version_re = re.compile(r"^drake-0\.0\.([0-9]{8})(a1)?-cp3([0-9]{1,2})-.*")
-    for obj in bucket.objects.filter(Prefix="drake/nightly/"):
-        if obj.storage_class != "STANDARD":
-            continue
-        if not obj.key.endswith(".whl"):
-            continue
-        if "drake-latest" in obj.key:
-            continue
-        # Parse the version numbers.
-        match = version_re.match(Path(obj.key).name)
-        assert match is not None, obj.key
-        yyyymmdd, _, py_minor = match.groups()
-        # Check whether the date is sufficiently new.
-        date = datetime.date(
-            year=int(yyyymmdd[:4]),
-            month=int(yyyymmdd[4:6]),
-            day=int(yyyymmdd[6:8]),
+    # for a Python 3.14-specific wheel on aarch64.  The continuous builds add
+    # the time of the build (without leading 0) and the commit:
+    #   drake-0.0.20260812.93000+git0123abcd-cp314-cp314-<platform>.whl
+    #
+    # The version starts with the date, so the objects of a day share the
+    # prefix drake/<channel>/drake-0.0.YYYYMMDD (which the drake-latest
+    # aliases do not).
+    today = datetime.date.today()
+    queries = [
+        (channel, (today - datetime.timedelta(days=n)).strftime("%Y%m%d"))
+        for channel in channels
+        for n in range(channel.days_back + 1)
+    ]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        listings = list(
+            pool.map(
+                lambda query: list_day(
+                    client, bucket_name, f"{query[0].prefix}drake-0.0.{query[1]}"
+                ),
+                queries,
+            )
         )
-        if (datetime.date.today() - date).days <= days_back:
-            wheels.append(
+
+    wheels: dict[str, list[Wheel]] = {channel.name: [] for channel in channels}
+    version_re = re.compile(
+        r"^drake-(0\.0\.([0-9]{8})(?:\.([0-9]+))?(?:a1)?(?:\+[^-]+)?)"
+        r"-cp3([0-9]{1,2})-.*"
+    )
+    for (channel, _), listing in zip(queries, listings):
+        for obj in listing:
+            if obj.get("StorageClass", "STANDARD") != "STANDARD":
+                continue
+            if not obj["Key"].endswith(".whl"):
+                continue
+            # Parse the version numbers.
+            match = version_re.match(Path(obj["Key"]).name)
+            assert match is not None, obj["Key"]
+            version, yyyymmdd, hhmmss, py_minor = match.groups()
+            wheels[channel.name].append(
                 Wheel(
-                    s3_key=obj.key,
+                    s3_key=obj["Key"],
+                    version=version,
                     yyyymmdd=yyyymmdd,
+                    hhmmss=int(hhmmss or 0),
                     py_minor=int(py_minor),
+                    size=obj["Size"],
+                    upload_time=obj["LastModified"],
+                    etag=obj["ETag"],
                 )
             )
+    return wheels
+
+
+def is_retryable(error: Exception) -> bool:
+    """Returns whether a failed request may succeed if attempted again."""
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code", "")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in RETRYABLE_ERROR_CODES or status >= 500
+    # Connection, timeout, and truncated response errors.
+    return isinstance(error, BotoCoreError)
+
+
+def is_not_found(error: ClientError) -> bool:
+    """Returns whether a request failed because the object does not exist."""
+    return error.response.get("Error", {}).get("Code") in {"NoSuchKey", "404"}
+
+
+def get_object_bytes(client, bucket_name: str, key: str, **kwargs) -> bytes:
+    """
+    Downloads the object ``key`` (or the ``Range`` of it given in ``kwargs``).
+    Tries up to ``MAX_ATTEMPTS`` times, with exponential backoff (and jitter so
+    that the threads throttled together do not retry together).
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            response = client.get_object(Bucket=bucket_name, Key=key, **kwargs)
+            return response["Body"].read()
+        except (BotoCoreError, ClientError) as e:
+            if attempt == MAX_ATTEMPTS or not is_retryable(e):
+                raise
+            delay = BACKOFF_DELAY * 2 ** (attempt - 1)
+            print(f"  RETRY ({attempt}/{MAX_ATTEMPTS}) in {delay:.1f}s: {key}: {e}")
+            time.sleep(delay * random.uniform(1.0, 1.5))
+    raise AssertionError("unreachable")
+
+
+def fetch_sha512(client, bucket_name: str, sha_key: str) -> tuple[str, int]:
+    """
+    Downloads the checksum file ``sha_key``, whose format is
+    ``{sha512 hash}  {filename}``.  Returns the hash and the size of the file.
+    """
+    data = get_object_bytes(client, bucket_name, sha_key)
+    return data.decode("utf-8").strip().split()[0], len(data)
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    A read-only, seekable file reading the object ``key`` of ``size`` bytes
+    with a ranged request per read, so that ``zipfile`` only downloads the
+    parts of a wheel it reads.  Wrap it in an ``io.BufferedReader`` to merge
+    the small reads.
+    """
+
+    def __init__(self, client, bucket_name: str, key: str, size: int):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.size = size
+        self.position = 0
+        self.n_requests = 0
+        self.n_bytes = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise OSError(f"negative seek position {offset}")
+        self.position = offset
+        return offset
+
+    def readinto(self, buffer) -> int:
+        end = min(self.position + len(buffer), self.size)
+        if end <= self.position:
+            return 0
+        data = get_object_bytes(
+            self.client,
+            self.bucket_name,
+            self.key,
+            Range=f"bytes={self.position}-{end - 1}",
+        )
+        buffer[: len(data)] = data
+        self.position += len(data)
+        self.n_requests += 1
+        self.n_bytes += len(data)
+        return len(data)
+
+
+def fetch_metadata(client, bucket_name: str, wheel: Wheel) -> tuple[bytes, int]:
+    """
+    Extracts the core metadata (``*.dist-info/METADATA``) of ``wheel`` with
+    ranged requests.  Returns it and the number of bytes downloaded.
+    """
+    raw = S3RangeReader(client, bucket_name, wheel.s3_key, wheel.size)
+    with zipfile.ZipFile(io.BufferedReader(raw, RANGE_BUFFER_SIZE)) as whl:
+        names = [
+            name
+            for name in whl.namelist()
+            if re.fullmatch(r"[^/]+\.dist-info/METADATA", name)
+        ]
+        if len(names) != 1:
+            raise ValueError(f"{len(names)} dist-info/METADATA files found")
+        return whl.read(names[0]), raw.n_bytes
+
+
+def publish_metadata(
+    client, bucket_name: str, wheels: list[Wheel], jobs: int, dry_run: bool
+) -> None:
+    """
+    Sets the ``metadata_sha256`` of every wheel, extracting ``jobs`` core
+    metadata at a time, and uploads them next to the wheels (unless
+    ``dry_run``).  A wheel whose metadata cannot be read is indexed without.
+    """
+    n_wheels = len(wheels)
+    fixed_width = len(str(n_wheels))  # to format download progress indicator
+    n_bytes = 0
+    n_failed = 0
+    start = time.monotonic()
+
+    def publish(wheel: Wheel) -> tuple[str, int]:
+        metadata, size = fetch_metadata(client, bucket_name, wheel)
+        if not dry_run:
+            client.put_object(
+                Bucket=bucket_name,
+                Key=f"{wheel.s3_key}.metadata",
+                Body=metadata,
+                ContentType="text/plain",
+                StorageClass="STANDARD",
+                ACL="public-read",
+            )
+        return hashlib.sha256(metadata).hexdigest(), size
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(publish, wheel): wheel for wheel in wheels}
+        for i, future in enumerate(as_completed(futures)):
+            wheel = futures[future]
+            try:
+                wheel.metadata_sha256, size = future.result()
+            except (
+                BotoCoreError,
+                ClientError,
+                zipfile.BadZipFile,
+                ValueError,
+            ) as e:
+                n_failed += 1
+                print(f"  WARNING: no metadata for {wheel.s3_key}: {e}")
+                continue
+            n_bytes += size
+            print(
+                f"  METADATA ({i+1: >{fixed_width}}/{n_wheels}): "
+                f"{wheel.s3_key}.metadata"
+            )
+    elapsed = time.monotonic() - start
+    print(
+        f"==> Extracted {n_wheels - n_failed} core metadata ({n_bytes} bytes "
+        f"downloaded) in {elapsed:.2f}s with {jobs} jobs, {n_failed} failed"
+    )
+
+
+def load_manifest(client, bucket_name: str, key: str) -> dict[str, dict]:
+    """
+    Returns the manifest saved at ``key``, mapping the key of every wheel
+    indexed to its ``sha512``, ``metadata_sha256``, ``yyyymmdd``,
+    ``py_minor``, and ``etag``.  Returns an empty manifest if there is none
+    (or it has another format).
+    """
+    try:
+        response = client.get_object(Bucket=bucket_name, Key=key)
+    except ClientError as e:
+        if is_not_found(e):
+            return {}
+        raise
+    manifest = json.loads(response["Body"].read())
+    # Version 1 is version 2 without metadata_sha256 (extracted again).
+    if manifest.get("version") not in {1, MANIFEST_VERSION}:
+        print(f"==> Ignoring the manifest, version {manifest.get('version')}")
+        return {}
+    return manifest["wheels"]
 
-    # Sort by oldest (to match PyPI displaying oldest first).
-    wheels.sort(key=operator.attrgetter("yyyymmdd", "py_minor"))
 
-    # Download and parse the `*.sha512` checksum files. File format:
-    # {sha512 hash}  {filename}
+def save_manifest(
+    client, bucket_name: str, key: str, wheels: list[Wheel]
+) -> None:
+    """Replaces the manifest saved at ``key`` with ``wheels``."""
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "wheels": {
+            wheel.s3_key: {
+                "sha512": wheel.sha512,
+                "metadata_sha256": wheel.metadata_sha256,
+                "yyyymmdd": wheel.yyyymmdd,
+                "py_minor": wheel.py_minor,
+                "etag": wheel.etag,
+            }
+            for wheel in wheels
+        },
+    }
+    client.put_object(
+        Bucket=bucket_name,
+        Key=key,
+        Body=json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"),
+        ContentType="application/json",
+        StorageClass="STANDARD",
+    )
+
+
+def fetch_checksums(
+    client, bucket_name: str, wheels: list[Wheel], jobs: int
+) -> None:
+    """
+    Sets the ``sha512`` of every wheel, downloading ``jobs`` checksums at a
+    time.  The total duration is about ``len(wheels) / jobs`` round trips.  A
+    wheel without a checksum file (e.g., still being uploaded) keeps no
+    ``sha512``.
+    """
     n_wheels = len(wheels)
     fixed_width = len(str(n_wheels))  # to format download progress indicator
-    for i, wheel in enumerate(wheels):
-        sha_key = f"{wheel.s3_key}.sha512"
-        print(f"  DOWNLOAD ({i+1: >{fixed_width}}/{n_wheels}): {sha_key}")
-        sha_data = io.BytesIO()
-        s3.Object(bucket_name, sha_key).download_fileobj(sha_data)
-        wheel.sha512 = sha_data.getvalue().decode("utf-8").strip().split()[0]
-
-    # Generate the index.html contents to upload.  See for reference:
-    # - https://peps.python.org/pep-0503/#specification
-    # - https://pypi.org/simple/drake/
-    # - view-source:https://pypi.org/simple/drake/
-    print("==> Generating index.html ...")
-    html = io.BytesIO()
+    n_bytes = 0
+    n_missing = 0
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(
+                fetch_sha512, client, bucket_name, f"{wheel.s3_key}.sha512"
+            ): wheel
+            for wheel in wheels
+        }
+        for i, future in enumerate(as_completed(futures)):
+            wheel = futures[future]
+            try:
+                wheel.sha512, size = future.result()
+            except ClientError as e:
+                if not is_not_found(e):
+                    raise
+                n_missing += 1
+                print(f"  WARNING: no checksum for {wheel.s3_key}: {e}")
+                continue
+            n_bytes += size
+            print(
+                f"  DOWNLOAD ({i+1: >{fixed_width}}/{n_wheels}): "
+                f"{wheel.s3_key}.sha512"
+            )
+    elapsed = time.monotonic() - start
+    print(
+        f"==> Downloaded {n_wheels - n_missing} checksums ({n_bytes} bytes) "
+        f"in {elapsed:.2f}s with {jobs} jobs: "
+        f"{n_wheels / max(elapsed, 1e-6):.1f} files/s, {n_missing} missing"
+    )
+
+
+def generate_html(channel: Channel, wheels: list[Wheel]) -> bytes:
+    """
+    Returns the PEP 503 ``index.html`` of ``wheels``.  See for reference:
+    - https://peps.python.org/pep-0503/#specification
+    - https://pypi.org/simple/drake/
+    - view-source:https://pypi.org/simple/drake/
+    """
+    html = io.StringIO()
     html.write(
-        bytes(
-            """\
+        f"""\
 <!DOCTYPE html>
 <html lang="en-US">
 <head>
 <meta name="viewport" content="width=device-width, initial-scale=1"/>
 <meta charset="utf-8"/>
-<title>Drake Nightly Python Artifacts</title>
+<title>Drake {channel.title} Python Artifacts</title>
 <meta name="description" content="Binary artifacts for Drake"/>
 </head>
 <body>
-<h1>Drake Nightly Python Artifacts</h1>
-""",
-            "utf-8",
-        )
+<h1>Drake {channel.title} Python Artifacts</h1>
+"""
     )
     for wheel in wheels:
-        s3_key, sha512, py_minor = (wheel.s3_key, wheel.sha512, wheel.py_minor)
-        assert sha512 is not None, f"No sha512 found for {s3_key}"
+        assert wheel.sha512 is not None, f"No sha512 found for {wheel.s3_key}"
+        requires_python = wheel.requires_python.replace(">", "&gt;").replace(
+            "<", "&lt;"
+        )
+        attributes = f'data-requires-python="{requires_python}"'
+        if wheel.metadata_sha256 is not None:
+            # PEP 714 renamed data-dist-info-metadata, which older pip reads.
+            for name in ("data-core-metadata", "data-dist-info-metadata"):
+                attributes += f' {name}="sha256={wheel.metadata_sha256}"'
         html.write(
-            bytes(
-                f'<a href="/{s3_key}#sha512={sha512}" '
-                f'data-requires-python="&gt;=3.{py_minor},&lt;3.{py_minor+1}">'
-                f"{Path(s3_key).name}</a><br/>\n",
-                "utf-8",
-            )
+            f'<a href="{wheel.url}#sha512={wheel.sha512}" {attributes}>'
+            f"{Path(wheel.s3_key).name}</a><br/>\n"
+        )
+    html.write("</body>\n</html>\n")
+    return html.getvalue().encode("utf-8")
+
+
+def generate_json(wheels: list[Wheel]) -> bytes:
+    """
+    Returns the PEP 691 JSON index of ``wheels``, with the ``versions``,
+    ``size``, and ``upload-time`` of PEP 700 (API version 1.1).  See for
+    reference:
+    - https://peps.python.org/pep-0691/#json-serialization
+    - https://pypi.org/simple/drake/ (with the JSON Accept header)
+    """
+    files = []
+    for wheel in wheels:
+        assert wheel.sha512 is not None, f"No sha512 found for {wheel.s3_key}"
+        metadata = (
+            {"sha256": wheel.metadata_sha256}
+            if wheel.metadata_sha256 is not None
+            else False
         )
-    html.write(bytes("</body>\n</html>\n", "utf-8"))
-    # NOTE: upload_fileobj uses read(), reset back to the beginning to avoid
-    # uploading empty file contents.
-    html.seek(0)
-
-    # Upload the index.html to the s3 bucket.
-    if not options.dry_run:
-        s3_key = "whl/nightly/drake/index.html"
-        print(f"==> Uploading to s3://{bucket_name}/{s3_key} ...")
-        s3.meta.client.upload_fileobj(
+        file = {
+            "filename": Path(wheel.s3_key).name,
+            "url": wheel.url,
+            "hashes": {"sha512": wheel.sha512},
+            "requires-python": wheel.requires_python,
+            "core-metadata": metadata,
+            "dist-info-metadata": metadata,
+            "size": wheel.size,
+        }
+        if wheel.upload_time is not None:
+            file["upload-time"] = wheel.upload_time.astimezone(
+                datetime.timezone.utc
+            ).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        files.append(file)
+    index = {
+        "meta": {"api-version": "1.1"},
+        "name": "drake",
+        "versions": sorted({wheel.version for wheel in wheels}),
+        "files": files,
+    }
+    return json.dumps(index, separators=(",", ":")).encode("utf-8")
+
+
+def upload_index(
+    client, bucket_name: str, key: str, body: bytes, content_type: str
+) -> None:
+    """Uploads the index ``body`` to ``key``."""
+    print(f"==> Uploading to s3://{bucket_name}/{key} ...")
+    client.upload_fileobj(
+        io.BytesIO(body),
+        bucket_name,
+        key,
+        ExtraArgs={
+            # The Max-Age for browser caches (among other tools).  We desire it
+            # to expire fairly quickly, the default is 24 hours but 30 minutes
+            # will force tools to reload the data more quickly.
+            "CacheControl": "max-age=1800",  # 30 minutes in seconds
+            # Make sure it is available as an HTML (or JSON) document,
+            # otherwise browsers will just download the file and pip cannot use
+            # it.
+            "ContentType": content_type,  # Default is binary/octet-stream
+            "StorageClass": "STANDARD",
+            "ACL": "public-read",
+        },
+    )
+
+
+def main(args=None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Generate the indexes without uploading to S3',
+    )
+    parser.add_argument(
+        '--channel',
+        action='append',
+        choices=sorted(CHANNELS),
+        help='Index the wheels of this channel, may be repeated '
+        '(default: every channel)',
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=DEFAULT_JOBS,
+        help='Number of concurrent S3 requests (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--rebuild-manifest',
+        action='store_true',
+        help='Ignore the saved manifests, download every checksum and core '
+        'metadata again',
+    )
+    parser.add_argument(
+        '--endpoint-url',
+        default=None,
+        help='Use this S3 endpoint instead of AWS, e.g., a local stand-in',
+    )
+    options = parser.parse_args(args)
+    if options.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    channels = [
+        CHANNELS[name] for name in sorted(set(options.channel or CHANNELS))
+    ]
+
+    # Log in to s3.  Every thread shares the connection pool of the client,
+    # it must hold a connection per thread.
+    print("==> Logging in to s3 ...")
+    s3 = boto3.resource(
+        "s3",
+        endpoint_url=options.endpoint_url,
+        config=Config(max_pool_connections=options.jobs),
+    )
+    client = s3.meta.client
+    bucket_name = "drake-packages"
+
+    # Query the drake-packages bucket for drake/<channel>/... wheel files from
+    # the past days_back days that are not in Glacier storage, for every
+    # channel at once.
+    print(f"==> Querying {bucket_name} objects ...")
+    start = time.monotonic()
+    wheels = list_wheels(client, bucket_name, channels, options.jobs)
+    print(
+        "==> Found "
+        + ", ".join(
+            f"{len(wheels[channel.name])} {channel.name} wheels in "
+            f"{channel.days_back + 1} days"
+            for channel in channels
+        )
+        + f" in {time.monotonic() - start:.2f}s"
+    )
+
+    # Reuse the hashes of the manifests, download and parse the `*.sha512`
+    # checksum files and extract the core metadata of the other wheels.
+    # Wheels no longer listed (too old, or in Glacier storage) are dropped
+    # from the manifests.
+    missing_checksums = []
+    missing_metadata = []
+    for channel in channels:
+        # Sort by oldest (to match PyPI displaying oldest first).
+        wheels[channel.name].sort(
+            key=operator.attrgetter("yyyymmdd", "hhmmss", "py_minor")
+        )
+        manifest = {}
+        if not options.rebuild_manifest:
+            print(f"==> Loading s3://{bucket_name}/{channel.manifest_key} ...")
+            manifest = load_manifest(client, bucket_name, channel.manifest_key)
+        n_reused = 0
+        for wheel in wheels[channel.name]:
+            entry = manifest.get(wheel.s3_key)
+            if entry is not None and entry["etag"] == wheel.etag:
+                wheel.sha512 = entry["sha512"]
+                wheel.metadata_sha256 = entry.get("metadata_sha256")
+                n_reused += 1
+            if wheel.sha512 is None:
+                missing_checksums.append(wheel)
+            if wheel.metadata_sha256 is None:
+                missing_metadata.append(wheel)
+        n_dropped = len(manifest.keys() - {w.s3_key for w in wheels[channel.name]})
+        print(
+            f"==> Manifest of {channel.name}: {n_reused} wheels reused, "
+            f"{n_dropped} wheels dropped"
+        )
+    print(f"==> Downloading {len(missing_checksums)} checksums ...")
+    fetch_checksums(client, bucket_name, missing_checksums, options.jobs)
+    # Wheels without a checksum are left out of the indexes and manifests, the
+    # next run tries again.
+    for channel in channels:
+        wheels[channel.name] = [
+            wheel for wheel in wheels[channel.name] if wheel.sha512 is not None
+        ]
+    missing_metadata = [
+        wheel for wheel in missing_metadata if wheel.sha512 is not None
+    ]
+    # The metadata must be uploaded before the indexes refer to it.
+    print(f"==> Extracting {len(missing_metadata)} core metadata ...")
+    publish_metadata(
+        client, bucket_name, missing_metadata, options.jobs, options.dry_run
+    )
+
+    for channel in channels:
+        print(f"==> Generating the {channel.name} index.html and index.json ...")
+        html = generate_html(channel, wheels[channel.name])
+        index_json = generate_json(wheels[channel.name])
+        if options.dry_run:
+            continue
+        upload_index(
+            client,
+            bucket_name,
+            f"{channel.index_prefix}index.html",
             html,
+            "text/html",
+        )
+        upload_index(
+            client,
             bucket_name,
-            s3_key,
-            ExtraArgs={
-                # The Max-Age for browser caches (among other tools).  We desire it
-                # to expire fairly quickly, the default is 24 hours but 30 minutes
-                # will force tools to reload the data more quickly.
-                "CacheControl": "max-age=1800",  # 30 minutes in seconds
-                # Make sure it is available as an HTML document, otherwise browsers
-                # will just download the file and pip cannot use it.
-                "ContentType": "text/html",  # Default is binary/octet-stream
-                "StorageClass": "STANDARD",
-                "ACL": "public-read",
-            },
+            f"{channel.index_prefix}index.json",
+            index_json,
+            JSON_CONTENT_TYPE,
+        )
+        # For the next run, see load_manifest.
+        print(f"==> Uploading to s3://{bucket_name}/{channel.manifest_key} ...")
+        save_manifest(
+            client, bucket_name, channel.manifest_key, wheels[channel.name]
         )
 
     print("==> DONE!")
@@ -2,27 +2,49 @@
 
 import argparse
 import datetime
+import functools
 import hashlib
+import mimetypes
 import os
+import random
 import re
 import subprocess
 import sys
 import urllib.parse
 
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig, create_transfer_manager
+    from botocore.config import Config
+except ImportError:
+    # Upload with the aws executable instead, see transfer_with_aws_cli.
+    boto3 = None
+
 ARCHIVE_STORAGE_CLASS = 'STANDARD'
-MAX_ATTEMPTS = 3
-BACKOFF_DELAY = 15
+MAX_ATTEMPTS = 5
+BACKOFF_DELAY = 2  # Seconds before the 2nd attempt, doubled for each other.
+DEFAULT_JOBS = 16
+MULTIPART_CHUNKSIZE = 16 << 20
 
 SUPPORTED_GROUPS = {'nightly', 'continuous', 'experimental', 'staging'}
 
 
+def object_key(name, options):
+    """
+    Returns the key of the AWS S3 object for the specified `name` and
+    `options`.
+    """
+    return f'drake/{options.group}/{name}'
+
+
 def canonical_uri(*, name, options, scheme, domain, escape: bool):
     """
     Returns the URI for the specified parameters.
     """
-    path = f'drake/{options.group}/{name}'
+    path = object_key(name, options)
     if escape:
         path = urllib.parse.quote(path)
     return urllib.parse.urlunsplit((scheme, domain, path, '', ''))
@@ -66,11 +88,12 @@ def to_seconds(**kwargs):
         f"max_age only supports nightly and continuous, not {options.group}")
 
 
-def upload(path, name, options, *, expiration=None):
+def transfer_with_aws_cli(options, name, *, path=None, source_name=None,
+                          expiration=None):
     """
-    Attempts to upload a specific artifact to AWS S3. Tries up to
-    `MAX_ATTEMPTS` times before giving up. This is the internal helper function
-    used by the more general wrappers.
+    Uploads the file `path` to AWS S3 as `name`, or copies the already
+    uploaded `source_name` to `name` (within AWS S3), with the aws executable.
+    This is the fallback of `transfer_with_boto3` when boto3 is not available.
 
     When provided, `expiration` (an int representing seconds) will be added to
     the s3 cache control for content Max-Age http headers.
@@ -82,41 +105,105 @@ def upload(path, name, options, *, expiration=None):
         '--storage-class', ARCHIVE_STORAGE_CLASS]
     if expiration is not None:
         command += ['--cache-control', f'max-age={expiration}']
-    command += [path, aws_uri(name, options)]
-
-    print(f'-- Uploading {name} to AWS S3...', flush=True)
+    if source_name is not None:
+        command += ['--metadata-directive', 'REPLACE']
+        command += [aws_uri(source_name, options)]
+    else:
+        command += [path]
+    command += [aws_uri(name, options)]
     print(command, flush=True)
+    subprocess.check_call(command)
 
-    attempt = 0
-    while True:
-        try:
-            attempt += 1
-            subprocess.check_call(command)
-            break
-
-        except Exception:
-            if attempt < MAX_ATTEMPTS:
-                sleep(BACKOFF_DELAY)
-            else:
-                print(f'ERROR: Artifact {path} could not be uploaded '
-                      f'after {MAX_ATTEMPTS} attempts', file=sys.stderr)
-                sys.exit(1)
-
-    uri = download_uri(name, options)
-    print(f'-- Upload complete: {uri}', flush=True)
-    if options.logfile is not None:
-        with open(options.logfile, 'a') as lf:
-            print(uri, file=lf)
 
-
-def upload_checksum(path, name, options, *, expiration=None):
+def transfer_with_boto3(manager, executor, options, name, *, path=None,
+                        source_name=None, expiration=None):
     """
-    Computes the checksum of an artifact, creates a checksum file, and uploads
-    the checksum file to AWS S3.
+    Uploads the file `path` to AWS S3 as `name` through the boto3 transfer
+    `manager`, or copies the already uploaded `source_name` to `name` with a
+    CopyObject request (within AWS S3, up to 5 GB) run by `executor`. Returns
+    the future of the transfer.
 
     When provided, `expiration` (an int representing seconds) will be added to
     the s3 cache control for content Max-Age http headers.
     """
+    extra_args = {
+        'ACL': 'public-read',
+        'StorageClass': ARCHIVE_STORAGE_CLASS,
+    }
+    # Like `aws s3 cp`, guess the Content-Type from the extension.
+    content_type = mimetypes.guess_type(name)[0]
+    if content_type is not None:
+        extra_args['ContentType'] = content_type
+    if expiration is not None:
+        extra_args['CacheControl'] = f'max-age={expiration}'
+    key = object_key(name, options)
+    if source_name is None:
+        return manager.upload(path, options.bucket, key, extra_args=extra_args)
+    copy_source = {
+        'Bucket': options.bucket,
+        'Key': object_key(source_name, options),
+    }
+    # Replace (rather than copy) the metadata of the source, to set the
+    # CacheControl of the copy.
+    return executor.submit(
+        manager.client.copy_object, Bucket=options.bucket, Key=key,
+        CopySource=copy_source, MetadataDirective='REPLACE', **extra_args)
+
+
+def run_transfers(submit, transfers, options):
+    """
+    Starts all `transfers` (the keyword arguments of `transfer_with_boto3` or
+    `transfer_with_aws_cli`) with `submit`, which returns the future of a
+    transfer, then waits for them. Attempts every transfer up to
+    `MAX_ATTEMPTS` times before giving up, with an exponential backoff (and
+    jitter so that the transfers failing together do not retry together).
+    """
+    for transfer in transfers:
+        print(describe_transfer(**transfer), flush=True)
+    futures = [submit(**transfer) for transfer in transfers]
+    for transfer, future in zip(transfers, futures):
+        name = transfer['name']
+        attempt = 1
+        while True:
+            try:
+                future.result()
+                break
+
+            except Exception as e:
+                if attempt == MAX_ATTEMPTS:
+                    print(f'ERROR: Artifact {name} could not be uploaded '
+                          f'after {MAX_ATTEMPTS} attempts: {e}',
+                          file=sys.stderr)
+                    sys.exit(1)
+                delay = BACKOFF_DELAY * 2 ** (attempt - 1)
+                delay *= random.uniform(1.0, 1.5)
+                print(f'-- Retrying {name} in {delay:.1f}s: {e}', flush=True)
+                sleep(delay)
+                attempt += 1
+                future = submit(**transfer)
+
+        uri = download_uri(name, options)
+        print(f'-- Upload complete: {uri}', flush=True)
+        if options.logfile is not None:
+            with open(options.logfile, 'a') as lf:
+                print(uri, file=lf)
+
+
+def describe_transfer(name, *, path=None, source_name=None, expiration=None):
+    """
+    Returns the progress message of a transfer, see `run_transfers`.
+    """
+    if source_name is not None:
+        return f'-- Copying {source_name} to {name} in AWS S3...'
+    return f'-- Uploading {name} to AWS S3...'
+
+
+def write_checksum(path, name):
+    """
+    Computes the checksum of an artifact, and writes the checksum file of
+    `name` (the artifact, or an alias of it) next to it. Returns the path of
+    the checksum file.
+    """
     checksum = hashlib.sha512()
 
     with open(path, mode='rb') as f:
@@ -126,24 +213,17 @@ def upload_checksum(path, name, options, *, expiration=None):
                 break
             checksum.update(data)
 
-    checksum_path = f'{path}.sha512'
+    checksum_path = os.path.join(os.path.dirname(path), f'{name}.sha512')
     with open(checksum_path, mode='w') as f:
         f.write(f'{checksum.hexdigest()}  {name}\n')
-
-    upload(checksum_path, f'{name}.sha512', options, expiration=expiration)
+    return checksum_path
 
 
-def upload_artifacts(options):
+def latest_name(name, options):
     """
-    Uploads an artifact (and checksums) to AWS S3. Depending on the CI group,
-    also uploads a copy as 'latest'.
+    Returns the name of the 'latest' alias of the artifact `name`, or None if
+    it should not have one.
     """
-    path = options.artifact
-    name = os.path.basename(path)
-
-    upload(path, name, options)
-    upload_checksum(path, name, options)
-
     # For Nightly and Continuous, upload a 'latest' artifact as well (but not
     # for Documentation jobs, which publish to the site instead).
     #
@@ -176,32 +256,85 @@ def upload_artifacts(options):
     #
     if name.startswith('drake-doc-'):
         print('Not uploading a "latest" alias for a Documentation build')
-        return
+        return None
     m = re.match(r'^(drake-(dev_)?)([^-]+)-(.*)$', name)
     assert m, f'Could not decompose {name}'
     prefix, _, version, residue = m.groups()
     if version.split('+')[0].endswith('a1'):
         print('Not uploading a "latest" alias for a Nanobind build')
-        return
+        return None
     new_name = f'{prefix}latest-{residue}'
     if options.nightly or options.continuous:
+        return new_name
+    print(f'Not uploading "latest" alias {new_name} during '
+          f'non-Nightly, non-Continuous --group={options.group}')
+    return None
+
+
+def upload_artifacts(options):
+    """
+    Uploads the artifacts and their checksum files to AWS S3, then their
+    'latest' aliases (if any), all concurrently.
+    """
+    uploads = []
+    aliases = []
+    for path in options.artifacts:
+        name = os.path.basename(path)
+        uploads.append(dict(name=name, path=path))
+        uploads.append(dict(name=f'{name}.sha512',
+                            path=write_checksum(path, name)))
+
+        new_name = latest_name(name, options)
+        if new_name is None:
+            continue
+        # The artifact is copied within AWS S3 once uploaded, but its
+        # checksum file names the alias, so it is uploaded.
         expiration = max_age(options)
-        upload(path, new_name, options, expiration=expiration)
-        upload_checksum(path, new_name, options, expiration=expiration)
-    else:
-        print(f'Not uploading "latest" alias {new_name} during '
-              f'non-Nightly, non-Continuous --group={options.group}')
+        aliases.append(dict(name=new_name, source_name=name,
+                            expiration=expiration))
+        aliases.append(dict(name=f'{new_name}.sha512',
+                            path=write_checksum(path, new_name),
+                            expiration=expiration))
+
+    if boto3 is None:
+        print('-- boto3 is not available, uploading with '
+              f'{options.aws}', flush=True)
+        with ThreadPoolExecutor(max_workers=options.jobs) as executor:
+            submit = functools.partial(
+                executor.submit, transfer_with_aws_cli, options)
+            run_transfers(submit, uploads, options)
+            run_transfers(submit, aliases, options)
+        return
+
+    # Every transfer shares the connection pool of the client, which must
+    # hold a connection per thread of the transfer manager.  Artifacts larger
+    # than MULTIPART_CHUNKSIZE are uploaded in parts concurrently.
+    client = boto3.client(
+        's3', config=Config(max_pool_connections=options.jobs))
+    config = TransferConfig(
+        multipart_threshold=MULTIPART_CHUNKSIZE,
+        multipart_chunksize=MULTIPART_CHUNKSIZE,
+        max_concurrency=options.jobs)
+    with create_transfer_manager(client, config) as manager, \
+            ThreadPoolExecutor(max_workers=options.jobs) as executor:
+        submit = functools.partial(
+            transfer_with_boto3, manager, executor, options)
+        run_transfers(submit, uploads, options)
+        run_transfers(submit, aliases, options)
 
 
 def main(args):
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
-        'artifact', type=str,
-        help='Artifact to be uploaded')
+        'artifacts', type=str, nargs='+', metavar='artifact',
+        help='Artifact(s) to be uploaded')
     parser.add_argument(
         '--aws', type=str, default='aws',
-        help='Path to AWS executable')
+        help='Path to AWS executable (used if boto3 is not available)')
+    parser.add_argument(
+        '--jobs', type=int, default=DEFAULT_JOBS,
+        help='Number of concurrent S3 requests (default: %(default)s)')
     parser.add_argument(
         '--bucket', type=str, required=True,
         help='Name of target AWS bucket')
@@ -217,8 +350,11 @@ def main(args):
     for g in SUPPORTED_GROUPS:
         setattr(options, g, options.group == g)
 
-    if not os.path.exists(options.artifact):
-        parser.error(f'Artifact {options.artifact!r} does not exist')
+    if options.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    for artifact in options.artifacts:
+        if not os.path.exists(artifact):
+            parser.error(f'Artifact {artifact!r} does not exist')
 
     upload_artifacts(options)
 